@@ -2,14 +2,14 @@ from app.admin.services import AdminService
 
 service = AdminService()
 
-def get_users():
-    return service.get_users()
+async def get_users():
+    return await service.get_users()
 
-def create_user(user: dict):
-    return service.create_user(user)
+async def create_user(user: dict):
+    return await service.create_user(user)
 
-def update_user(uid: str, user: dict):
-    return service.update_user(uid, user)
+async def update_user(uid: str, user: dict):
+    return await service.update_user(uid, user)
 
-def delete_user(uid: str):
-    return service.delete_user(uid)
+async def delete_user(uid: str):
+    return await service.delete_user(uid)
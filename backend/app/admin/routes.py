@@ -1,13 +1,16 @@
-from fastapi import APIRouter, Body, Depends, HTTPException
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request
 from typing import Dict
-from .services import AdminService
-from ..middleware.auth_middleware import verify_token
+from .services import AdminService, parse_import
+from ..middleware.auth_middleware import verify_token, cache_stats
+from ..utils import membership, response_cache
+from ..utils.outbox import outbox
+from ..utils.replica import replica
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 service = AdminService()
 
 # 🔒 ADMIN GUARD
-def admin_guard(user=Depends(verify_token)):
+async def admin_guard(user=Depends(verify_token)):
     if user.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Admin only")
     return user
@@ -15,42 +18,96 @@ def admin_guard(user=Depends(verify_token)):
 # ================= USERS =================
 
 @router.get("/users")
-def get_users(admin=Depends(admin_guard)):
-    return service.get_users()
+async def get_users(
+    limit: int | None = Query(None, ge=1, le=500),
+    cursor: str | None = None,
+    role: str | None = None,
+    groupId: str | None = None,
+    q: str | None = None,
+    admin=Depends(admin_guard)
+):
+    """
+    - cursor : uid of the last user of the previous page
+    - q      : prefix of the email or of the name (first ``limit`` matches)
+    """
+    return await service.get_users(limit, cursor, role, groupId, q)
 
 @router.post("/users")
-def create_user(user_data: Dict = Body(...), admin=Depends(admin_guard)):
-    return service.create_user(user_data)
+async def create_user(user_data: Dict = Body(...), admin=Depends(admin_guard)):
+    return await service.create_user(user_data)
+
+@router.post("/users/bulk", status_code=202)
+async def import_users(request: Request, admin=Depends(admin_guard)):
+    """
+    CSV (text/csv body or multipart "file") or JSON :
+    email, displayName, role. Returns a job id to poll.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        upload = (await request.form()).get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Fichier manquant")
+        body = await upload.read()
+        is_csv = "csv" in (upload.content_type or "") or (upload.filename or "").lower().endswith(".csv")
+        content_type = "text/csv" if is_csv else "application/json"
+    else:
+        body = await request.body()
+
+    rows = parse_import(content_type, body)
+    return await service.start_user_import(rows, admin)
+
+@router.get("/users/bulk/{job_id}")
+async def get_import_job(job_id: str, admin=Depends(admin_guard)):
+    return await service.get_import_job(job_id)
 
 @router.put("/users/{uid}")
-def update_user(uid: str, user_data: Dict = Body(...), admin=Depends(admin_guard)):
-    return service.update_user(uid, user_data)
+async def update_user(uid: str, user_data: Dict = Body(...), admin=Depends(admin_guard)):
+    return await service.update_user(uid, user_data)
 
 @router.delete("/users/{uid}")
-def delete_user(uid: str, admin=Depends(admin_guard)):
-    return service.delete_user(uid)
+async def delete_user(uid: str, admin=Depends(admin_guard)):
+    return await service.delete_user(uid)
+
+@router.get("/cache-stats")
+async def get_cache_stats(admin=Depends(admin_guard)):
+    return {
+        **cache_stats(),
+        **membership.cache_stats(),
+        **response_cache.cache_stats(),
+        "outbox": outbox.stats(),
+        "replica": replica.stats()
+    }
 
 # ================= GROUPS =================
 
 @router.get("/groups")
-def get_groups(admin=Depends(admin_guard)):
-    return service.get_groups()
+async def get_groups(
+    limit: int | None = Query(None, ge=1, le=500),
+    cursor: str | None = None,
+    profId: str | None = None,
+    admin=Depends(admin_guard)
+):
+    return await service.get_groups(limit, cursor, profId)
 
 @router.post("/groups")
-def create_group(group: Dict = Body(...), admin=Depends(admin_guard)):
-    return service.create_group(group)
+async def create_group(group: Dict = Body(...), admin=Depends(admin_guard)):
+    return await service.create_group(group)
 
 @router.put("/groups/{groupId}")
-def update_group(groupId: str, group: Dict = Body(...), admin=Depends(admin_guard)):
-    return service.update_group(groupId, group)
+async def update_group(groupId: str, group: Dict = Body(...), admin=Depends(admin_guard)):
+    return await service.update_group(groupId, group)
 
 @router.delete("/groups/{groupId}")
-def delete_group(groupId: str, admin=Depends(admin_guard)):
-    return service.delete_group(groupId)
+async def delete_group(groupId: str, admin=Depends(admin_guard)):
+    return await service.delete_group(groupId)
 @router.get("/my-groups")
-def my_groups(user=Depends(verify_token)):
-    return service.get_user_groups(user)
+async def my_groups(request: Request, user=Depends(verify_token)):
+    return await response_cache.cached(
+        request, user,
+        lambda: service.get_user_groups(user),
+        lambda groups: response_cache.group_tags(user["uid"], groups)
+    )
 
 @router.get("/groups/{groupId}/students")
-def get_group_students(groupId: str, user=Depends(verify_token)):
-    return service.get_group_students(groupId)
+async def get_group_students(groupId: str, user=Depends(verify_token)):
+    return await service.get_group_students(groupId)
@@ -1,3 +1,9 @@
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import os
 from typing import List, Dict, Optional
 from datetime import datetime, timedelta
 import random
@@ -6,13 +12,39 @@ import string
 from fastapi import HTTPException
 from firebase_admin import auth, firestore
 from firebase_admin.auth import EmailAlreadyExistsError
+from google.cloud.firestore_v1.base_query import FieldFilter
+from google.cloud.firestore_v1.field_path import FieldPath
 
-from ..utils.firebase import init_firebase
-from ..utils.mailer import send_activation_email
+from ..utils.firebase import init_async_firebase
+from ..utils.mailer import build_activation_email, check_config
+from ..utils.outbox import outbox
+from ..utils.user_resolver import UserResolver
+from ..utils import membership, response_cache
+from ..complaint.services import ComplaintService
+from ..middleware.auth_middleware import invalidate_user
 
 
 # 🔥 Initialisation Firebase UNE SEULE FOIS
-db = init_firebase()
+db = init_async_firebase()
+
+ROLES = {"student", "prof", "admin"}
+
+# bulk import
+MAX_IMPORT_ROWS = 5000
+IMPORT_CHUNK = 1000  # auth.import_users limit
+LOOKUP_CHUNK = 100   # auth.get_users limit
+BATCH_SIZE = 500
+# the temporary passwords are imported as pbkdf2_sha256 hashes
+HASH_ROUNDS = 10000
+_imports = set()
+
+# listings : fields returned by GET /admin/users and /admin/groups
+USER_FIELDS = [
+    "email", "displayName", "role", "groupId", "createdAt",
+    "emailStatus", "emailError"
+]
+GROUP_FIELDS = ["name", "profId", "studentIds", "projectTitle", "createdAt"]
+SEARCH_LIMIT = 20
 
 
 # =========================
@@ -20,6 +52,9 @@ db = init_firebase()
 # =========================
 def _to_iso(ts):
     try:
+        # Firestore timestamps are returned as datetime subclasses
+        if isinstance(ts, datetime):
+            return ts.isoformat()
         if hasattr(ts, "to_datetime"):
             return ts.to_datetime().isoformat()
         if hasattr(ts, "seconds"):
@@ -31,6 +66,87 @@ def _to_iso(ts):
     return None
 
 
+def _temp_password() -> str:
+    return "".join(random.choices(string.ascii_letters + string.digits, k=10))
+
+
+def _search_fields(email: Optional[str], display_name: Optional[str]) -> Dict:
+    """Lowercase copies used by the prefix search of GET /admin/users."""
+    return {
+        "emailLower": (email or "").strip().lower(),
+        "displayNameLower": (display_name or "").strip().lower()
+    }
+
+
+def _prefix(query, field: str, prefix: str):
+    return (
+        query
+        .where(filter=FieldFilter(field, ">=", prefix))
+        .where(filter=FieldFilter(field, "<", prefix + "\uf8ff"))
+        .order_by(field)
+    )
+
+
+def _chunks(items: list, size: int) -> list:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def parse_import(content_type: str, body: bytes) -> List[Dict]:
+    """
+    CSV (header : email,displayName,role) or JSON (list of users
+    or {"users": [...]}). Rows are validated one by one by the job.
+    """
+    try:
+        if "csv" in (content_type or ""):
+            reader = csv.DictReader(io.StringIO(body.decode("utf-8-sig")))
+            rows = [
+                {(k or "").strip(): (v or "").strip() for k, v in row.items()}
+                for row in reader
+            ]
+        else:
+            data = json.loads(body)
+            rows = data.get("users") if isinstance(data, dict) else data
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Fichier d'import illisible")
+
+    if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+        raise HTTPException(status_code=400, detail="Fichier d'import illisible")
+    if not rows:
+        raise HTTPException(status_code=400, detail="Aucun utilisateur à importer")
+    if len(rows) > MAX_IMPORT_ROWS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{MAX_IMPORT_ROWS} utilisateurs maximum par import"
+        )
+    return rows
+
+
+def _import_records(chunk: list) -> tuple:
+    """
+    Blocking (thread) : hashes the temporary passwords and calls
+    auth.import_users, one RPC for up to 1000 accounts.
+    """
+    records, passwords = [], []
+    for row in chunk:
+        password = _temp_password()
+        salt = os.urandom(16)
+        records.append(auth.ImportUserRecord(
+            row["uid"],
+            email=row["email"],
+            display_name=row["displayName"] or None,
+            password_hash=hashlib.pbkdf2_hmac(
+                "sha256", password.encode(), salt, HASH_ROUNDS
+            ),
+            password_salt=salt
+        ))
+        passwords.append(password)
+
+    result = auth.import_users(
+        records, hash_alg=auth.UserImportHash.pbkdf2_sha256(rounds=HASH_ROUNDS)
+    )
+    return passwords, {e.index: e.reason for e in result.errors}
+
+
 # =========================
 # SERVICE ADMIN
 # =========================
@@ -44,17 +160,64 @@ class AdminService:
     # USERS
     # =====================================================
 
-    def get_users(self) -> List[Dict]:
-        users = []
-        for doc in self.users_coll.stream():
-            u = doc.to_dict()
-            u["uid"] = doc.id
-            if "createdAt" in u:
-                u["createdAt"] = _to_iso(u["createdAt"])
-            users.append(u)
-        return users
-
-    def create_user(self, user: Dict) -> Dict:
+    async def get_users(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        role: Optional[str] = None,
+        group_id: Optional[str] = None,
+        q: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Ordered by uid, ``cursor`` is the uid of the last user of the
+        previous page. ``q`` : prefix of the email or of the name, returns
+        the first ``limit`` matches (no cursor).
+        """
+        query = self.users_coll.select(USER_FIELDS)
+        if role:
+            query = query.where(filter=FieldFilter("role", "==", role))
+        if group_id:
+            query = query.where(filter=FieldFilter("groupId", "==", group_id))
+
+        if q and q.strip():
+            prefix = q.strip().lower()
+            limit = limit or SEARCH_LIMIT
+            by_name, by_email = await asyncio.gather(
+                _prefix(query, "displayNameLower", prefix).limit(limit).get(),
+                _prefix(query, "emailLower", prefix).limit(limit).get()
+            )
+            docs = {d.id: d for d in [*by_name, *by_email]}.values()
+            users = sorted(
+                (self._user(d) for d in docs),
+                key=lambda u: (u.get("displayName") or "").lower()
+            )
+            return users[:limit]
+
+        query = query.order_by(FieldPath.document_id())
+        if cursor:
+            query = query.start_after(await self._cursor(self.users_coll, cursor))
+        if limit:
+            query = query.limit(limit)
+
+        return [self._user(d) for d in await query.get()]
+
+    @staticmethod
+    def _user(doc) -> Dict:
+        u = doc.to_dict()
+        u["uid"] = doc.id
+        if "createdAt" in u:
+            u["createdAt"] = _to_iso(u["createdAt"])
+        return u
+
+    @staticmethod
+    async def _cursor(coll, cursor: str):
+        """The cursor is the id of the last document of the previous page."""
+        snapshot = await coll.document(cursor).get()
+        if not snapshot.exists:
+            raise HTTPException(status_code=400, detail="Curseur invalide")
+        return snapshot
+
+    async def create_user(self, user: Dict) -> Dict:
         email = user.get("email")
         display_name = user.get("displayName", "")
         role = user.get("role", "student")
@@ -62,12 +225,11 @@ class AdminService:
         if not email:
             raise HTTPException(status_code=400, detail="Email requis")
 
-        temp_password = "".join(
-            random.choices(string.ascii_letters + string.digits, k=10)
-        )
+        temp_password = _temp_password()
 
         try:
-            fb_user = auth.create_user(
+            fb_user = await asyncio.to_thread(
+                auth.create_user,
                 email=email,
                 password=temp_password,
                 display_name=display_name
@@ -77,69 +239,266 @@ class AdminService:
 
         uid = fb_user.uid
 
-        self.users_coll.document(uid).set({
+        # 📧 delivered in the background, status kept on the user doc
+        try:
+            msg = build_activation_email(email, temp_password)
+            email_status = "queued"
+        except Exception as e:
+            print("SMTP ERROR:", e)
+            msg = None
+            email_status = "failed"
+
+        await self.users_coll.document(uid).set({
             "email": email,
             "displayName": display_name,
             "role": role,
             "groupId": None,
+            "emailStatus": email_status,
+            **_search_fields(email, display_name),
             "createdAt": firestore.SERVER_TIMESTAMP
         })
-
-        email_sent = True
-        try:
-            send_activation_email(email=email, password=temp_password)
-        except Exception as e:
-            print("SMTP ERROR:", e)
-            email_sent = False
+        if msg is not None:
+            outbox.enqueue(uid, msg)
 
         return {
             "uid": uid,
             "email": email,
             "displayName": display_name,
             "role": role,
-            "emailSent": email_sent
+            "emailStatus": email_status
         }
 
-    def update_user(self, uid: str, user: Dict) -> Dict:
-        auth.update_user(
+    async def start_user_import(self, rows: List[Dict], admin: Dict) -> Dict:
+        """
+        Creates an import_jobs document and processes the rows in the
+        background : poll it with get_import_job.
+        """
+        ref = db.collection("import_jobs").document()
+        await ref.set({
+            "status": "running",
+            "total": len(rows),
+            "processed": 0,
+            "created": 0,
+            "failed": 0,
+            "errors": [],
+            "createdBy": admin["uid"],
+            "createdAt": firestore.SERVER_TIMESTAMP
+        })
+
+        task = asyncio.create_task(self._run_import(ref, rows))
+        _imports.add(task)
+        task.add_done_callback(_imports.discard)
+
+        return {"jobId": ref.id, "total": len(rows)}
+
+    async def get_import_job(self, job_id: str) -> Dict:
+        doc = await db.collection("import_jobs").document(job_id).get()
+        if not doc.exists:
+            raise HTTPException(status_code=404, detail="Import introuvable")
+
+        job = doc.to_dict()
+        job["jobId"] = doc.id
+        for key in ("createdAt", "finishedAt"):
+            if key in job:
+                job[key] = _to_iso(job[key])
+        return job
+
+    async def _run_import(self, ref, rows: List[Dict]):
+        errors = []
+
+        def fail(row, reason):
+            errors.append({"row": row["row"], "email": row["email"], "error": reason})
+
+        try:
+            # 1. validation
+            valid, seen = [], set()
+            for i, raw in enumerate(rows):
+                row = {
+                    "row": i + 1,
+                    "email": str(raw.get("email") or "").strip().lower(),
+                    "displayName": str(raw.get("displayName") or "").strip(),
+                    "role": str(raw.get("role") or "student").strip().lower()
+                }
+                if "@" not in row["email"]:
+                    fail(row, "Email invalide")
+                elif row["role"] not in ROLES:
+                    fail(row, "Rôle invalide")
+                elif row["email"] in seen:
+                    fail(row, "Email en double dans le fichier")
+                else:
+                    seen.add(row["email"])
+                    valid.append(row)
+
+            # 2. import_users does not check that the emails are unused
+            existing = set()
+            for chunk in _chunks(valid, LOOKUP_CHUNK):
+                found = await asyncio.to_thread(
+                    auth.get_users, [auth.EmailIdentifier(r["email"]) for r in chunk]
+                )
+                existing.update(u.email.lower() for u in found.users if u.email)
+
+            todo = []
+            for row in valid:
+                if row["email"] in existing:
+                    fail(row, "Cet email existe déjà")
+                else:
+                    row["uid"] = self.users_coll.document().id
+                    todo.append(row)
+
+            try:
+                check_config()
+                email_status = "queued"
+            except Exception as e:
+                print("SMTP ERROR:", e)
+                email_status = "failed"
+
+            # 3. accounts, profiles and emails, 1000 rows at a time
+            created = 0
+            processed = len(rows) - len(todo)
+            for chunk in _chunks(todo, IMPORT_CHUNK):
+                passwords, failures = await asyncio.to_thread(_import_records, chunk)
+
+                imported = []
+                for i, row in enumerate(chunk):
+                    if i in failures:
+                        fail(row, failures[i])
+                    else:
+                        imported.append((row, passwords[i]))
+
+                for part in _chunks(imported, BATCH_SIZE):
+                    batch = db.batch()
+                    for row, _ in part:
+                        batch.set(self.users_coll.document(row["uid"]), {
+                            "email": row["email"],
+                            "displayName": row["displayName"],
+                            "role": row["role"],
+                            "groupId": None,
+                            "emailStatus": email_status,
+                            **_search_fields(row["email"], row["displayName"]),
+                            "createdAt": firestore.SERVER_TIMESTAMP
+                        })
+                    await batch.commit()
+
+                if email_status == "queued":
+                    for row, password in imported:
+                        outbox.enqueue(row["uid"], build_activation_email(row["email"], password))
+
+                created += len(imported)
+                processed += len(chunk)
+                await ref.update({
+                    "processed": processed,
+                    "created": created,
+                    "failed": len(errors),
+                    "errors": sorted(errors, key=lambda e: e["row"])
+                })
+
+            await ref.update({
+                "status": "done",
+                "processed": len(rows),
+                "created": created,
+                "failed": len(errors),
+                "errors": sorted(errors, key=lambda e: e["row"]),
+                "finishedAt": firestore.SERVER_TIMESTAMP
+            })
+
+        except Exception as e:
+            print("❌ USER IMPORT ERROR:", e)
+            await ref.update({
+                "status": "failed",
+                "error": str(e),
+                "errors": sorted(errors, key=lambda e: e["row"]),
+                "finishedAt": firestore.SERVER_TIMESTAMP
+            })
+
+    async def update_user(self, uid: str, user: Dict) -> Dict:
+        before = (await self.users_coll.document(uid).get()).to_dict() or {}
+
+        await asyncio.to_thread(
+            auth.update_user,
             uid,
             email=user.get("email"),
             display_name=user.get("displayName")
         )
 
-        self.users_coll.document(uid).set({
+        await self.users_coll.document(uid).set({
             "email": user.get("email"),
             "displayName": user.get("displayName"),
             "role": user.get("role"),
-            "groupId": user.get("groupId")
+            "groupId": user.get("groupId"),
+            **_search_fields(user.get("email"), user.get("displayName"))
         }, merge=True)
+        invalidate_user(uid)
+        response_cache.invalidate_user(uid)
+
+        # complaints carry the sender name
+        if user.get("displayName") != before.get("displayName"):
+            await ComplaintService().sync_sender_name(uid, user.get("displayName"))
 
-        doc = self.users_coll.document(uid).get().to_dict()
+        doc = (await self.users_coll.document(uid).get()).to_dict()
         doc["uid"] = uid
         return doc
 
-    def delete_user(self, uid: str) -> Dict:
+    async def delete_user(self, uid: str) -> Dict:
         try:
-            auth.delete_user(uid)
+            await asyncio.to_thread(auth.delete_user, uid)
         except Exception:
             pass
 
-        self.users_coll.document(uid).delete()
+        await self.users_coll.document(uid).delete()
+        invalidate_user(uid)
+        response_cache.invalidate_user(uid)
         return {"message": "Utilisateur supprimé"}
 
     # =====================================================
     # GROUPS (ADMIN)
     # =====================================================
 
-    def get_groups(self) -> List[Dict]:
+    async def get_groups(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        prof_id: Optional[str] = None
+    ) -> List[Dict]:
+        """Ordered by id, ``cursor`` is the id of the last group of the previous page."""
+        query = self.groups_coll.select(GROUP_FIELDS)
+        if prof_id:
+            query = query.where(filter=FieldFilter("profId", "==", prof_id))
+
+        query = query.order_by(FieldPath.document_id())
+        if cursor:
+            query = query.start_after(await self._cursor(self.groups_coll, cursor))
+        if limit:
+            query = query.limit(limit)
+
         groups = []
-        for doc in self.groups_coll.stream():
+        for doc in await query.get():
             g = doc.to_dict()
             g["groupId"] = doc.id
             groups.append(g)
         return groups
 
-    def create_group(self, group: Dict) -> Dict:
+    @staticmethod
+    def _members(group: Dict) -> List[str]:
+        members = [group.get("profId")] + list(group.get("studentIds") or [])
+        return list(dict.fromkeys(uid for uid in members if uid))
+
+    def _link(self, batch, uids: List[str], group_id: Optional[str]):
+        for uid in uids:
+            batch.set(self.users_coll.document(uid), {"groupId": group_id}, merge=True)
+
+    async def _unlink(self, batch, uids: List[str], group_id: str) -> List[str]:
+        """Unlinks the users still pointing to ``group_id`` (they may have moved since)."""
+        if not uids:
+            return []
+        refs = [self.users_coll.document(uid) for uid in uids]
+        linked = [
+            doc.id async for doc in db.get_all(refs, field_paths=["groupId"])
+            if doc.exists and (doc.to_dict() or {}).get("groupId") == group_id
+        ]
+        self._link(batch, linked, None)
+        return linked
+
+    async def create_group(self, group: Dict) -> Dict:
         try:
             name = group.get("name")
             prof_id = group.get("profId")
@@ -161,20 +520,18 @@ class AdminService:
                 "createdAt": firestore.SERVER_TIMESTAMP
             }
 
-            ref.set(payload)
             group_id = ref.id
 
-            # 🔗 Lier encadrant
-            self.users_coll.document(prof_id).set(
-                {"groupId": group_id}, merge=True
-            )
-
-            # 🔗 Lier étudiants (sécurisé)
-            for sid in student_ids:
-                if sid:
-                    self.users_coll.document(sid).set(
-                        {"groupId": group_id}, merge=True
-                    )
+            # 🔗 groupe + encadrant + étudiants : un seul commit atomique
+            members = self._members(payload)
+            batch = db.batch()
+            batch.set(ref, payload)
+            self._link(batch, members, group_id)
+            await batch.commit()
+            for uid in members:
+                invalidate_user(uid)
+            membership.invalidate_group(group_id, members)
+            response_cache.invalidate_group(group_id, members)
 
             payload["groupId"] = group_id
             # Remove non-serializable fields
@@ -185,37 +542,57 @@ class AdminService:
             print("❌ CREATE GROUP ERROR:", e)
             raise HTTPException(status_code=500, detail=str(e))
 
-    def update_group(self, groupId: str, group: Dict) -> Dict:
+    async def update_group(self, groupId: str, group: Dict) -> Dict:
         ref = self.groups_coll.document(groupId)
-        ref.set(group, merge=True)
+        doc = await ref.get()
+        if not doc.exists:
+            raise HTTPException(status_code=404, detail="Groupe introuvable")
+        before = doc.to_dict()
+
+        # only the members that changed are (un)linked
+        old_members = self._members(before)
+        new_members = self._members({**before, **group})
+        added = [uid for uid in new_members if uid not in old_members]
+        removed = [uid for uid in old_members if uid not in new_members]
+
+        batch = db.batch()
+        batch.set(ref, group, merge=True)
+        self._link(batch, added, groupId)
+        await self._unlink(batch, removed, groupId)
+        await batch.commit()
+        for uid in added + removed:
+            invalidate_user(uid)
+
+        out = (await ref.get()).to_dict()
+        # members removed from the group lose their access too
+        membership.invalidate_group(groupId, old_members + new_members)
+        response_cache.invalidate_group(groupId, old_members + new_members)
 
-        out = ref.get().to_dict()
         out["groupId"] = groupId
         return out
 
-    def delete_group(self, groupId: str) -> Dict:
+    async def delete_group(self, groupId: str) -> Dict:
         ref = self.groups_coll.document(groupId)
-        data = ref.get().to_dict() or {}
-
-        if data.get("profId"):
-            self.users_coll.document(data["profId"]).set(
-                {"groupId": None}, merge=True
-            )
-
-        for sid in data.get("studentIds", []):
-            if sid:
-                self.users_coll.document(sid).set(
-                    {"groupId": None}, merge=True
-                )
-
-        ref.delete()
+        data = (await ref.get()).to_dict() or {}
+
+        # group + unlinks in one atomic commit
+        members = self._members(data)
+        batch = db.batch()
+        await self._unlink(batch, members, groupId)
+        batch.delete(ref)
+        await batch.commit()
+        for uid in members:
+            invalidate_user(uid)
+
+        membership.invalidate_group(groupId, members)
+        response_cache.invalidate_group(groupId, members)
         return {"message": "Groupe supprimé"}
 
     # =====================================================
     # GROUPS (PROF / STUDENT – CHAT)
     # =====================================================
 
-    def get_user_groups(self, user: Dict) -> List[Dict]:
+    async def get_user_groups(self, user: Dict) -> List[Dict]:
         uid = user["uid"]
         role = user["role"]
 
@@ -225,15 +602,15 @@ class AdminService:
             query = self.groups_coll.where("studentIds", "array_contains", uid)
 
         groups = []
-        for doc in query.stream():
+        async for doc in query.stream():
             g = doc.to_dict()
             g["groupId"] = doc.id
             groups.append(g)
 
         return groups
 
-    def get_group_students(self, group_id: str) -> List[Dict]:
-        group_doc = self.groups_coll.document(group_id).get()
+    async def get_group_students(self, group_id: str) -> List[Dict]:
+        group_doc = await self.groups_coll.document(group_id).get()
         if not group_doc.exists:
             raise HTTPException(status_code=404, detail="Groupe introuvable")
 
@@ -241,10 +618,10 @@ class AdminService:
         student_ids = group_data.get("studentIds", [])
 
         students = []
+        users = await UserResolver().get_many(student_ids)
         for sid in student_ids:
-            user_doc = self.users_coll.document(sid).get()
-            if user_doc.exists:
-                u = user_doc.to_dict()
+            if sid in users:
+                u = users[sid]
                 u["uid"] = sid
                 students.append(u)
 
@@ -254,7 +631,7 @@ class AdminService:
     # ADMIN CODES
     # =====================================================
 
-    def generate_admin_code(
+    async def generate_admin_code(
         self,
         expires_in_hours: int = 24,
         created_by: Optional[str] = None
@@ -271,5 +648,32 @@ class AdminService:
             "expiresAt": expires_at.isoformat()
         }
 
-        self.codes_coll.document(code).set(doc)
+        await self.codes_coll.document(code).set(doc)
         return doc
+
+
+# =========================
+# BACKFILL : search fields of the users created before they existed
+#     python -m app.admin.services
+# =========================
+async def backfill_search_fields():
+    updates = []
+    async for d in db.collection("users").select(
+        ["email", "displayName", "emailLower", "displayNameLower"]
+    ).stream():
+        data = d.to_dict()
+        fields = _search_fields(data.get("email"), data.get("displayName"))
+        if any(data.get(k) != v for k, v in fields.items()):
+            updates.append((d.reference, fields))
+
+    for part in _chunks(updates, BATCH_SIZE):
+        batch = db.batch()
+        for ref, fields in part:
+            batch.update(ref, fields)
+        await batch.commit()
+
+    print(f"Users backfilled : {len(updates)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(backfill_search_fields())
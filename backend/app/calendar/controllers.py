@@ -2,7 +2,7 @@ from app.calendar.services import CalendarService
 
 service = CalendarService()
 
-def create_event(title, description, date, groupId, user, type="task"):
+async def create_event(title, description, date, groupId, user, type="task"):
     data = {
         "title": title,
         "description": description,
@@ -10,13 +10,13 @@ def create_event(title, description, date, groupId, user, type="task"):
         "groupId": groupId,
         "type": type
     }
-    return service.create_event(data, user)
+    return await service.create_event(data, user)
 
-def get_events(user, groupId=None):
-    return service.get_events(user, groupId)
+async def get_events(user, groupId=None):
+    return await service.get_events(user, groupId)
 
-def update_event(event_id, data, user):
-    return service.update_event(event_id, data, user)
+async def update_event(event_id, data, user):
+    return await service.update_event(event_id, data, user)
 
-def delete_event(event_id, user):
-    return service.delete_event(event_id, user)
+async def delete_event(event_id, user):
+    return await service.delete_event(event_id, user)
@@ -0,0 +1,139 @@
+"""
+calendar_events : the only place that knows the collection and its
+queries, shared by the calendar routes and the dashboards.
+
+Events keep the ``date`` sent by the client and a normalized ``dateAt``
+(UTC timestamp) used by every range query. Composite indexes are
+declared in backend/firestore.indexes.json.
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from app.utils.firebase import init_async_firebase
+
+db = init_async_firebase()
+events = db.collection("calendar_events")
+
+# Firestore limit on the values of an "in" filter
+MAX_IN = 30
+
+
+def parse_date(value) -> datetime | None:
+    """
+    ISO date or datetime (``Z`` allowed) -> UTC datetime, None if invalid.
+    A date alone is midnight UTC, naive datetimes are taken as UTC.
+    """
+    try:
+        ts = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if ts.tzinfo is None:
+        return ts.replace(tzinfo=timezone.utc)
+    return ts.astimezone(timezone.utc)
+
+
+def _chunks(group_ids: list) -> list:
+    return [group_ids[i:i + MAX_IN] for i in range(0, len(group_ids), MAX_IN)]
+
+
+def _in_range(query, start: datetime | None, end: datetime | None):
+    """start <= dateAt < end, ordered by date."""
+    if start is not None:
+        query = query.where(filter=FieldFilter("dateAt", ">=", start))
+    if end is not None:
+        query = query.where(filter=FieldFilter("dateAt", "<", end))
+    if start is not None or end is not None:
+        query = query.order_by("dateAt")
+    return query
+
+
+def _serialize(doc) -> dict:
+    return {**doc.to_dict(), "id": doc.id}
+
+
+# =========================
+# READS
+# =========================
+async def list_for_group(group_id: str, start=None, end=None) -> list:
+    """Without ``start`` / ``end`` : the whole history of the group."""
+    query = _in_range(events.where(filter=FieldFilter("groupId", "==", group_id)), start, end)
+    return [_serialize(d) for d in await query.get()]
+
+
+async def list_for_groups(group_ids: list, start, end) -> list:
+    """One ``in`` query per 30 groups, merged by date."""
+    results = await asyncio.gather(*(
+        _in_range(events.where(filter=FieldFilter("groupId", "in", chunk)), start, end).get()
+        for chunk in _chunks(group_ids)
+    ))
+    found = [_serialize(d) for docs in results for d in docs]
+    return sorted(found, key=lambda e: e["dateAt"])
+
+
+async def count_tasks_due(group_ids: list, day: str) -> int:
+    """
+    Tasks of ``group_ids`` due on ``day`` (YYYY-MM-DD, UTC) : one count()
+    aggregation per 30 groups, no event document is read.
+    """
+    start = parse_date(day)
+    end = start + timedelta(days=1)
+
+    results = await asyncio.gather(*(
+        events
+        .where(filter=FieldFilter("groupId", "in", chunk))
+        .where(filter=FieldFilter("type", "==", "task"))
+        .where(filter=FieldFilter("dateAt", ">=", start))
+        .where(filter=FieldFilter("dateAt", "<", end))
+        .count(alias="count")
+        .get()
+        for chunk in _chunks(group_ids)
+    ))
+    return sum(result[0][0].value for result in results)
+
+
+async def get(event_id: str):
+    return await events.document(event_id).get()
+
+
+# =========================
+# WRITES
+# =========================
+async def add(event: dict):
+    ref = events.document()
+    await ref.set(event)
+    return ref
+
+
+async def update(event_id: str, updates: dict):
+    await events.document(event_id).update(updates)
+
+
+async def delete(event_id: str):
+    await events.document(event_id).delete()
+
+
+# =========================
+# BACKFILL : dateAt on events created before it existed
+#     python -m app.calendar.repository
+# =========================
+async def backfill_dates():
+    updates = []
+    async for d in events.stream():
+        data = d.to_dict()
+        if "dateAt" not in data:
+            updates.append((d.reference, parse_date(data.get("date"))))
+
+    for i in range(0, len(updates), 500):
+        batch = db.batch()
+        for ref, date_at in updates[i:i + 500]:
+            # unparseable dates stay out of the range queries
+            batch.update(ref, {"dateAt": date_at})
+        await batch.commit()
+
+    print(f"Calendar events backfilled : {len(updates)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(backfill_dates())
@@ -1,12 +1,13 @@
-from fastapi import APIRouter, Depends, Form, Body
+from fastapi import APIRouter, Depends, Form, Body, HTTPException, Query, Request
 from ..middleware.auth_middleware import verify_token
+from ..utils.response_cache import cached
 from .services import CalendarService
 
 router = APIRouter(prefix="/calendar", tags=["Calendar"])
 service = CalendarService()
 
 @router.post("/")
-def add_event(
+async def add_event(
     title: str = Form(...),
     date: str = Form(...),
     description: str = Form(""),
@@ -14,7 +15,7 @@ def add_event(
     type: str = Form("task"),
     user=Depends(verify_token)
 ):
-    return service.create_event({
+    return await service.create_event({
         "title": title,
         "description": description,
         "date": date,
@@ -23,20 +24,46 @@ def add_event(
     }, user)
 
 @router.get("/")
-def list_events(
+async def list_events(
+    request: Request,
     groupId: str,
+    start: str | None = Query(None, alias="from"),
+    end: str | None = Query(None, alias="to"),
     user=Depends(verify_token)
 ):
-    return service.get_events(user, groupId)
+    """
+    from / to : ISO dates, from <= date < to
+    """
+    return await cached(
+        request, user,
+        lambda: service.get_events(user, groupId, start, end),
+        lambda events: [f"user:{user['uid']}", f"group:{groupId}", f"calendar:{groupId}"]
+    )
+
+# 📅 several groups at once (all the user's groups by default)
+@router.get("/groups")
+async def list_events_for_groups(
+    start: str = Query(..., alias="from"),
+    end: str = Query(..., alias="to"),
+    groupIds: str | None = None,
+    user=Depends(verify_token)
+):
+    """
+    groupIds : comma separated, from <= date < to
+    """
+    group_ids = [g for g in groupIds.split(",") if g] if groupIds else None
+    if group_ids is not None and not group_ids:
+        raise HTTPException(status_code=400, detail="groupIds invalide")
+    return await service.get_events_for_groups(user, start, end, group_ids)
 
 @router.put("/{event_id}")
-def edit_event(
+async def edit_event(
     event_id: str,
     data: dict = Body(...),
     user=Depends(verify_token)
 ):
-    return service.update_event(event_id, data, user)
+    return await service.update_event(event_id, data, user)
 
 @router.delete("/{event_id}")
-def remove_event(event_id: str, user=Depends(verify_token)):
-    return service.delete_event(event_id, user)
+async def remove_event(event_id: str, user=Depends(verify_token)):
+    return await service.delete_event(event_id, user)
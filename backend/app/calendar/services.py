@@ -1,44 +1,37 @@
+import asyncio
 from datetime import datetime
 from fastapi import HTTPException
-from app.utils.firebase import init_firebase
+from app.calendar import repository
+from app.utils import membership, response_cache
 
-db = init_firebase()
 
-class CalendarService:
-    def __init__(self):
-        self.events = db.collection("calendar_events")
-        self.groups = db.collection("groups")
-
-    def _get_user_groups(self, user):
-        group_ids = []
+def _require_date(value) -> datetime:
+    ts = repository.parse_date(value)
+    if ts is None:
+        raise HTTPException(status_code=400, detail="Date invalide")
+    return ts
 
-        if user["role"] == "admin":
-            # Admin can access all groups
-            docs = self.groups.stream()
-        elif user["role"] == "prof":
-            docs = self.groups.where("profId", "==", user["uid"]).stream()
-        else:
-            docs = self.groups.where("studentIds", "array_contains", user["uid"]).stream()
 
-        for d in docs:
-            group_ids.append(d.id)
+def _optional_date(value) -> datetime | None:
+    return None if value is None else _require_date(value)
 
-        return group_ids
 
+class CalendarService:
     # ✅ CREATE
-    def create_event(self, data, user):
+    async def create_event(self, data, user):
         groupId = data.get("groupId")
         if not groupId:
             raise HTTPException(status_code=400, detail="groupId required")
 
-        user_groups = self._get_user_groups(user)
-        if groupId not in user_groups:
+        if not await membership.is_member(user, groupId):
             raise HTTPException(status_code=403, detail="Access denied")
 
         event = {
             "title": data["title"],
             "description": data.get("description", ""),
             "date": data["date"],
+            # normalized copy of ``date`` : range queries
+            "dateAt": _require_date(data["date"]),
             "type": data.get("type", "task"),
             "groupId": groupId,
             "createdBy": user["uid"],
@@ -46,22 +39,41 @@ class CalendarService:
             "createdAt": datetime.utcnow(),
         }
 
-        self.events.add(event)
+        await repository.add(event)
+        response_cache.invalidate_calendar(groupId)
         return {"message": "Event created"}
 
     # ✅ READ (shared)
-    def get_events(self, user, groupId):
-        user_groups = self._get_user_groups(user)
-        if groupId not in user_groups:
+    async def get_events(self, user, groupId, start=None, end=None):
+        """
+        Without ``start`` / ``end`` the whole history is returned (legacy
+        clients), otherwise the events with start <= dateAt < end.
+        """
+        # membership check and read run concurrently, result discarded if denied
+        allowed, events = await asyncio.gather(
+            membership.is_member(user, groupId),
+            repository.list_for_group(groupId, _optional_date(start), _optional_date(end))
+        )
+        if not allowed:
+            raise HTTPException(status_code=403, detail="Access denied")
+
+        return events
+
+    # ✅ READ (several groups : a month across all the groups of a prof)
+    async def get_events_for_groups(self, user, start, end, group_ids=None):
+        user_groups = await membership.get_user_group_ids(user)
+        if group_ids is None:
+            group_ids = user_groups
+        elif any(gid not in user_groups for gid in group_ids):
             raise HTTPException(status_code=403, detail="Access denied")
 
-        docs = self.events.where("groupId", "==", groupId).stream()
-        return [{**d.to_dict(), "id": d.id} for d in docs]
+        return await repository.list_for_groups(
+            group_ids, _require_date(start), _require_date(end)
+        )
 
     # ✏️ UPDATE
-    def update_event(self, event_id, data, user):
-        ref = self.events.document(event_id)
-        doc = ref.get()
+    async def update_event(self, event_id, data, user):
+        doc = await repository.get(event_id)
 
         if not doc.exists:
             raise HTTPException(status_code=404, detail="Event not found")
@@ -71,14 +83,17 @@ class CalendarService:
             raise HTTPException(status_code=403, detail="Forbidden")
 
         allowed = ["title", "description", "date", "type"]
-        ref.update({k: v for k, v in data.items() if k in allowed})
+        updates = {k: v for k, v in data.items() if k in allowed}
+        if "date" in updates:
+            updates["dateAt"] = _require_date(updates["date"])
 
+        await repository.update(event_id, updates)
+        response_cache.invalidate_calendar(event["groupId"])
         return {"message": "Event updated"}
 
     # 🗑️ DELETE
-    def delete_event(self, event_id, user):
-        ref = self.events.document(event_id)
-        doc = ref.get()
+    async def delete_event(self, event_id, user):
+        doc = await repository.get(event_id)
 
         if not doc.exists:
             raise HTTPException(status_code=404, detail="Event not found")
@@ -87,5 +102,6 @@ class CalendarService:
         if event["createdBy"] != user["uid"]:
             raise HTTPException(status_code=403, detail="Forbidden")
 
-        ref.delete()
+        await repository.delete(event_id)
+        response_cache.invalidate_calendar(event["groupId"])
         return {"message": "Event deleted"}
@@ -6,28 +6,62 @@ service = ChatService()
 # =========================
 # GET
 # =========================
-def get_messages(group_id: str):
-    return service.get_messages(group_id)
+async def get_messages(
+    group_id: str,
+    limit: int | None = None,
+    before: str | None = None,
+    after: str | None = None,
+    since: str | None = None
+):
+    return await service.get_messages(group_id, limit, before, after, since)
 
 # =========================
 # SEND MESSAGE (TEXT + FILE)
 # =========================
-def send_chat_message(
+async def send_chat_message(
     group_id: str,
     text: str | None,
     file: UploadFile | None,
     user: dict
 ):
-    return service.send_chat_message(group_id, text, file, user)
+    return await service.send_chat_message(group_id, text, file, user)
+
+# =========================
+# RESUMABLE UPLOAD
+# =========================
+async def create_upload_session(
+    group_id: str,
+    file_name: str,
+    file_size: int,
+    mime_type: str | None,
+    text: str | None,
+    user: dict,
+    origin: str | None = None
+):
+    return await service.create_upload_session(
+        group_id, file_name, file_size, mime_type, text, user, origin
+    )
+
+async def complete_upload(group_id: str, message_id: str, user: dict):
+    return await service.complete_upload(group_id, message_id, user)
+
+async def expire_stale_uploads():
+    return await service.expire_stale_uploads()
+
+# =========================
+# FILE DOWNLOAD
+# =========================
+async def get_file_url(group_id: str, message_id: str, user: dict):
+    return await service.get_file_url(group_id, message_id, user)
 
 # =========================
 # UPDATE
 # =========================
-def update_message(group_id: str, message_id: str, user: dict, text: str):
-    return service.update_message(group_id, message_id, user, text)
+async def update_message(group_id: str, message_id: str, user: dict, text: str):
+    return await service.update_message(group_id, message_id, user, text)
 
 # =========================
 # DELETE
 # =========================
-def delete_message(group_id: str, message_id: str, user: dict):
-    return service.delete_message(group_id, message_id, user)
+async def delete_message(group_id: str, message_id: str, user: dict):
+    return await service.delete_message(group_id, message_id, user)
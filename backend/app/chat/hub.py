@@ -0,0 +1,153 @@
+import asyncio
+import json
+import os
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+
+# =========================
+# BACKENDS
+# =========================
+class InMemoryBackend:
+    """
+    Single process : events are only delivered to the subscribers
+    of this worker.
+    """
+
+    async def start(self, dispatch):
+        self._dispatch = dispatch
+
+    async def stop(self):
+        pass
+
+    async def publish(self, group_id: str, event: dict):
+        self._dispatch(group_id, event)
+
+
+class RedisBackend:
+    """
+    Several uvicorn workers : every worker publishes to Redis and
+    receives the events of all the others through a pattern subscription.
+    """
+
+    CHANNEL_PREFIX = "chat:"
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("CHAT_HUB_BACKEND=redis requires the 'redis' package")
+
+        self._redis = redis.from_url(url)
+        self._pubsub = None
+        self._task = None
+
+    async def start(self, dispatch):
+        self._pubsub = self._redis.pubsub()
+        await self._pubsub.psubscribe(f"{self.CHANNEL_PREFIX}*")
+        self._task = asyncio.create_task(self._listen(dispatch))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        if self._pubsub:
+            await self._pubsub.aclose()
+        await self._redis.aclose()
+
+    async def publish(self, group_id: str, event: dict):
+        await self._redis.publish(
+            f"{self.CHANNEL_PREFIX}{group_id}",
+            json.dumps(event, default=str)
+        )
+
+    async def _listen(self, dispatch):
+        async for msg in self._pubsub.listen():
+            if msg["type"] != "pmessage":
+                continue
+
+            channel = msg["channel"]
+            if isinstance(channel, bytes):
+                channel = channel.decode()
+
+            group_id = channel[len(self.CHANNEL_PREFIX):]
+            dispatch(group_id, json.loads(msg["data"]))
+
+
+def backend_from_env():
+    if os.getenv("CHAT_HUB_BACKEND", "memory") == "redis":
+        return RedisBackend(os.getenv("CHAT_HUB_REDIS_URL", "redis://localhost:6379/0"))
+    return InMemoryBackend()
+
+
+# =========================
+# HUB
+# =========================
+class ChatHub:
+    """
+    Per-group fan-out of chat events (message.created / updated / deleted).
+
+    ``publish`` can be called from the event loop or from any thread,
+    delivery always happens on the event loop the hub was started on.
+    """
+
+    def __init__(self, backend=None, queue_size: int = 100):
+        self._backend = backend or InMemoryBackend()
+        self._queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self._loop = None
+        self._pending = set()
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        await self._backend.start(self._dispatch)
+
+    async def stop(self):
+        await self._backend.stop()
+        self._loop = None
+
+    def publish(self, group_id: str, event: dict):
+        # Hub not started (scripts, scheduled jobs) : nobody is listening
+        if self._loop is None:
+            return
+
+        event = {**event, "groupId": group_id}
+        coro = self._backend.publish(group_id, event)
+
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+
+        if running is self._loop:
+            task = self._loop.create_task(coro)
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+        else:
+            asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    @asynccontextmanager
+    async def subscribe(self, group_id: str):
+        queue = asyncio.Queue(maxsize=self._queue_size)
+        self._subscribers[group_id].add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers[group_id].discard(queue)
+            if not self._subscribers[group_id]:
+                del self._subscribers[group_id]
+
+    def subscriber_count(self, group_id: str) -> int:
+        return len(self._subscribers.get(group_id, ()))
+
+    def _dispatch(self, group_id: str, event: dict):
+        for queue in list(self._subscribers.get(group_id, ())):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Slow client : drop its backlog, it re-syncs with ?since=
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync", "groupId": group_id})
+
+
+chat_hub = ChatHub(backend=backend_from_env())
@@ -1,18 +1,29 @@
+import asyncio
+
 from fastapi import (
     APIRouter,
     Depends,
     UploadFile,
     File,
     Form,
-    HTTPException
+    Header,
+    HTTPException,
+    Query,
+    WebSocket
 )
 from .controllers import (
     get_messages,
     send_chat_message,
+    create_upload_session,
+    complete_upload,
+    get_file_url,
     update_message,
     delete_message
 )
+from .hub import chat_hub
 from ..middleware.auth_middleware import verify_token
+from ..utils import membership
+from ..utils.replica import replica
 
 router = APIRouter(
     prefix="/chat",
@@ -23,18 +34,32 @@ router = APIRouter(
 # GET MESSAGES
 # =========================
 @router.get("/{group_id}/messages")
-def read_messages(
+async def read_messages(
     group_id: str,
+    limit: int | None = Query(None, ge=1, le=500),
+    before: str | None = None,
+    after: str | None = None,
+    since: str | None = None,
     user=Depends(verify_token)
 ):
-    return get_messages(group_id)
+    """
+    - before / after : page around a message id or ISO timestamp
+    - since          : messages created or edited after this watermark
+    """
+    return await get_messages(
+        group_id=group_id,
+        limit=limit,
+        before=before,
+        after=after,
+        since=since
+    )
 
 
 # =========================
 # SEND MESSAGE (TEXT + FILE)
 # =========================
 @router.post("/{group_id}/messages")
-def create_message(
+async def create_message(
     group_id: str,
     text: str | None = Form(None),
     file: UploadFile | None = File(None),
@@ -46,7 +71,7 @@ def create_message(
             detail="Message vide"
         )
 
-    return send_chat_message(
+    return await send_chat_message(
         group_id=group_id,
         text=text,
         file=file,
@@ -54,17 +79,74 @@ def create_message(
     )
 
 
+# =========================
+# RESUMABLE UPLOAD (LARGE FILES)
+# =========================
+@router.post("/{group_id}/uploads")
+async def start_upload(
+    group_id: str,
+    fileName: str = Form(...),
+    fileSize: int = Form(...),
+    mimeType: str | None = Form(None),
+    text: str | None = Form(None),
+    origin: str | None = Header(None),
+    user=Depends(verify_token)
+):
+    """
+    Creates a "pending" message and a resumable Storage session : the
+    client PUTs the file to ``uploadUrl`` then calls /complete.
+    """
+    return await create_upload_session(
+        group_id=group_id,
+        file_name=fileName,
+        file_size=fileSize,
+        mime_type=mimeType,
+        text=text,
+        user=user,
+        origin=origin
+    )
+
+
+@router.post("/{group_id}/uploads/{message_id}/complete")
+async def finish_upload(
+    group_id: str,
+    message_id: str,
+    user=Depends(verify_token)
+):
+    return await complete_upload(
+        group_id=group_id,
+        message_id=message_id,
+        user=user
+    )
+
+
+# =========================
+# FILE DOWNLOAD (SHORT-LIVED SIGNED URL)
+# =========================
+@router.get("/{group_id}/files/{message_id}")
+async def read_file_url(
+    group_id: str,
+    message_id: str,
+    user=Depends(verify_token)
+):
+    return await get_file_url(
+        group_id=group_id,
+        message_id=message_id,
+        user=user
+    )
+
+
 # =========================
 # UPDATE MESSAGE (TEXT ONLY)
 # =========================
 @router.put("/{group_id}/messages/{message_id}")
-def edit_message(
+async def edit_message(
     group_id: str,
     message_id: str,
     text: str = Form(...),
     user=Depends(verify_token)
 ):
-    return update_message(
+    return await update_message(
         group_id=group_id,
         message_id=message_id,
         user=user,
@@ -76,13 +158,59 @@ def edit_message(
 # DELETE MESSAGE
 # =========================
 @router.delete("/{group_id}/messages/{message_id}")
-def remove_message(
+async def remove_message(
     group_id: str,
     message_id: str,
     user=Depends(verify_token)
 ):
-    return delete_message(
+    return await delete_message(
         group_id=group_id,
         message_id=message_id,
         user=user
     )
+
+
+# =========================
+# REAL-TIME STREAM (WEBSOCKET)
+# =========================
+@router.websocket("/{group_id}/stream")
+async def stream_messages(
+    websocket: WebSocket,
+    group_id: str,
+    token: str | None = None
+):
+    """
+    Browsers cannot set headers on a WebSocket : the Firebase token is
+    passed as ?token=. Events are deltas (message.created / updated /
+    deleted); after (re)connecting, fetch the gap with GET messages?since=.
+    """
+    try:
+        user = await verify_token(f"Bearer {token}" if token else None)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+
+    # 🔒 only the members of the group receive its events
+    if not await membership.is_member(user, group_id):
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+
+    # the chat is replicated while a socket is open (FIRESTORE_LISTENERS=1)
+    async with replica.watch_chat(group_id), chat_hub.subscribe(group_id) as queue:
+        async def forward():
+            while True:
+                await websocket.send_json(await queue.get())
+
+        async def drain():
+            # only used to notice the client closing the socket
+            while True:
+                await websocket.receive_text()
+
+        tasks = [asyncio.create_task(forward()), asyncio.create_task(drain())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
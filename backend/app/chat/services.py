@@ -1,14 +1,43 @@
-from firebase_admin import firestore, storage
+import asyncio
+import io
+import os
+
+from firebase_admin import firestore
+from google.api_core.exceptions import NotFound
 from fastapi import UploadFile, HTTPException
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from uuid import uuid4
-from app.utils.firebase import init_firebase
+from google.cloud.firestore_v1.base_query import FieldFilter
+from app.utils.firebase import init_async_firebase, init_bucket
+from app.chat.hub import chat_hub
+from app.utils import dashboard_counters, daily_message_calculator, membership
+from app.utils.cache import TTLCache
+from app.utils.replica import replica
 
 # =========================
 # INIT FIREBASE
 # =========================
-db = init_firebase()
-bucket = storage.bucket()
+db = init_async_firebase()
+bucket = init_bucket()
+
+# =========================
+# UPLOADS
+# =========================
+MAX_FILE_SIZE = int(os.getenv("CHAT_MAX_FILE_SIZE", 25 * 1024 * 1024))
+# resumable uploads are sent by chunks (multiple of 256 KiB)
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+# uploads still pending after this long (worker restarted mid-upload,
+# client never completed) are marked failed by expire_stale_uploads
+UPLOAD_TIMEOUT = float(os.getenv("CHAT_UPLOAD_TIMEOUT", 60 * 60))
+UPLOAD_FAILED = "Échec de l'envoi du fichier"
+
+# background uploads still running (keeps a reference to the tasks)
+_uploads = set()
+
+# download links are signed on demand, cached by filePath until
+# well before they expire
+SIGNED_URL_TTL = 15 * 60
+signed_urls = TTLCache(maxsize=4096, ttl=SIGNED_URL_TTL - 5 * 60)
 
 
 # =========================
@@ -24,6 +53,110 @@ def serialize_timestamp(ts):
     return None
 
 
+def _parse_watermark(value: str) -> datetime:
+    try:
+        ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Date invalide")
+    # Firestore stores UTC, naive values are assumed to be UTC as well
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts
+
+
+def _upload_file(fileobj, filename: str, content_type: str | None):
+    """Resumable, chunked upload of a spooled file, which is closed afterwards."""
+    try:
+        # 🔒 reset pointeur fichier
+        fileobj.seek(0)
+
+        blob = bucket.blob(filename, chunk_size=UPLOAD_CHUNK_SIZE)
+
+        blob.upload_from_file(
+            fileobj,
+            content_type=content_type
+        )
+    finally:
+        fileobj.close()
+
+
+def _sign(file_path: str) -> str:
+    return bucket.blob(file_path).generate_signed_url(
+        expiration=timedelta(seconds=SIGNED_URL_TTL)
+    )
+
+
+def _file_path(group_id: str, file_name: str) -> str:
+    safe_name = file_name.replace(" ", "_")
+    return f"chat-files/{group_id}/{uuid4()}_{safe_name}"
+
+
+def _check_size(size: int | None):
+    if size is not None and size > MAX_FILE_SIZE:
+        raise HTTPException(status_code=413, detail="Fichier trop volumineux")
+
+
+# =========================
+# REPLICATED WINDOW (app.utils.replica)
+# =========================
+def _split(rows: list, cursor: str, complete: bool):
+    """(strictly older, strictly newer) rows than the cursor, None if unknown."""
+    try:
+        ts = _parse_watermark(cursor)
+    except HTTPException:
+        for i, (doc, _) in enumerate(rows):
+            if doc.id == cursor:
+                return rows[:i], rows[i + 1:]
+        return None
+
+    # older than the whole window : the answer may lie outside of it
+    if not complete and (not rows or rows[0][1]["timestamp"] > ts):
+        return None
+    return (
+        [r for r in rows if r[1]["timestamp"] < ts],
+        [r for r in rows if r[1]["timestamp"] > ts]
+    )
+
+
+def _page_from_window(messages: list, complete: bool, limit, before, after, since):
+    """
+    The page of get_messages out of the last messages of the chat (oldest
+    first, ``complete`` : the whole chat), None when it may need older ones.
+    """
+    rows = [(doc, doc.to_dict()) for doc in messages]
+
+    if since is not None:
+        # edits can touch any message
+        if not complete:
+            return None
+        watermark = _parse_watermark(since)
+        page = sorted(
+            (r for r in rows if isinstance(r[1].get("updatedAt"), datetime)
+             and r[1]["updatedAt"] > watermark),
+            key=lambda r: (r[1]["updatedAt"], r[0].id)
+        )
+        return [doc for doc, _ in page[:limit]]
+
+    cursor = before if before is not None else after
+    if cursor is None:
+        if not complete:
+            return None
+        older, newer = [], rows
+    else:
+        split = _split(rows, cursor, complete)
+        if split is None:
+            return None
+        older, newer = split
+
+    if before is not None:
+        if not complete and (limit is None or len(older) < limit):
+            return None
+        page = older[-limit:] if limit is not None else older
+    else:
+        page = newer[:limit]
+    return [doc for doc, _ in page]
+
+
 # =========================
 # CHAT SERVICE
 # =========================
@@ -34,28 +167,96 @@ class ChatService:
     # =========================
     # GET MESSAGES
     # =========================
-    def get_messages(self, group_id: str):
-        ref = (
-            self.chats
-            .document(group_id)
-            .collection("messages")
-            .order_by("timestamp")
-        )
+    async def get_messages(
+        self,
+        group_id: str,
+        limit: int | None = None,
+        before: str | None = None,
+        after: str | None = None,
+        since: str | None = None
+    ):
+        """
+        Without parameters the whole history is returned (legacy clients).
+
+        - before / after : message id or ISO timestamp, pages are ordered by
+          timestamp and start strictly after / end strictly before the cursor
+        - since          : ISO watermark, only messages created or edited
+          after it (use the greatest ``updatedAt`` already received)
+        """
+        if sum(x is not None for x in (before, after, since)) > 1:
+            raise HTTPException(
+                status_code=400,
+                detail="Utiliser un seul parametre parmi before, after, since"
+            )
 
-        messages = []
-        for doc in ref.stream():
-            data = doc.to_dict()
-            data["id"] = doc.id
-            data["timestamp"] = serialize_timestamp(data.get("timestamp"))
-            data["editedAt"] = serialize_timestamp(data.get("editedAt"))
-            messages.append(data)
+        # 🛰️ WebSocket open on this worker : last messages replicated locally
+        window = replica.chat_window(group_id)
+        if window is not None:
+            page = _page_from_window(*window, limit, before, after, since)
+            if page is not None:
+                return [self._serialize(doc) for doc in page]
+
+        messages_ref = self.chats.document(group_id).collection("messages")
+
+        if since is not None:
+            query = (
+                messages_ref
+                .where(filter=FieldFilter("updatedAt", ">", _parse_watermark(since)))
+                .order_by("updatedAt")
+            )
+        elif before is not None:
+            # most recent page before the cursor, re-ordered below
+            query = (
+                messages_ref
+                .order_by("timestamp", direction=firestore.Query.DESCENDING)
+                .start_after(await self._cursor(messages_ref, before))
+            )
+        else:
+            query = messages_ref.order_by("timestamp")
+            if after is not None:
+                query = query.start_after(await self._cursor(messages_ref, after))
+
+        if limit is not None:
+            query = query.limit(limit)
+
+        messages = [self._serialize(doc) async for doc in query.stream()]
+
+        if before is not None:
+            messages.reverse()
 
         return messages
 
+    @staticmethod
+    def _serialize(doc):
+        data = doc.to_dict()
+        data["id"] = doc.id
+        data["timestamp"] = serialize_timestamp(data.get("timestamp"))
+        data["editedAt"] = serialize_timestamp(data.get("editedAt"))
+        data["updatedAt"] = serialize_timestamp(data.get("updatedAt"))
+        # legacy messages stored a 10 years signed URL : use GET files/{id}
+        data.pop("fileUrl", None)
+        return data
+
+    @staticmethod
+    async def _cursor(messages_ref, cursor: str):
+        """
+        A cursor is either a message id (resolved to its snapshot) or an
+        ISO timestamp.
+        """
+        try:
+            return {"timestamp": _parse_watermark(cursor)}
+        except HTTPException:
+            pass
+
+        snapshot = await messages_ref.document(cursor).get()
+        if not snapshot.exists:
+            raise HTTPException(status_code=400, detail="Curseur invalide")
+        return snapshot
+
     # =========================
     # SEND MESSAGE (TEXT + FILE)
     # =========================
-    def send_chat_message(
+    async def send_chat_message(
         self,
         group_id: str,
         text: str | None,
@@ -65,11 +266,181 @@ class ChatService:
         if not text and not file:
             raise HTTPException(status_code=400, detail="Message vide")
 
+        message = self._new_message(user, text)
+
+        # 📎 FICHIER : message written right away as "pending",
+        # the upload to Storage continues in the background
+        if file:
+            _check_size(file.size)
+            file_path = _file_path(group_id, file.filename)
+            message.update({
+                "type": "document",
+                "fileName": file.filename,
+                "filePath": file_path,
+                "mimeType": file.content_type,
+                "fileSize": file.size,
+                "uploadStatus": "pending"
+            })
+
+        ref = await self._add_message(group_id, message, user)
+
+        if file:
+            # detach the spooled file : FastAPI closes the UploadFile
+            # with the request, the upload task closes the spool
+            spool, file.file = file.file, io.BytesIO()
+            task = asyncio.create_task(self._finish_upload(
+                group_id, ref, spool, file_path, file.content_type
+            ))
+            _uploads.add(task)
+            task.add_done_callback(_uploads.discard)
+
+        return {"message": "Message envoyé", "id": ref.id}
+
+    # =========================
+    # RESUMABLE UPLOAD (LARGE FILES)
+    # =========================
+    async def create_upload_session(
+        self,
+        group_id: str,
+        file_name: str,
+        file_size: int,
+        mime_type: str | None,
+        text: str | None,
+        user: dict,
+        origin: str | None = None
+    ):
+        """
+        The client uploads the file straight to Storage through the
+        returned resumable session URL (PUT by chunks of ``chunkSize``),
+        then calls ``complete_upload``. The message stays "pending" until then.
+        """
+        if file_size <= 0:
+            raise HTTPException(status_code=400, detail="Fichier vide")
+        _check_size(file_size)
+
+        file_path = _file_path(group_id, file_name)
+        blob = bucket.blob(file_path, chunk_size=UPLOAD_CHUNK_SIZE)
+
+        # ⏳ Storage SDK is blocking : keep it off the event loop
+        upload_url = await asyncio.to_thread(
+            blob.create_resumable_upload_session,
+            content_type=mime_type,
+            size=file_size,
+            origin=origin
+        )
+
+        message = self._new_message(user, text)
+        message.update({
+            "type": "document",
+            "fileName": file_name,
+            "filePath": file_path,
+            "mimeType": mime_type,
+            "fileSize": file_size,
+            "uploadStatus": "pending"
+        })
+        ref = await self._add_message(group_id, message, user)
+
+        return {
+            "id": ref.id,
+            "uploadUrl": upload_url,
+            "chunkSize": UPLOAD_CHUNK_SIZE
+        }
+
+    async def complete_upload(
+        self,
+        group_id: str,
+        message_id: str,
+        user: dict
+    ):
+        ref = (
+            self.chats
+            .document(group_id)
+            .collection("messages")
+            .document(message_id)
+        )
+
+        doc = await ref.get()
+        if not doc.exists:
+            raise HTTPException(status_code=404, detail="Message introuvable")
+
+        data = doc.to_dict()
+
+        if data.get("senderId") != user["uid"]:
+            raise HTTPException(status_code=403, detail="Action interdite")
+
+        if data.get("uploadStatus") != "pending":
+            raise HTTPException(status_code=400, detail="Aucun envoi en cours")
+
+        blob = bucket.blob(data["filePath"])
+        if not await asyncio.to_thread(blob.exists):
+            raise HTTPException(status_code=409, detail="Envoi incomplet")
+
+        await asyncio.to_thread(blob.reload)
+        if blob.size > MAX_FILE_SIZE:
+            await asyncio.to_thread(blob.delete)
+            await self._set_upload_status(group_id, ref, {
+                "uploadStatus": "failed",
+                "uploadFailed": True,
+                "errorMessage": "Fichier trop volumineux"
+            })
+            raise HTTPException(status_code=413, detail="Fichier trop volumineux")
+
+        await self._set_upload_status(group_id, ref, {
+            "uploadStatus": "ready",
+            "fileSize": blob.size
+        })
+
+        return {"message": "Fichier envoyé"}
+
+    # =========================
+    # FILE DOWNLOAD (SIGNED URL)
+    # =========================
+    async def get_file_url(self, group_id: str, message_id: str, user: dict):
+        # 🔒 signed URLs only for the members of the group
+        if not await membership.is_member(user, group_id):
+            raise HTTPException(status_code=403, detail="Accès refusé")
+
+        doc = await (
+            self.chats
+            .document(group_id)
+            .collection("messages")
+            .document(message_id)
+            .get()
+        )
+        if not doc.exists:
+            raise HTTPException(status_code=404, detail="Message introuvable")
+
+        data = doc.to_dict()
+        file_path = data.get("filePath")
+        if not file_path:
+            raise HTTPException(status_code=404, detail="Aucun fichier")
+
+        if data.get("uploadStatus", "ready") != "ready":
+            raise HTTPException(status_code=409, detail="Fichier indisponible")
+
+        url = signed_urls.get(file_path)
+        if url is None:
+            # RSA signature : CPU work, off the event loop
+            url = await asyncio.to_thread(_sign, file_path)
+            signed_urls.set(file_path, url)
+
+        return {
+            "url": url,
+            "fileName": data.get("fileName"),
+            "mimeType": data.get("mimeType")
+        }
+
+    # =========================
+    # HELPERS
+    # =========================
+    @staticmethod
+    def _new_message(user: dict, text: str | None) -> dict:
         message = {
             "senderId": user["uid"],
             "senderEmail": user["email"],
             "senderRole": user["role"],
             "timestamp": firestore.SERVER_TIMESTAMP,
+            "updatedAt": firestore.SERVER_TIMESTAMP,
             "edited": False,
             "type": "text"
         }
@@ -78,53 +449,113 @@ class ChatService:
         if text:
             message["text"] = text
 
-        # 📎 FICHIER
-        if file:
-            try:
-                # 🔒 reset pointeur fichier
-                file.file.seek(0)
-
-                safe_name = file.filename.replace(" ", "_")
-                filename = f"chat-files/{group_id}/{uuid4()}_{safe_name}"
-
-                blob = bucket.blob(filename)
-
-                blob.upload_from_file(
-                    file.file,
-                    content_type=file.content_type
-                )
-
-                file_url = blob.generate_signed_url(
-                    expiration=timedelta(days=3650)
-                )
-
-                message.update({
-                    "type": "document",
-                    "fileName": file.filename,
-                    "filePath": filename,
-                    "fileUrl": file_url,
-                    "mimeType": file.content_type,
-                    "fileSize": file.size if hasattr(file, "size") else None
-                })
+        return message
+
+    async def _add_message(self, group_id: str, message: dict, user: dict):
+        # message + dashboard counters (day, sender) in one atomic commit
+        ref = self.chats.document(group_id).collection("messages").document()
+        batch = db.batch()
+        batch.set(ref, message)
+        batch.set(
+            dashboard_counters.group_day_ref(group_id, dashboard_counters.day_key()),
+            dashboard_counters.message_update(
+                group_id, dashboard_counters.day_key(), user["role"]
+            ),
+            merge=True
+        )
+        dashboard_counters.add_member_message(
+            batch, group_id, user["uid"], message.get("type") == "document"
+        )
+        update_time = (await batch.commit())[0].update_time
+
+        # SERVER_TIMESTAMP resolves to the commit time of the write
+        created = {
+            **message,
+            "id": ref.id,
+            "timestamp": serialize_timestamp(update_time),
+            "updatedAt": serialize_timestamp(update_time)
+        }
+        chat_hub.publish(group_id, {"type": "message.created", "message": created})
+
+        return ref
+
+    async def _finish_upload(self, group_id: str, ref, spool, file_path: str, content_type):
+        try:
+            await asyncio.to_thread(_upload_file, spool, file_path, content_type)
+            update = {"uploadStatus": "ready"}
+        except Exception as e:
+            # 🔥 on garde la trace même si upload échoue (détail dans les logs,
+            # le message est envoyé à tout le groupe)
+            print(f"❌ UPLOAD ERROR ({file_path}):", e)
+            update = {
+                "uploadStatus": "failed",
+                "uploadFailed": True,
+                "errorMessage": UPLOAD_FAILED
+            }
+
+        try:
+            await self._set_upload_status(group_id, ref, update)
+        except NotFound:
+            # message deleted while uploading : drop the orphan file
+            if update["uploadStatus"] == "ready":
+                await asyncio.to_thread(bucket.blob(file_path).delete)
+
+    async def expire_stale_uploads(self) -> int:
+        """
+        Marks failed the uploads pending for more than UPLOAD_TIMEOUT since
+        the message was created (scheduler), drops what was stored.
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=UPLOAD_TIMEOUT)
+        pending = (
+            db.collection_group("messages")
+            .where(filter=FieldFilter("uploadStatus", "==", "pending"))
+        )
 
-            except Exception as e:
-                # 🔥 on garde la trace même si upload échoue
-                message.update({
-                    "type": "document",
-                    "fileName": file.filename,
-                    "mimeType": file.content_type,
+        expired = 0
+        async for doc in pending.stream():
+            data = doc.to_dict()
+            parts = doc.reference.path.split("/")
+            if parts[0] != "chats" or (data.get("timestamp") or cutoff) > cutoff:
+                continue
+
+            if data.get("filePath"):
+                try:
+                    await asyncio.to_thread(bucket.blob(data["filePath"]).delete)
+                except Exception:
+                    pass  # nothing was stored
+            try:
+                await self._set_upload_status(parts[1], doc.reference, {
+                    "uploadStatus": "failed",
                     "uploadFailed": True,
-                    "errorMessage": str(e)
+                    "errorMessage": UPLOAD_FAILED
                 })
-
-        self.chats.document(group_id).collection("messages").add(message)
-
-        return {"message": "Message envoyé"}
+            except NotFound:
+                continue
+            expired += 1
+
+        if expired:
+            print(f"Stale uploads marked failed : {expired}")
+        return expired
+
+    @staticmethod
+    async def _set_upload_status(group_id: str, ref, update: dict):
+        result = await ref.update({
+            **update,
+            "updatedAt": firestore.SERVER_TIMESTAMP
+        })
+        chat_hub.publish(group_id, {
+            "type": "message.updated",
+            "message": {
+                "id": ref.id,
+                **update,
+                "updatedAt": serialize_timestamp(result.update_time)
+            }
+        })
 
     # =========================
     # UPDATE MESSAGE (TEXT ONLY)
     # =========================
-    def update_message(
+    async def update_message(
         self,
         group_id: str,
         message_id: str,
@@ -141,7 +572,7 @@ class ChatService:
             .document(message_id)
         )
 
-        doc = ref.get()
+        doc = await ref.get()
         if not doc.exists:
             raise HTTPException(status_code=404, detail="Message introuvable")
 
@@ -157,10 +588,23 @@ class ChatService:
                 detail="Type de message non supporté"
             )
 
-        ref.update({
+        result = await ref.update({
             "text": text,
             "edited": True,
-            "editedAt": firestore.SERVER_TIMESTAMP
+            "editedAt": firestore.SERVER_TIMESTAMP,
+            "updatedAt": firestore.SERVER_TIMESTAMP
+        })
+
+        edited_at = serialize_timestamp(result.update_time)
+        chat_hub.publish(group_id, {
+            "type": "message.updated",
+            "message": {
+                "id": message_id,
+                "text": text,
+                "edited": True,
+                "editedAt": edited_at,
+                "updatedAt": edited_at
+            }
         })
 
         return {"message": "Message modifié"}
@@ -168,7 +612,7 @@ class ChatService:
     # =========================
     # DELETE MESSAGE (+ FILE)
     # =========================
-    def delete_message(
+    async def delete_message(
         self,
         group_id: str,
         message_id: str,
@@ -181,7 +625,7 @@ class ChatService:
             .document(message_id)
         )
 
-        doc = ref.get()
+        doc = await ref.get()
         if not doc.exists:
             raise HTTPException(status_code=404, detail="Message introuvable")
 
@@ -192,10 +636,28 @@ class ChatService:
 
         # 🗑️ supprimer le fichier Firebase si existant
         if data.get("type") == "document" and data.get("filePath"):
+            signed_urls.invalidate(data["filePath"])
             try:
-                bucket.blob(data["filePath"]).delete()
+                await asyncio.to_thread(bucket.blob(data["filePath"]).delete)
             except Exception:
                 pass  # on ne bloque pas la suppression
 
-        ref.delete()
+        batch = db.batch()
+        batch.delete(ref)
+        day = dashboard_counters.day_key(data.get("timestamp"))
+        if day:
+            batch.set(
+                dashboard_counters.group_day_ref(group_id, day),
+                dashboard_counters.message_update(
+                    group_id, day, data.get("senderRole"), -1
+                ),
+                merge=True
+            )
+        dashboard_counters.add_member_message(
+            batch, group_id, user["uid"], data.get("type") == "document", -1
+        )
+        await daily_message_calculator.uncount_message(batch, group_id, data)
+        await batch.commit()
+        chat_hub.publish(group_id, {"type": "message.deleted", "messageId": message_id})
+
         return {"message": "Message supprimé"}
@@ -2,16 +2,16 @@ from app.complaint.services import ComplaintService
 
 service = ComplaintService()
 
-def create_complaint(title, message, user, to_prof_id=None, to_student_id=None, group_id=None, file=None):
-    return service.create_complaint(
+async def create_complaint(title, message, user, to_prof_id=None, to_student_id=None, group_id=None, file=None):
+    return await service.create_complaint(
         title, message, user, to_prof_id, to_student_id, group_id, file
     )
 
-def get_prof_complaints(user):
-    return service.get_prof_complaints(user["uid"])
+async def get_prof_complaints(user, limit=None, cursor=None, status=None, type=None):
+    return await service.get_prof_complaints(user["uid"], limit, cursor, status, type)
 
-def get_student_complaints(user):
-    return service.get_student_complaints(user["uid"])
+async def get_student_complaints(user, limit=None, cursor=None, status=None, type=None):
+    return await service.get_student_complaints(user["uid"], limit, cursor, status, type)
 
-def get_my_complaints(user):
-    return service.get_my_complaints(user["uid"])
+async def get_my_complaints(user, limit=None, cursor=None, type=None):
+    return await service.get_my_complaints(user["uid"], limit, cursor, type)
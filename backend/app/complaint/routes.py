@@ -1,5 +1,6 @@
-from fastapi import APIRouter, Depends, Form, HTTPException, File, UploadFile
+from fastapi import APIRouter, Body, Depends, Form, HTTPException, File, UploadFile, Query, Request
 from ..middleware.auth_middleware import verify_token
+from ..utils.response_cache import cached
 from .controllers import (
     create_complaint,
     get_prof_complaints,
@@ -13,11 +14,16 @@ router = APIRouter(
     tags=["complaints"]
 )
 
+# list parameters : page size, cursor = id of the last complaint received
+Limit = Query(None, ge=1, le=100)
+Status = Query(None, pattern="^(read|unread)$")
+Type = Query(None, pattern="^(individual|group)$")
+
 # =====================================================
 # CREATE COMPLAINT (STUDENT / PROF)
 # =====================================================
 @router.post("/")
-def send_complaint(
+async def send_complaint(
     title: str = Form(...),
     message: str = Form(...),
     toProfId: str | None = Form(None),
@@ -53,7 +59,7 @@ def send_complaint(
             detail="Professor must target a student or a group"
         )
 
-    return create_complaint(
+    return await create_complaint(
         title=title,
         message=message,
         user=user,
@@ -63,11 +69,29 @@ def send_complaint(
         file=file
     )
 
+# =====================================================
+# MARK SEVERAL COMPLAINTS AS READ
+# (declared before /{complaint_id} routes)
+# =====================================================
+@router.put("/read")
+async def mark_complaints_read(
+    ids: list[str] = Body(..., embed=True),
+    user=Depends(verify_token)
+):
+    """
+    Body : {"ids": [...]} (max 500), marked read in one batch
+    """
+    service = ComplaintService()
+    return await service.mark_complaints_read(
+        complaint_ids=ids,
+        user_uid=user["uid"]
+    )
+
 # =====================================================
 # MARK COMPLAINT AS READ
 # =====================================================
 @router.put("/{complaint_id}/read")
-def mark_complaint_read(
+async def mark_complaint_read(
     complaint_id: str,
     user=Depends(verify_token)
 ):
@@ -75,7 +99,7 @@ def mark_complaint_read(
     Mark complaint as read by current user
     """
     service = ComplaintService()
-    return service.mark_complaint_read(
+    return await service.mark_complaint_read(
         complaint_id=complaint_id,
         user_uid=user["uid"]
     )
@@ -84,32 +108,49 @@ def mark_complaint_read(
 # PROFESSOR → RECEIVED COMPLAINTS
 # =====================================================
 @router.get("/prof")
-def prof_complaints(user=Depends(verify_token)):
+async def prof_complaints(
+    limit: int | None = Limit,
+    cursor: str | None = None,
+    status: str | None = Status,
+    type: str | None = Type,
+    user=Depends(verify_token)
+):
     if user["role"] != "prof":
         raise HTTPException(status_code=403, detail="Access forbidden")
-    return get_prof_complaints(user)
+    return await get_prof_complaints(user, limit, cursor, status, type)
 
 # =====================================================
 # STUDENT → RECEIVED COMPLAINTS
 # =====================================================
 @router.get("/student")
-def student_complaints(user=Depends(verify_token)):
+async def student_complaints(
+    limit: int | None = Limit,
+    cursor: str | None = None,
+    status: str | None = Status,
+    type: str | None = Type,
+    user=Depends(verify_token)
+):
     if user["role"] != "student":
         raise HTTPException(status_code=403, detail="Access forbidden")
-    return get_student_complaints(user)
+    return await get_student_complaints(user, limit, cursor, status, type)
 
 # =====================================================
 # MY COMPLAINTS (SENT)
 # =====================================================
 @router.get("/my")
-def my_complaints(user=Depends(verify_token)):
-    return get_my_complaints(user)
+async def my_complaints(
+    limit: int | None = Limit,
+    cursor: str | None = None,
+    type: str | None = Type,
+    user=Depends(verify_token)
+):
+    return await get_my_complaints(user, limit, cursor, type)
 
 # =====================================================
 # UPDATE COMPLAINT (TITLE/MESSAGE) - ONLY SENDER
 # =====================================================
 @router.put("/{complaint_id}")
-def update_complaint_route(
+async def update_complaint_route(
     complaint_id: str,
     title: str | None = Form(None),
     message: str | None = Form(None),
@@ -119,7 +160,7 @@ def update_complaint_route(
     Update title/message of a complaint (only by the sender)
     """
     service = ComplaintService()
-    return service.update_complaint(
+    return await service.update_complaint(
         complaint_id=complaint_id,
         user_uid=user["uid"],
         title=title,
@@ -130,7 +171,7 @@ def update_complaint_route(
 # DELETE COMPLAINT
 # =====================================================
 @router.delete("/{complaint_id}")
-def delete_complaint(
+async def delete_complaint(
     complaint_id: str,
     user=Depends(verify_token)
 ):
@@ -138,15 +179,19 @@ def delete_complaint(
     Only sender can delete complaint
     """
     service = ComplaintService()
-    return service.delete_complaint(complaint_id)
+    return await service.delete_complaint(complaint_id)
 
 # =====================================================
 # STUDENT → GET HIS PROFESSORS
 # =====================================================
 @router.get("/student/professors")
-def get_student_professors(user=Depends(verify_token)):
+async def get_student_professors(request: Request, user=Depends(verify_token)):
     if user["role"] != "student":
         raise HTTPException(status_code=403, detail="Access forbidden")
 
     service = ComplaintService()
-    return service.get_student_professors(user["uid"])
+    return await cached(
+        request, user,
+        lambda: service.get_student_professors(user["uid"]),
+        lambda profs: [f"user:{user['uid']}", *(f"user:{p['id']}" for p in profs)]
+    )
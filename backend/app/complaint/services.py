@@ -1,8 +1,17 @@
+import asyncio
 from datetime import datetime
-from app.utils.firebase import init_firebase
-from google.cloud.firestore_v1.base_query import FieldFilter
+from fastapi import HTTPException
+from firebase_admin import firestore
+from app.utils.firebase import init_async_firebase
+from app.utils.user_resolver import UserResolver
+from app.utils import dashboard_counters, membership
+from google.api_core.exceptions import NotFound
+from google.cloud.firestore_v1.base_query import FieldFilter, Or
 
-db = init_firebase()
+db = init_async_firebase()
+
+# Firestore limit on the values of an "in" filter / disjunctions of a query
+MAX_DISJUNCTIONS = 30
 
 
 class ComplaintService:
@@ -14,7 +23,7 @@ class ComplaintService:
     # =====================================================
     # CREATE COMPLAINT (STUDENT / PROF)
     # =====================================================
-    def create_complaint(
+    async def create_complaint(
         self,
         title: str,
         message: str,
@@ -30,44 +39,64 @@ class ComplaintService:
 
         # Étudiant → Prof : UNIQUEMENT si lié par PFE
         if user["role"] == "student" and to_prof_id:
-            groups = (
-                self.groups
-                .where(filter=FieldFilter("studentIds", "array_contains", user["uid"]))
-                .where(filter=FieldFilter("profId", "==", to_prof_id))
-                .stream()
-            )
-            if not list(groups):
+            group_ids = await membership.get_user_group_ids(user)
+            groups = await asyncio.gather(*(
+                membership.get_group_members(gid) for gid in group_ids
+            ))
+            if not any(g and g["profId"] == to_prof_id for g in groups):
                 raise Exception("Ce professeur n'est pas lié à votre PFE")
 
         # Étudiant → Groupe : UNIQUEMENT si appartient au groupe
-        if user["role"] == "student" and group_id:
-            group_doc = self.groups.document(group_id).get()
-            if not group_doc.exists:
+        if group_id:
+            group = await membership.get_group_members(group_id)
+            if group is None:
                 raise Exception("Groupe introuvable")
-            if user["uid"] not in group_doc.to_dict().get("studentIds", []):
+            students = group["studentIds"]
+            if user["role"] == "student" and user["uid"] not in students:
                 raise Exception("Vous ne faites pas partie de ce groupe")
+            recipients = [uid for uid in students if uid != user["uid"]]
+        else:
+            recipients = [uid for uid in (to_prof_id, to_student_id) if uid]
 
         data = {
             "title": title,
             "message": message,
             "fromUserId": user["uid"],
+            # denormalized, kept in sync by sync_sender_name
+            "fromName": user.get("displayName") or "Utilisateur",
             "fromRole": user["role"],
             "toProfId": to_prof_id,
             "toStudentId": to_student_id,
             "groupId": group_id,
             "type": "group" if group_id else "individual",
             "readBy": [],
+            # recipients who have not read it yet : "unread" filter,
+            # readCount = recipientCount - len(unreadBy)
+            "unreadBy": recipients,
+            "recipientCount": len(recipients),
             "createdAt": datetime.utcnow()
         }
 
-        self.complaints.add(data)
+        batch = db.batch()
+        batch.set(self.complaints.document(), data)
+        dashboard_counters.add_complaint(batch, user["uid"], to_prof_id or to_student_id)
+        await batch.commit()
         return {"message": "Réclamation envoyée avec succès"}
 
     # =====================================================
     # GET COMPLAINTS RECEIVED BY PROF
     # =====================================================
-    def get_prof_complaints(self, prof_uid: str):
-        docs = self.complaints.where(filter=FieldFilter("toProfId", "==", prof_uid)).stream()
+    async def get_prof_complaints(
+        self,
+        prof_uid: str,
+        limit: int | None = None,
+        cursor: str | None = None,
+        status: str | None = None,
+        type: str | None = None
+    ):
+        query = self.complaints.where(filter=FieldFilter("toProfId", "==", prof_uid))
+        query = self._filter(query, prof_uid, status, type)
+        docs = await self._page(query, limit, await self._cursor(cursor))
         complaints = []
 
         for d in docs:
@@ -77,81 +106,139 @@ class ComplaintService:
             # Status
             c["status"] = "open" if prof_uid in c.get("readBy", []) else "not open"
 
-            # Sender name
-            sender = self.users.document(c["fromUserId"]).get()
-            c["fromName"] = (
-                sender.to_dict().get("displayName", "Utilisateur")
-                if sender.exists else "Utilisateur"
-            )
-
             complaints.append(c)
 
-        return sorted(complaints, key=lambda x: x["createdAt"], reverse=True)
+        # Sender names are stored on the complaint,
+        # complaints created before that are resolved with one get_all
+        legacy = [c for c in complaints if "fromName" not in c]
+        if legacy:
+            senders = await UserResolver(profile_only=True).get_many(
+                c["fromUserId"] for c in legacy
+            )
+            for c in legacy:
+                sender = senders.get(c["fromUserId"])
+                c["fromName"] = (
+                    sender.get("displayName", "Utilisateur")
+                    if sender is not None else "Utilisateur"
+                )
+
+        return complaints
 
     # =====================================================
     # GET COMPLAINTS RECEIVED BY STUDENT
     # =====================================================
-    def get_student_complaints(self, student_uid: str):
-        complaints = []
-
-        # 🔹 Individuelles
-        docs = self.complaints.where(filter=FieldFilter("toStudentId", "==", student_uid)).stream()
-        for d in docs:
-            c = d.to_dict()
-            c["id"] = d.id
-            c["status"] = "open" if student_uid in c.get("readBy", []) else "not open"
-            complaints.append(c)
-
-        # 🔹 Groupes
-        groups = self.groups.where("studentIds", "array_contains", student_uid).stream()
-        group_ids = [g.id for g in groups]
+    async def get_student_complaints(
+        self,
+        student_uid: str,
+        limit: int | None = None,
+        cursor: str | None = None,
+        status: str | None = None,
+        type: str | None = None
+    ):
+        group_ids, start = await asyncio.gather(
+            membership.get_user_group_ids({"uid": student_uid, "role": "student"}),
+            self._cursor(cursor)
+        )
+
+        # 🔹 Individuelles OR 🔹 Groupes in one query
+        # (more groups than a disjunction allows : one more query per chunk)
+        size = MAX_DISJUNCTIONS - 1
+        chunks = [group_ids[i:i + size] for i in range(0, len(group_ids), size)] or [[]]
+
+        queries = []
+        for n, chunk in enumerate(chunks):
+            filters = [FieldFilter("groupId", "in", chunk)] if chunk else []
+            if n == 0:
+                filters.append(FieldFilter("toStudentId", "==", student_uid))
+            query_filter = Or(filters) if len(filters) > 1 else filters[0]
+            query = self._filter(
+                self.complaints.where(filter=query_filter), student_uid, status, type
+            )
+            queries.append(self._page(query, limit, start))
 
-        for gid in group_ids:
-            docs = self.complaints.where(filter=FieldFilter("groupId", "==", gid)).stream()
+        complaints = {}
+        for docs in await asyncio.gather(*queries):
             for d in docs:
                 c = d.to_dict()
                 c["id"] = d.id
                 c["status"] = "open" if student_uid in c.get("readBy", []) else "not open"
-                complaints.append(c)
+                complaints[d.id] = c
 
-        return sorted(complaints, key=lambda x: x["createdAt"], reverse=True)
+        complaints = sorted(complaints.values(), key=lambda x: x["createdAt"], reverse=True)
+        return complaints[:limit] if limit else complaints
 
     # =====================================================
     # GET COMPLAINTS SENT BY USER
     # =====================================================
-    def get_my_complaints(self, user_uid: str):
-        docs = self.complaints.where("fromUserId", "==", user_uid).stream()
+    async def get_my_complaints(
+        self,
+        user_uid: str,
+        limit: int | None = None,
+        cursor: str | None = None,
+        type: str | None = None
+    ):
+        query = self.complaints.where(filter=FieldFilter("fromUserId", "==", user_uid))
+        query = self._filter(query, user_uid, None, type)
+        docs = await self._page(query, limit, await self._cursor(cursor))
         complaints = []
 
         for d in docs:
             c = d.to_dict()
             c["id"] = d.id
 
-            if c.get("type") == "group":
-                group_id = c.get("groupId")
-                if group_id:
-                    group_doc = self.groups.document(group_id).get()
-                    if group_doc.exists:
-                        students = group_doc.to_dict().get("studentIds", [])
-                        c["status"] = "open" if len(c.get("readBy", [])) >= len(students) else "not open"
-                    else:
-                        c["status"] = "not open"
-                else:
-                    c["status"] = "not open"
+            if "unreadBy" in c:
+                # open once every recipient has read it
+                c["readCount"] = c.get("recipientCount", 0) - len(c["unreadBy"])
+                c["status"] = "open" if not c["unreadBy"] else "not open"
+            elif c.get("type") == "group":
+                # not backfilled yet (python -m app.complaint.services)
+                c["status"] = "not open"
             else:
                 target = c.get("toProfId") or c.get("toStudentId")
                 c["status"] = "open" if target in c.get("readBy", []) else "not open"
 
             complaints.append(c)
 
-        return sorted(complaints, key=lambda x: x["createdAt"], reverse=True)
+        return complaints
+
+    # =====================================================
+    # LIST HELPERS (filters, order, pagination in Firestore)
+    # indexes : backend/firestore.indexes.json
+    # =====================================================
+    @staticmethod
+    def _filter(query, viewer_uid: str, status: str | None, type: str | None):
+        if type:
+            query = query.where(filter=FieldFilter("type", "==", type))
+        if status == "read":
+            query = query.where(filter=FieldFilter("readBy", "array_contains", viewer_uid))
+        elif status == "unread":
+            query = query.where(filter=FieldFilter("unreadBy", "array_contains", viewer_uid))
+        return query
+
+    async def _cursor(self, cursor: str | None):
+        """The cursor is the id of the last complaint of the previous page."""
+        if not cursor:
+            return None
+        snapshot = await self.complaints.document(cursor).get()
+        if not snapshot.exists:
+            raise HTTPException(status_code=400, detail="Curseur invalide")
+        return snapshot
+
+    @staticmethod
+    async def _page(query, limit: int | None, start):
+        query = query.order_by("createdAt", direction=firestore.Query.DESCENDING)
+        if start is not None:
+            query = query.start_after(start)
+        if limit:
+            query = query.limit(limit)
+        return await query.get()
 
     # =====================================================
     # UPDATE COMPLAINT (only sender)
     # =====================================================
-    def update_complaint(self, complaint_id: str, user_uid: str, title: str | None = None, message: str | None = None):
+    async def update_complaint(self, complaint_id: str, user_uid: str, title: str | None = None, message: str | None = None):
         ref = self.complaints.document(complaint_id)
-        doc = ref.get()
+        doc = await ref.get()
 
         if not doc.exists:
             raise Exception("Réclamation introuvable")
@@ -169,53 +256,135 @@ class ComplaintService:
         if not updates:
             return {"message": "Aucune modification"}
 
-        ref.update(updates)
+        await ref.update(updates)
         return {"message": "Réclamation mise à jour"}
 
     # =====================================================
     # MARK AS READ
     # =====================================================
-    def mark_complaint_read(self, complaint_id: str, user_uid: str):
-        ref = self.complaints.document(complaint_id)
-        doc = ref.get()
+    @staticmethod
+    def _read_update(user_uid: str) -> dict:
+        # array transforms : concurrent readers never overwrite each other
+        return {
+            "readBy": firestore.ArrayUnion([user_uid]),
+            "unreadBy": firestore.ArrayRemove([user_uid])
+        }
 
-        if not doc.exists:
-            raise Exception("Réclamation introuvable")
+    async def mark_complaint_read(self, complaint_id: str, user_uid: str):
+        try:
+            await self.complaints.document(complaint_id).update(self._read_update(user_uid))
+        except NotFound:
+            raise HTTPException(status_code=404, detail="Réclamation introuvable")
 
-        data = doc.to_dict()
-        read_by = data.get("readBy", [])
+        return {"message": "Réclamation marquée comme lue"}
 
-        if user_uid not in read_by:
-            read_by.append(user_uid)
-            ref.update({"readBy": read_by})
+    async def mark_complaints_read(self, complaint_ids: list, user_uid: str):
+        """One atomic batch : all marked, or none if an id is unknown."""
+        complaint_ids = list(dict.fromkeys(complaint_ids))
+        if len(complaint_ids) > 500:
+            raise HTTPException(status_code=400, detail="500 réclamations maximum")
 
-        return {"message": "Réclamation marquée comme lue"}
+        batch = db.batch()
+        for complaint_id in complaint_ids:
+            batch.update(self.complaints.document(complaint_id), self._read_update(user_uid))
+
+        try:
+            await batch.commit()
+        except NotFound:
+            raise HTTPException(status_code=404, detail="Réclamation introuvable")
+
+        return {"message": "Réclamations marquées comme lues", "count": len(complaint_ids)}
+
+    # =====================================================
+    # SENDER NAME (denormalized)
+    # =====================================================
+    async def sync_sender_name(self, user_uid: str, name: str | None):
+        """Rewrites ``fromName`` on every complaint sent by ``user_uid``."""
+        docs = await (
+            self.complaints
+            .where(filter=FieldFilter("fromUserId", "==", user_uid))
+            .select([])
+            .get()
+        )
+
+        for i in range(0, len(docs), 500):
+            batch = db.batch()
+            for d in docs[i:i + 500]:
+                batch.update(d.reference, {"fromName": name or "Utilisateur"})
+            await batch.commit()
 
     # =====================================================
     # DELETE COMPLAINT
     # =====================================================
-    def delete_complaint(self, complaint_id: str):
+    async def delete_complaint(self, complaint_id: str):
         ref = self.complaints.document(complaint_id)
-        if not ref.get().exists:
+        doc = await ref.get()
+        if not doc.exists:
             raise Exception("Réclamation introuvable")
 
-        ref.delete()
+        data = doc.to_dict()
+        batch = db.batch()
+        batch.delete(ref)
+        dashboard_counters.add_complaint(
+            batch, data["fromUserId"], data.get("toProfId") or data.get("toStudentId"), -1
+        )
+        await batch.commit()
         return {"message": "Réclamation supprimée"}
 
     # =====================================================
     # GET STUDENT PROFESSORS (PFE)
     # =====================================================
-    def get_student_professors(self, student_uid: str):
-        groups = self.groups.where(filter=FieldFilter("studentIds", "array_contains", student_uid)).stream()
-        prof_ids = set()
-
-        for g in groups:
-            prof_ids.add(g.to_dict().get("profId"))
+    async def get_student_professors(self, student_uid: str):
+        group_ids = await membership.get_user_group_ids({"uid": student_uid, "role": "student"})
+        groups = await asyncio.gather(*(
+            membership.get_group_members(gid) for gid in group_ids
+        ))
+        prof_ids = {g["profId"] for g in groups if g}
 
         professors = []
-        for pid in prof_ids:
-            doc = self.users.document(pid).get()
-            if doc.exists:
-                professors.append({"id": pid, **doc.to_dict()})
+        users = await UserResolver(profile_only=True).get_many(prof_ids)
+        for pid, u in users.items():
+            professors.append({"id": pid, **u})
 
         return professors
+
+
+# =====================================================
+# BACKFILL : unreadBy / recipientCount on complaints created before them
+#     python -m app.complaint.services
+# =====================================================
+async def backfill_read_state():
+    complaints = db.collection("complaints")
+    groups = {}
+    updates = []
+
+    async for d in complaints.stream():
+        c = d.to_dict()
+        if "unreadBy" in c:
+            continue
+
+        if c.get("groupId"):
+            if c["groupId"] not in groups:
+                g = await db.collection("groups").document(c["groupId"]).get()
+                groups[c["groupId"]] = g.to_dict().get("studentIds", []) if g.exists else []
+            recipients = [uid for uid in groups[c["groupId"]] if uid != c.get("fromUserId")]
+        else:
+            recipients = [uid for uid in (c.get("toProfId"), c.get("toStudentId")) if uid]
+
+        read_by = c.get("readBy", [])
+        updates.append((d.reference, {
+            "unreadBy": [uid for uid in recipients if uid not in read_by],
+            "recipientCount": len(recipients)
+        }))
+
+    for i in range(0, len(updates), 500):
+        batch = db.batch()
+        for ref, data in updates[i:i + 500]:
+            batch.update(ref, data)
+        await batch.commit()
+
+    print(f"Complaints backfilled : {len(updates)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(backfill_read_state())
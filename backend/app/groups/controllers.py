@@ -2,20 +2,23 @@ from app.groups.services import GroupService
 
 service = GroupService()
 
-def get_my_group(user):
-    return service.get_my_group(user)
+async def get_my_group(user):
+    return await service.get_my_group(user)
 
-def get_prof_groups(user):
-    return service.get_prof_groups(user)
+async def get_prof_groups(user):
+    return await service.get_prof_groups(user)
 
-def update_group_progress(group_id, progress, user):
-    return service.update_group_progress(group_id, progress, user)
+async def update_group_progress(group_id, progress, user):
+    return await service.update_group_progress(group_id, progress, user)
 
-def add_group_note(group_id, note_data, user):
-    return service.add_group_note(group_id, note_data, user)
+async def get_group_notes(group_id, user, limit=None, cursor=None):
+    return await service.get_group_notes(group_id, user, limit, cursor)
 
-def update_group_note(group_id, note_data, user):
-    return service.update_group_note(group_id, note_data, user)
+async def add_group_note(group_id, note_data, user):
+    return await service.add_group_note(group_id, note_data, user)
 
-def delete_group_note(group_id, timestamp, user):
-    return service.delete_group_note(group_id, timestamp, user)
+async def update_group_note(group_id, note_id, note_data, user):
+    return await service.update_group_note(group_id, note_id, note_data, user)
+
+async def delete_group_note(group_id, note_id, user):
+    return await service.delete_group_note(group_id, note_id, user)
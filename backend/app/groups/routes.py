@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, Form
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, Depends, Form, Query, Request
 from ..middleware.auth_middleware import verify_token
+from ..utils.response_cache import cached, group_tags
 from .controllers import (
     get_my_group,
     get_prof_groups,
     update_group_progress,
+    get_group_notes,
     add_group_note,
     update_group_note,
     delete_group_note
@@ -13,50 +17,70 @@ router = APIRouter(prefix="/groups", tags=["Groups"])
 
 # 👨‍🎓 ÉTUDIANT → SON GROUPE AUTO
 @router.get("/my-group")
-def my_group(user=Depends(verify_token)):
-    return get_my_group(user)
+async def my_group(request: Request, user=Depends(verify_token)):
+    return await cached(
+        request, user,
+        lambda: get_my_group(user),
+        lambda group: group_tags(user["uid"], [group] if group else [])
+    )
 
 # 👨‍🏫 PROF → SES GROUPES
 @router.get("/prof")
-def prof_groups(user=Depends(verify_token)):
-    return get_prof_groups(user)
+async def prof_groups(request: Request, user=Depends(verify_token)):
+    return await cached(
+        request, user,
+        lambda: get_prof_groups(user),
+        lambda groups: group_tags(user["uid"], groups)
+    )
 
 # 🔄 UPDATE PROGRESS (PROF + ÉTUDIANTS)
 @router.put("/{group_id}/progress")
-def update_progress(
+async def update_progress(
     group_id: str,
     progress: int = Form(...),
     user=Depends(verify_token)
 ):
-    return update_group_progress(group_id, progress, user)
+    return await update_group_progress(group_id, progress, user)
+
+# 📄 NOTES (ÉTUDIANTS + PROF), plus récentes d'abord
+@router.get("/{group_id}/notes")
+async def list_notes(
+    group_id: str,
+    limit: int | None = Query(None, ge=1, le=100),
+    cursor: str | None = None,
+    user=Depends(verify_token)
+):
+    return await get_group_notes(group_id, user, limit, cursor)
 
 # ➕ ADD NOTE (ÉTUDIANTS)
 @router.post("/{group_id}/notes")
-def add_note(
+async def add_note(
     group_id: str,
     text: str = Form(...),
-    timestamp: str = Form(...),
+    timestamp: str | None = Form(None),
     user=Depends(verify_token)
 ):
-    note_data = {"text": text, "timestamp": timestamp}
-    return add_group_note(group_id, note_data, user)
+    note_data = {
+        "text": text,
+        "timestamp": timestamp or datetime.now(timezone.utc).isoformat()
+    }
+    return await add_group_note(group_id, note_data, user)
 
 # ✏️ UPDATE NOTE (ÉTUDIANTS)
-@router.put("/{group_id}/notes/{timestamp}")
-def update_note(
+@router.put("/{group_id}/notes/{note_id}")
+async def update_note(
     group_id: str,
-    timestamp: str,
+    note_id: str,
     text: str = Form(...),
     user=Depends(verify_token)
 ):
-    note_data = {"text": text, "timestamp": timestamp}
-    return update_group_note(group_id, note_data, user)
+    return await update_group_note(group_id, note_id, {"text": text}, user)
 
 # 🗑️ DELETE NOTE (ÉTUDIANTS)
-@router.delete("/{group_id}/notes/{timestamp}")
-def delete_note(
+@router.delete("/{group_id}/notes/{note_id}")
+async def delete_note(
     group_id: str,
-    timestamp: str,
+    note_id: str,
     user=Depends(verify_token)
 ):
-    return delete_group_note(group_id, timestamp, user)
+    return await delete_group_note(group_id, note_id, user)
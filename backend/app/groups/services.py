@@ -1,19 +1,27 @@
-from app.utils.firebase import init_firebase
+import asyncio
+from datetime import datetime, timezone
+
+from firebase_admin import firestore
+from google.api_core.exceptions import NotFound
+from app.utils.firebase import init_async_firebase
+from app.utils.user_resolver import UserResolver
+from app.utils import membership, response_cache
+from app.utils.replica import replica
 from google.cloud.firestore_v1.base_query import FieldFilter
-db = init_firebase()
+db = init_async_firebase()
 
 class GroupService:
     def __init__(self):
         self.groups = db.collection("groups")
         self.users = db.collection("users")
 
-    def _get_students_details(self, student_ids):
+    async def _get_students_details(self, student_ids, resolver: UserResolver):
         """Helper method to fetch student details from user IDs."""
         students = []
+        users = await resolver.get_many(student_ids)
         for uid in student_ids:
-            user_doc = self.users.document(uid).get()
-            if user_doc.exists:
-                u = user_doc.to_dict()
+            u = users.get(uid)
+            if u is not None:
                 students.append({
                     "uid": uid,
                     "name": u.get("displayName", "Étudiant"),
@@ -21,133 +29,272 @@ class GroupService:
                 })
         return students
 
+    def _from_replica(self, user):
+        """Groups of the user from the local replica, None when it is off."""
+        group_ids = replica.group_ids(user)
+        if group_ids is None:
+            return None
+        return replica.get_groups(group_ids)
+
     # 👨‍🎓 ÉTUDIANT → récupérer automatiquement SON groupe
-    def get_my_group(self, user):
-        docs = self.groups.where(
+    async def get_my_group(self, user):
+        groups = self._from_replica({"uid": user["uid"], "role": "student"})
+        if groups is not None:
+            if not groups:
+                return None
+            data = groups[0]
+            data["students"] = await self._get_students_details(
+                data.get("studentIds", []), UserResolver(profile_only=True)
+            )
+            return data
+
+        docs = await self.groups.where(
             filter=FieldFilter("studentIds", "array_contains", user["uid"])
-        ).stream()
+        ).limit(1).get()
 
         for d in docs:
             data = d.to_dict()
             data["groupId"] = d.id
-            data["students"] = self._get_students_details(data.get("studentIds", []))
+            # legacy notes array, left out : notes live in groups/{id}/notes
+            # once migrated (python -m app.groups.services, required)
+            data.pop("notes", None)
+            data["students"] = await self._get_students_details(
+                data.get("studentIds", []), UserResolver(profile_only=True)
+            )
             return data
 
         return None
 
     # 👨‍🏫 PROF → récupérer ses groupes
-    def get_prof_groups(self, user):
-        docs = self.groups.where("profId", "==", user["uid"]).stream()
-        res = []
-
-        for d in docs:
-            data = d.to_dict()
-            data["groupId"] = d.id
-            data["students"] = self._get_students_details(data.get("studentIds", []))
-            res.append(data)
+    async def get_prof_groups(self, user):
+        res = self._from_replica({"uid": user["uid"], "role": "prof"})
+        if res is None:
+            res = []
+            docs = self.groups.where(filter=FieldFilter("profId", "==", user["uid"])).stream()
+            async for d in docs:
+                data = d.to_dict()
+                data["groupId"] = d.id
+                data.pop("notes", None)
+                res.append(data)
+
+        # one get_all for the students of every group
+        resolver = UserResolver(profile_only=True)
+        await resolver.get_many(
+            uid for data in res for uid in data.get("studentIds", [])
+        )
+        for data in res:
+            data["students"] = await self._get_students_details(
+                data.get("studentIds", []), resolver
+            )
 
         return res
 
     # 🔄 UPDATE PROGRESS (PROF + ÉTUDIANTS DU GROUPE)
-    def update_group_progress(self, group_id, progress, user):
-        ref = self.groups.document(group_id)
-        doc = ref.get()
+    async def update_group_progress(self, group_id, progress, user):
+        group = await membership.get_group_members(group_id)
 
-        if not doc.exists:
+        if group is None:
             raise Exception("Group not found")
 
-        group = doc.to_dict()
-
         # permissions
         if user["role"] == "student":
-            if user["uid"] not in group.get("studentIds", []):
+            if user["uid"] not in group["studentIds"]:
                 raise Exception("Forbidden")
 
         if user["role"] == "prof":
-            if group.get("profId") != user["uid"]:
+            if group["profId"] != user["uid"]:
                 raise Exception("Forbidden")
 
-        ref.update({"progress": progress})
+        await self.groups.document(group_id).update({"progress": progress})
+        response_cache.invalidate_group(group_id)
         return {"message": "Progress updated", "progress": progress}
 
-    # ➕ ADD NOTE (ÉTUDIANTS DU GROUPE)
-    def add_group_note(self, group_id, note_data, user):
-        ref = self.groups.document(group_id)
-        doc = ref.get()
+    # =========================
+    # NOTES : groups/{id}/notes/{noteId}
+    # the group document only keeps a copy of the last note (lastNote)
+    # =========================
+    async def _get_group_for(self, group_id, user, students_only=True, cached=True):
+        """
+        Permission check. With ``cached`` only the members are returned
+        (membership cache), otherwise the whole group document.
+        """
+        if cached:
+            group = await membership.get_group_members(group_id)
+        else:
+            doc = await self.groups.document(group_id).get()
+            group = doc.to_dict() if doc.exists else None
 
-        if not doc.exists:
+        if group is None:
             raise Exception("Group not found")
 
-        group = doc.to_dict()
+        is_student = user["role"] == "student" and user["uid"] in group.get("studentIds", [])
+        is_prof = user["role"] == "prof" and group.get("profId") == user["uid"]
 
-        # permissions: only students in the group can add notes
-        if user["role"] != "student" or user["uid"] not in group.get("studentIds", []):
+        # permissions: only students in the group can write notes
+        if not is_student and (students_only or not (is_prof or user["role"] == "admin")):
             raise Exception("Forbidden")
 
-        # Get current notes or initialize empty list
-        notes = group.get("notes", [])
-
-        # Append new note
-        notes.append(note_data)
-
-        # Update the document
-        ref.update({"notes": notes})
-        return {"message": "Note added", "note": note_data}
+        return group
+
+    @staticmethod
+    def _serialize_note(doc):
+        note = doc.to_dict()
+        note["id"] = doc.id
+        for field in ("createdAt", "updatedAt"):
+            if isinstance(note.get(field), datetime):
+                note[field] = note[field].isoformat()
+        return note
+
+    # 📄 LIST NOTES (GROUPE + PROF), most recent first
+    async def get_group_notes(self, group_id, user, limit=None, cursor=None):
+        notes_ref = self.groups.document(group_id).collection("notes")
+
+        query = notes_ref.order_by("createdAt", direction=firestore.Query.DESCENDING)
+        check = self._get_group_for(group_id, user, students_only=False)
+
+        # cursor : id of the last note of the previous page
+        if cursor:
+            _, start = await asyncio.gather(check, notes_ref.document(cursor).get())
+            if not start.exists:
+                raise Exception("Note not found")
+            query = query.start_after(start)
+        else:
+            await check
 
-    # ✏️ UPDATE NOTE (ÉTUDIANTS DU GROUPE)
-    def update_group_note(self, group_id, note_data, user):
-        ref = self.groups.document(group_id)
-        doc = ref.get()
+        if limit:
+            query = query.limit(limit)
 
-        if not doc.exists:
-            raise Exception("Group not found")
+        return [self._serialize_note(d) for d in await query.get()]
 
-        group = doc.to_dict()
+    # ➕ ADD NOTE (ÉTUDIANTS DU GROUPE)
+    async def add_group_note(self, group_id, note_data, user):
+        await self._get_group_for(group_id, user)
+
+        group_ref = self.groups.document(group_id)
+        note_ref = group_ref.collection("notes").document()
+        note = {
+            **note_data,
+            "authorId": user["uid"],
+            "createdAt": firestore.SERVER_TIMESTAMP,
+            "updatedAt": firestore.SERVER_TIMESTAMP
+        }
+
+        batch = db.batch()
+        batch.set(note_ref, note)
+        batch.update(group_ref, {"lastNote": {"id": note_ref.id, **note_data}})
+        await batch.commit()
+        response_cache.invalidate_group(group_id)
+
+        return {"message": "Note added", "note": {"id": note_ref.id, **note_data}}
 
-        # permissions: only students in the group can update notes
-        if user["role"] != "student" or user["uid"] not in group.get("studentIds", []):
-            raise Exception("Forbidden")
+    # ✏️ UPDATE NOTE (ÉTUDIANTS DU GROUPE)
+    async def update_group_note(self, group_id, note_id, note_data, user):
+        # the document is needed for lastNote
+        group = await self._get_group_for(group_id, user, cached=False)
+
+        group_ref = self.groups.document(group_id)
+        batch = db.batch()
+        batch.update(group_ref.collection("notes").document(note_id), {
+            **note_data,
+            "updatedAt": firestore.SERVER_TIMESTAMP
+        })
+        if (group.get("lastNote") or {}).get("id") == note_id:
+            batch.update(group_ref, {
+                f"lastNote.{field}": value for field, value in note_data.items()
+            })
+
+        try:
+            await batch.commit()
+        except NotFound:
+            raise Exception("Note not found")
+        response_cache.invalidate_group(group_id)
 
-        # Get current notes
-        notes = group.get("notes", [])
+        return {"message": "Note updated", "note": {"id": note_id, **note_data}}
 
-        # Find and update the note by timestamp
-        for i, note in enumerate(notes):
-            if note.get("timestamp") == note_data.get("timestamp"):
-                notes[i] = note_data
-                break
-        else:
+    # 🗑️ DELETE NOTE (ÉTUDIANTS DU GROUPE)
+    async def delete_group_note(self, group_id, note_id, user):
+        group_ref = self.groups.document(group_id)
+        note_ref = group_ref.collection("notes").document(note_id)
+
+        group, note = await asyncio.gather(
+            self._get_group_for(group_id, user, cached=False),
+            note_ref.get()
+        )
+        if not note.exists:
             raise Exception("Note not found")
 
-        # Update the document
-        ref.update({"notes": notes})
-        return {"message": "Note updated", "note": note_data}
+        await note_ref.delete()
+
+        # the last note was deleted : the previous one takes its place
+        if (group.get("lastNote") or {}).get("id") == note_id:
+            previous = await (
+                group_ref.collection("notes")
+                .order_by("createdAt", direction=firestore.Query.DESCENDING)
+                .limit(1)
+                .get()
+            )
+            if previous:
+                # same fields as add_group_note : the note as posted
+                data = previous[0].to_dict()
+                last_note = {"id": previous[0].id, **{
+                    field: value for field, value in data.items()
+                    if field not in ("authorId", "createdAt", "updatedAt")
+                }}
+            else:
+                last_note = firestore.DELETE_FIELD
+            await group_ref.update({"lastNote": last_note})
+            response_cache.invalidate_group(group_id)
+
+        return {"message": "Note deleted", "note": self._serialize_note(note)}
+
+
+# =========================
+# MIGRATION : notes array -> notes subcollection
+#     python -m app.groups.services
+# =========================
+async def migrate_notes():
+    """
+    Idempotent : note ids are derived from their position in the old
+    array, the array is removed in the batch of the last notes.
+    """
+    migrated = 0
+
+    async for g in db.collection("groups").stream():
+        notes = g.to_dict().get("notes")
+        if notes is None:
+            continue
+
+        group_ref = db.collection("groups").document(g.id)
+        writes = []
+        for i, note in enumerate(notes):
+            created = _parse_note_time(note.get("timestamp"))
+            writes.append((group_ref.collection("notes").document(f"legacy-{i:04d}"), {
+                **note,
+                "createdAt": created,
+                "updatedAt": created
+            }))
 
-    # 🗑️ DELETE NOTE (ÉTUDIANTS DU GROUPE)
-    def delete_group_note(self, group_id, timestamp, user):
-        ref = self.groups.document(group_id)
-        doc = ref.get()
+        last = {"lastNote": {"id": f"legacy-{len(notes) - 1:04d}", **notes[-1]}} if notes else {}
+        for i in range(0, max(len(writes), 1), 499):
+            batch = db.batch()
+            for ref, data in writes[i:i + 499]:
+                batch.set(ref, data)
+            if i + 499 >= len(writes):
+                batch.update(group_ref, {"notes": firestore.DELETE_FIELD, **last})
+            await batch.commit()
 
-        if not doc.exists:
-            raise Exception("Group not found")
+        migrated += len(notes)
 
-        group = doc.to_dict()
+    print(f"Group notes migrated : {migrated}")
 
-        # permissions: only students in the group can delete notes
-        if user["role"] != "student" or user["uid"] not in group.get("studentIds", []):
-            raise Exception("Forbidden")
 
-        # Get current notes
-        notes = group.get("notes", [])
+def _parse_note_time(value):
+    try:
+        ts = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return datetime.now(timezone.utc)
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
 
-        # Find and remove the note by timestamp
-        for i, note in enumerate(notes):
-            if note.get("timestamp") == timestamp:
-                deleted_note = notes.pop(i)
-                break
-        else:
-            raise Exception("Note not found")
 
-        # Update the document
-        ref.update({"notes": notes})
-        return {"message": "Note deleted", "note": deleted_note}
+if __name__ == "__main__":
+    asyncio.run(migrate_notes())
@@ -1,4 +1,7 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
@@ -10,18 +13,56 @@ from .chat.routes import router as chat_router
 from .complaint.routes import router as complaint_router
 from .calendar.routes import router as calendar_router
 from .groups.routes import router as groups_router
+from .chat.controllers import expire_stale_uploads
+from .chat.hub import chat_hub
+from .chat.services import MAX_FILE_SIZE
+from .middleware.body_limit import BodySizeLimitMiddleware
+from .middleware.request_metrics import DEBUG_HEADER_NAMES, RequestMetricsMiddleware
+from .utils import metrics
 from .utils.daily_message_calculator import calculate_daily_message_counts
+from .utils.outbox import outbox
+from .utils.replica import replica
 
 
-app = FastAPI()
-
 # Set up scheduler for daily message calculation
+# incremental : each run only reads the messages since the previous one, so
+# it runs every 15 minutes (today's counts stay fresh) instead of once at 1 AM
 scheduler = AsyncIOScheduler()
-scheduler.add_job(calculate_daily_message_counts, 'cron', hour=1)  # Run daily at 1 AM
-scheduler.start()
+scheduler.add_job(
+    calculate_daily_message_counts, 'interval', minutes=15,
+    max_instances=1, coalesce=True
+)
+# uploads left pending by a restarted worker or an abandoned client
+scheduler.add_job(
+    expire_stale_uploads, 'interval', minutes=10,
+    max_instances=1, coalesce=True
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # started here so that they bind to the server event loop
+    scheduler.start()
+    await chat_hub.start()
+    await outbox.start()
+    # optional (FIRESTORE_LISTENERS=1) : users / groups / open chats kept in memory
+    await replica.start()
+    yield
+    await replica.stop()
+    await outbox.stop()
+    await chat_hub.stop()
+    scheduler.shutdown(wait=False)
+
+
+app = FastAPI(lifespan=lifespan)
+
+# before CORS so that 413 responses still carry the CORS headers
+# (+1 MiB for the other form fields)
+app.add_middleware(BodySizeLimitMiddleware, max_size=MAX_FILE_SIZE + 1024 * 1024)
 
 app.add_middleware(
     CORSMiddleware,
+    expose_headers=DEBUG_HEADER_NAMES,
     allow_origins=[
         "http://localhost:3000",
         "http://localhost:3001",
@@ -32,6 +73,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# outermost : the latency includes the other middlewares
+app.add_middleware(RequestMetricsMiddleware)
+
 app.include_router(auth_router)
 app.include_router(admin_router)
 app.include_router(prof_router)
@@ -40,3 +84,11 @@ app.include_router(chat_router)
 app.include_router(complaint_router)
 app.include_router(calendar_router)
 app.include_router(groups_router)
+
+
+# =========================
+# PROMETHEUS
+# =========================
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
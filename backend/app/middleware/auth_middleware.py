@@ -1,11 +1,63 @@
+import asyncio
+import hashlib
+import time
+
 from fastapi import Header, HTTPException
 from firebase_admin import auth
-from ..utils.firebase import init_firebase
+from ..utils.cache import TTLCache
+from ..utils.firebase import init_async_firebase
+from ..utils.replica import replica
 
 # 🔥 Firestore initialisé UNE SEULE FOIS
-db = init_firebase()
+db = init_async_firebase()
+
+# 🗃️ Tokens déjà vérifiés (clé = hash du token, jamais au-delà de "exp")
+token_cache = TTLCache(maxsize=10000, ttl=300)
+# 🗃️ Profils users/{uid}, invalidés par AdminService
+user_cache = TTLCache(maxsize=10000, ttl=60)
+
+
+async def _verify_firebase_token(token: str) -> dict:
+    key = hashlib.sha256(token.encode()).hexdigest()
+
+    decoded = token_cache.get(key)
+    if decoded is None:
+        # RSA check (+ occasional key refresh) : blocking
+        decoded = await asyncio.to_thread(auth.verify_id_token, token)
+        token_cache.set(
+            key,
+            decoded,
+            ttl=min(token_cache.ttl, decoded.get("exp", 0) - time.time())
+        )
 
-def verify_token(authorization: str = Header(None)):
+    return decoded
+
+
+async def _get_user_profile(uid: str) -> dict | None:
+    # 🛰️ listeners on : profile kept up to date locally
+    user = replica.get_user(uid)
+    if user is not None:
+        return user
+
+    user = user_cache.get(uid)
+    if user is None:
+        doc = await db.collection("users").document(uid).get()
+        if not doc.exists:
+            return None
+        user = doc.to_dict()
+        user_cache.set(uid, user)
+
+    return dict(user)
+
+
+def invalidate_user(uid: str):
+    user_cache.invalidate(uid)
+
+
+def cache_stats() -> dict:
+    return {"tokens": token_cache.stats(), "users": user_cache.stats()}
+
+async def verify_token(authorization: str = Header(None)):
     # ⚠️ IMPORTANT : Header(None) pour laisser passer OPTIONS (CORS)
     if authorization is None:
         raise HTTPException(status_code=401, detail="Missing Authorization header")
@@ -25,14 +77,13 @@ def verify_token(authorization: str = Header(None)):
 
     # ================= FIREBASE TOKEN =================
     try:
-        decoded = auth.verify_id_token(token)
+        decoded = await _verify_firebase_token(token)
         uid = decoded["uid"]
 
-        doc = db.collection("users").document(uid).get()
-        if not doc.exists:
+        user = await _get_user_profile(uid)
+        if user is None:
             raise HTTPException(status_code=401, detail="User not found")
 
-        user = doc.to_dict()
         user["uid"] = uid
         user.setdefault("role", "student")
 
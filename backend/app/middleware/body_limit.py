@@ -0,0 +1,41 @@
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+
+TOO_LARGE = "Fichier trop volumineux"
+
+
+class BodySizeLimitMiddleware:
+    """
+    Rejects request bodies larger than ``max_size`` with a 413 before they
+    are spooled : upfront from Content-Length, otherwise as soon as the
+    streamed body (chunked transfer) goes over the limit.
+    """
+
+    def __init__(self, app, max_size: int):
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_size:
+            response = JSONResponse({"detail": TOO_LARGE}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_size:
+                    # re-raised by FastAPI while it parses the body
+                    raise HTTPException(status_code=413, detail=TOO_LARGE)
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,87 @@
+import os
+import time
+
+from app.utils import metrics
+from app.utils.firestore_tracing import RequestStats, current_stats
+
+# METRICS_DEBUG_HEADERS=1 : X-Firestore-* and Server-Timing on every response
+DEBUG_HEADERS = os.getenv("METRICS_DEBUG_HEADERS", "0") == "1"
+# requests slower than this are logged with their Firestore calls (0 : off)
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", 1000))
+
+DEBUG_HEADER_NAMES = [
+    "X-Firestore-Reads", "X-Firestore-Writes", "X-Firestore-RPCs",
+    "X-Firestore-Time-Ms", "Server-Timing"
+]
+
+
+def _route(scope) -> str:
+    # path template, not the raw path : bounded label cardinality
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class RequestMetricsMiddleware:
+    """
+    Per request : latency and Firestore reads / writes / RPCs / time
+    (app.utils.firestore_tracing), recorded in the Prometheus metrics
+    under the route template, optionally returned as debug headers, and
+    logged with the list of calls when the request is slow.
+    """
+
+    def __init__(self, app, debug_headers: bool = DEBUG_HEADERS, slow_ms: float = SLOW_REQUEST_MS):
+        self.app = app
+        self.debug_headers = debug_headers
+        self.slow_ms = slow_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_stats(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.debug_headers:
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-firestore-reads", str(stats.reads).encode()),
+                        (b"x-firestore-writes", str(stats.writes).encode()),
+                        (b"x-firestore-rpcs", str(stats.rpcs).encode()),
+                        (b"x-firestore-time-ms", f"{stats.seconds * 1000:.1f}".encode()),
+                        (b"server-timing", f"firestore;dur={stats.seconds * 1000:.1f}".encode()),
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            current_stats.reset(token)
+            self._record(scope, status, stats, time.perf_counter() - start)
+
+    def _record(self, scope, status, stats, elapsed):
+        method, route = scope["method"], _route(scope)
+
+        metrics.http_requests.inc(method, route, str(status))
+        metrics.http_duration.observe(method, route, value=elapsed)
+        metrics.firestore_reads.inc(method, route, value=stats.reads)
+        metrics.firestore_writes.inc(method, route, value=stats.writes)
+        metrics.firestore_rpcs.inc(method, route, value=stats.rpcs)
+        metrics.firestore_seconds.inc(method, route, value=stats.seconds)
+        metrics.firestore_reads_per_request.observe(method, route, value=stats.reads)
+
+        if self.slow_ms and elapsed * 1000 >= self.slow_ms:
+            print(
+                f"🐢 SLOW {method} {scope['path']} ({route}) {status} : {elapsed * 1000:.0f} ms, "
+                f"{stats.reads} reads, {stats.writes} writes, {stats.rpcs} RPCs "
+                f"({stats.seconds * 1000:.0f} ms in Firestore)"
+            )
+            for op, target, reads, writes, seconds in stats.calls:
+                print(f"    {op:<8} {target} : {reads} reads, {writes} writes, {seconds * 1000:.1f} ms")
+            if stats.rpcs > len(stats.calls):
+                print(f"    ... {stats.rpcs - len(stats.calls)} more calls")
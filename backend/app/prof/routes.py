@@ -11,19 +11,19 @@ router = APIRouter(
 # ÉTUDIANTS DU PROF
 # =========================
 @router.get("/students-details")
-def students_details(user=Depends(verify_token)):
-    return get_students_with_details(user)
+async def students_details(user=Depends(verify_token)):
+    return await get_students_with_details(user)
 
 # =========================
 # DASHBOARD STATS
 # =========================
 @router.get("/dashboard-stats")
-def dashboard_stats(user=Depends(verify_token)):
-    return get_dashboard_stats(user)
+async def dashboard_stats(user=Depends(verify_token)):
+    return await get_dashboard_stats(user)
 
 # =========================
 # MESSAGES FROM PROF TODAY FOR GROUP
 # =========================
 @router.get("/messages-from-prof-today/{group_id}")
-def messages_from_prof_today(group_id: str, user=Depends(verify_token)):
-    return get_messages_from_prof_today_for_group(user, group_id)
+async def messages_from_prof_today(group_id: str, user=Depends(verify_token)):
+    return await get_messages_from_prof_today_for_group(user, group_id)
@@ -1,142 +1,70 @@
-from app.utils.firebase import init_firebase
+import asyncio
+from app.utils.firebase import init_async_firebase
+from app.utils.user_resolver import UserResolver
+from app.utils import dashboard_counters
+from app.calendar import repository as calendar_repository
 
-db = init_firebase()
+db = init_async_firebase()
 
 
 class ProfService:
     def __init__(self):
         self.groups = db.collection("groups")
         self.users = db.collection("users")
-        self.documents = db.collection("documents")
         self.complaints = db.collection("complaints")
 
-    def get_students_with_details(self, prof_uid: str):
-        students_details = []
-
+    async def get_students_with_details(self, prof_uid: str):
         # 🔹 récupérer les groupes du prof
-        groups = self.groups.where("profId", "==", prof_uid).stream()
-        groups_list = list(groups)
-        print(f"DEBUG: Found {len(groups_list)} groups for prof {prof_uid}")
+        groups_list = await self.groups.where("profId", "==", prof_uid).get()
 
+        rows = []
         for group in groups_list:
             g = group.to_dict()
-            group_id = group.id
-            project_title = g.get("projectTitle", "Sans projet")
-
-            student_ids = g.get("studentIds", [])
-            print(f"DEBUG: Group {group_id} has students: {student_ids}")
-
-            for uid in student_ids:
-                user_doc = self.users.document(uid).get()
-                if not user_doc.exists:
-                    continue
-
-                u = user_doc.to_dict()
-
-                # 📄 nombre de documents
-                docs = (
-                    self.documents
-                    .where("uploadedBy", "==", uid)
-                    .where("groupId", "==", group_id)
-                    .stream()
-                )
-                doc_count = len(list(docs))
-
-                # 💬 nombre de messages
-                msgs = (
-                    db.collection("chats")
-                    .document(group_id)
-                    .collection("messages")
-                    .where("senderId", "==", uid)
-                    .stream()
-                )
-                msg_count = len(list(msgs))
-
-                students_details.append({
-                    "uid": uid,
-                    "name": u.get("displayName", "Étudiant"),
-                    "email": u.get("email"),
-                    "projectTitle": project_title,
-                    "documentCount": doc_count,
-                    "messageCount": msg_count
-                })
-
-        return students_details
-
-    def get_dashboard_stats(self, prof_uid: str):
-        from datetime import datetime, timezone
-
-        today = datetime.now(timezone.utc).date()
-
-        # Total complaints
-        complaints = self.complaints.where("toProfId", "==", prof_uid).stream()
-        total_complaints = len(list(complaints))
-
-        # Total tasks today
-        total_tasks_today = 0
-        total_tasks = 0
-        groups = self.groups.where("profId", "==", prof_uid).stream()
-        for group in groups:
-            group_id = group.id
-            tasks = (
-                db.collection("calendar")
-                .where("groupId", "==", group_id)
-                .where("type", "==", "task")
-                .stream()
-            )
-            for task in tasks:
-                task_data = task.to_dict()
-                total_tasks += 1  # Count all tasks
-                task_date = task_data.get("date")
-                if task_date:
-                    # Assuming date is in YYYY-MM-DD format
-                    if isinstance(task_date, str):
-                        task_date_parsed = datetime.fromisoformat(task_date).date()
-                    else:
-                        task_date_parsed = task_date.date()
-                    if task_date_parsed == today:
-                        total_tasks_today += 1
-
-        # Total messages today from students and prof
-        total_messages_from_students_today = 0
-        total_messages_from_prof_today = 0
-        groups = self.groups.where("profId", "==", prof_uid).stream()
-        for group in groups:
-            group_id = group.id
-            messages = db.collection("chats").document(group_id).collection("messages").stream()
-            for msg in messages:
-                msg_data = msg.to_dict()
-                timestamp = msg_data.get("timestamp")
-                sender_id = msg_data.get("senderId")
-                if timestamp:
-                    msg_date = timestamp.date()
-                    if msg_date == today:
-                        if sender_id == prof_uid:
-                            total_messages_from_prof_today += 1
-                        else:
-                            total_messages_from_students_today += 1
+            for uid in g.get("studentIds", []):
+                rows.append((group.id, g.get("projectTitle", "Sans projet"), uid))
+
+        # 🔹 profils et compteurs (app.utils.dashboard_counters) : un get_all chacun
+        users, counts = await asyncio.gather(
+            UserResolver(profile_only=True).get_many(uid for _, _, uid in rows),
+            dashboard_counters.read_members((group_id, uid) for group_id, _, uid in rows)
+        )
+
+        return [
+            {
+                "uid": uid,
+                "name": users[uid].get("displayName", "Étudiant"),
+                "email": users[uid].get("email"),
+                "projectTitle": project_title,
+                "documentCount": counts[(group_id, uid)]["documents"],
+                "messageCount": counts[(group_id, uid)]["messages"]
+            }
+            for group_id, project_title, uid in rows
+            if uid in users
+        ]
+
+    async def get_dashboard_stats(self, prof_uid: str):
+        today = dashboard_counters.day_key()
+
+        groups = await self.groups.where("profId", "==", prof_uid).get()
+        group_ids = [group.id for group in groups]
+
+        # prof + every group for today : one get_all, tasks : one count()
+        counts, tasks = await asyncio.gather(
+            dashboard_counters.read_dashboard(prof_uid, group_ids, today),
+            calendar_repository.count_tasks_due(group_ids, today)
+        )
+        messages = counts["messages"]
+        from_prof = messages.get("prof", 0)
 
         return {
-            "totalComplaints": total_complaints,
-            "totalTasksToday": total_tasks_today,
-            "totalMessagesFromStudentsToday": total_messages_from_students_today,
-            "totalMessagesFromProfToday": total_messages_from_prof_today
+            "totalComplaints": counts["user"].get("complaintsReceived", 0),
+            "totalTasksToday": tasks,
+            "totalMessagesFromStudentsToday": sum(messages.values()) - from_prof,
+            "totalMessagesFromProfToday": from_prof
         }
 
-    def get_messages_from_prof_today_for_group(self, prof_uid: str, group_id: str):
-        from datetime import datetime, timezone
-
-        today = datetime.now(timezone.utc).date()
-
-        # Total messages from prof today for this group
-        total_messages_from_prof_today = 0
-        messages = db.collection("chats").document(group_id).collection("messages").where('senderId', '==', prof_uid).stream()
-        for msg in messages:
-            msg_data = msg.to_dict()
-            timestamp = msg_data.get("timestamp")
-            if timestamp:
-                msg_date = timestamp.date()
-                if msg_date == today:
-                    total_messages_from_prof_today += 1
-
-        return {"totalMessagesFromProfToday": total_messages_from_prof_today}
+    async def get_messages_from_prof_today_for_group(self, prof_uid: str, group_id: str):
+        counts = await dashboard_counters.read_dashboard(
+            prof_uid, [group_id], dashboard_counters.day_key()
+        )
+        return {"totalMessagesFromProfToday": counts["messages"].get("prof", 0)}
@@ -11,5 +11,5 @@ def get_documents():
 def get_calendar():
     return service.get_calendar()
 
-def get_dashboard_stats(user):
-    return service.get_dashboard_stats(user)
+async def get_dashboard_stats(user):
+    return await service.get_dashboard_stats(user["uid"])
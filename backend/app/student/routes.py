@@ -13,8 +13,8 @@ def dashboard():
     return get_dashboard()
 
 @router.get("/dashboard-stats")
-def dashboard_stats(user=Depends(verify_token)):
-    return get_dashboard_stats(user)
+async def dashboard_stats(user=Depends(verify_token)):
+    return await get_dashboard_stats(user)
 
 @router.get("/documents")
 def documents():
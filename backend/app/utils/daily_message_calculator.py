@@ -1,50 +1,308 @@
-from app.utils.firebase import init_firebase
-from datetime import datetime, timedelta
-from collections import defaultdict
+"""
+Daily message counts per (user, group, day) in ``daily_message_counts``.
+
+- incremental run (scheduler) : per group, only the messages newer than
+  the high-water mark stored in ``daily_message_counts_state/{groupId}``
+  are read and added to the counts. When the mark is still on yesterday,
+  yesterday is finished first. A day read from its start (no mark yet,
+  e.g. the first run after the daily job it replaces) is written as
+  absolute counts. The counts of a group and its new mark are committed
+  in the same batch, with a precondition on the mark document (unchanged
+  since read, or still missing) : a failed or retried run never counts
+  twice, and of two overlapping runs (the scheduler runs in every
+  worker) only the first one to commit a group counts it.
+- deleted messages : ChatService.delete_message takes them out of their
+  day's count when a run already counted them (uncount_message).
+- backfill (CLI) : recomputes whole days with count() aggregation queries,
+  one per group member, instead of reading the messages.
+
+    python -m app.utils.daily_message_calculator --from 2024-01-01 --to 2024-01-31
+
+Days are UTC.
+"""
+import argparse
+import asyncio
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from firebase_admin import firestore
+from google.api_core.exceptions import Conflict, FailedPrecondition
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from app.utils.firebase import init_async_firebase
 
 # Initialize Firebase
-db = init_firebase()
+db = init_async_firebase()
 
-def calculate_daily_message_counts():
-    """
-    Calculate and store daily message counts for all users from today's messages.
-    """
-    # Determine today's date
-    today = datetime.now().date()
-    today_str = today.isoformat()  # YYYY-MM-DD
+MAX_WORKERS = 8
+BATCH_SIZE = 500
+
+
+def _day_bounds(day: date):
+    start = datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc)
+    return start, start + timedelta(days=1)
+
+
+def _count_ref(user_id: str, group_id: str, day: date):
+    return db.collection('daily_message_counts').document(f"{user_id}_{group_id}_{day.isoformat()}")
+
+
+class _Run:
+    """Writes and statistics of one run."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.reads = 0
+        self.written = 0
+        # groups left to a concurrent run
+        self.skipped = 0
+        # units of writes committed together : [(ref, data, merge)]
+        self.units = []
 
-    # Get all groups
-    groups_ref = db.collection('groups')
-    groups = groups_ref.stream()
+    def add(self, writes: list):
+        if writes:
+            self.units.append(writes)
 
-    # Dictionary to hold counts: (userId, groupId) -> count
-    message_counts = defaultdict(int)
+    async def commit(self):
+        """Batches of up to BATCH_SIZE writes, a unit is never split."""
+        batch, size = db.batch(), 0
+        for unit in self.units:
+            # a unit larger than a batch (BATCH_SIZE senders in a day) is
+            # split, its last chunk holds the mark
+            for i in range(0, len(unit), BATCH_SIZE):
+                chunk = unit[i:i + BATCH_SIZE]
+                if size + len(chunk) > BATCH_SIZE:
+                    await batch.commit()
+                    batch, size = db.batch(), 0
+                for ref, data, merge in chunk:
+                    batch.set(ref, data, merge=merge)
+                size += len(chunk)
+                self.written += len(chunk)
+        if size:
+            await batch.commit()
 
-    for group in groups:
-        group_id = group.id
-        # Query messages from today in this group's chat
-        messages_ref = db.collection('chats').document(group_id).collection('messages')
-        # Filter by timestamp >= start of today and < start of tomorrow
-        start_today = datetime.combine(today, datetime.min.time())
-        start_tomorrow = datetime.combine(today + timedelta(days=1), datetime.min.time())
+    def report(self, label: str, groups: int) -> dict:
+        report = {
+            "run": label,
+            "groups": groups,
+            "documentsRead": self.reads,
+            "documentsWritten": self.written,
+            "groupsSkipped": self.skipped,
+            "durationSeconds": round(time.monotonic() - self.started, 3)
+        }
+        print(f"Daily message counts : {report}")
+        return report
 
-        # Firestore query: where timestamp >= start_today and timestamp < start_tomorrow
-        messages = messages_ref.where('timestamp', '>=', start_today).where('timestamp', '<', start_tomorrow).stream()
 
-        for msg in messages:
-            msg_data = msg.to_dict()
-            sender_id = msg_data.get('senderId')
-            if sender_id:
-                message_counts[(sender_id, group_id)] += 1
+async def _bounded(items, worker, max_workers: int):
+    semaphore = asyncio.Semaphore(max_workers)
 
-    # Store the counts in 'daily_message_counts' collection
-    for (user_id, group_id), count in message_counts.items():
-        doc_ref = db.collection('daily_message_counts').document(f"{user_id}_{group_id}_{today_str}")
-        doc_ref.set({
+    async def run(item):
+        async with semaphore:
+            await worker(item)
+
+    await asyncio.gather(*(run(item) for item in items))
+
+
+# =========================
+# INCREMENTAL
+# =========================
+async def _process_since(run: _Run, writes: list, group_id: str, day: date, since: datetime | None):
+    """
+    Counts the messages of ``day`` newer than ``since`` into ``writes``,
+    returns the new mark. Without ``since`` the whole day is read and the
+    counts replace the stored ones.
+    """
+    start, end = _day_bounds(day)
+    query = db.collection('chats').document(group_id).collection('messages')
+    if since is not None and since >= start:
+        query = query.where(filter=FieldFilter('timestamp', '>', since))
+    else:
+        since = None
+        query = query.where(filter=FieldFilter('timestamp', '>=', start))
+    query = query.where(filter=FieldFilter('timestamp', '<', end)).order_by('timestamp')
+
+    counts = {}
+    mark = since
+    async for msg in query.stream():
+        run.reads += 1
+        msg_data = msg.to_dict()
+        sender_id = msg_data.get('senderId')
+        if sender_id:
+            counts[sender_id] = counts.get(sender_id, 0) + 1
+        mark = msg_data['timestamp']
+
+    for user_id, count in counts.items():
+        writes.append((_count_ref(user_id, group_id, day), {
             'userId': user_id,
             'groupId': group_id,
-            'date': today_str,
-            'count': count
-        })
+            'date': day.isoformat(),
+            'count': count if since is None else firestore.Increment(count)
+        }, since is not None))
+
+    return mark
+
+
+async def calculate_daily_message_counts(max_workers: int = MAX_WORKERS):
+    """
+    Incremental update of today's counts (finishing yesterday if needed).
+    """
+    run = _Run()
+    today = datetime.now(timezone.utc).date()
+    yesterday = today - timedelta(days=1)
+
+    groups = [g async for g in db.collection('groups').select([]).stream()]
+    run.reads += max(len(groups), 1)
+
+    state_refs = [db.collection('daily_message_counts_state').document(g.id) for g in groups]
+    snaps = {}
+    if state_refs:
+        async for snap in db.get_all(state_refs):
+            snaps[snap.id] = snap
+        run.reads += len(state_refs)
+
+    async def process(group):
+        snap = snaps.get(group.id)
+        state = (snap.to_dict() if snap is not None and snap.exists else None) or {}
+        since = state.get('lastTimestamp')
+        writes = []
+
+        if state.get('date') == yesterday.isoformat():
+            await _process_since(run, writes, group.id, yesterday, since)
+            since = None
+        elif state.get('date') != today.isoformat():
+            since = None
+
+        mark = await _process_since(run, writes, group.id, today, since)
+        if state.get('date') == today.isoformat() and mark == state.get('lastTimestamp'):
+            return
+
+        # one batch : a group has far fewer than BATCH_SIZE senders
+        batch = db.batch()
+        for ref, data, merge in writes:
+            batch.set(ref, data, merge=merge)
+        state_ref = db.collection('daily_message_counts_state').document(group.id)
+        new_state = {'date': today.isoformat(), 'lastTimestamp': mark}
+        if snap is not None and snap.exists:
+            option = db.write_option(last_update_time=snap.update_time)
+            batch.update(state_ref, new_state, option=option)
+        else:
+            batch.create(state_ref, new_state)
+        try:
+            await batch.commit()
+        except (Conflict, FailedPrecondition):
+            # the mark moved since it was read : another run counted these
+            run.skipped += 1
+            print(f"Daily message counts : {group.id} counted by a concurrent run, skipped")
+            return
+        run.written += len(writes) + 1
+
+    await _bounded(groups, process, max_workers)
+    return run.report(f"incremental {today.isoformat()}", len(groups))
+
+
+# =========================
+# DELETIONS
+# =========================
+async def uncount_message(batch, group_id: str, data: dict):
+    """
+    Adds to ``batch`` the decrement of the count of a deleted message
+    (``data``), if a run already counted it : its day is before the mark's
+    day, or it is not newer than the mark.
+    """
+    sender_id, ts = data.get('senderId'), data.get('timestamp')
+    if not sender_id or not isinstance(ts, datetime):
+        return
+    day = ts.astimezone(timezone.utc).date()
+    count_ref = _count_ref(sender_id, group_id, day)
+
+    state, count = None, None
+    async for snap in db.get_all([
+        db.collection('daily_message_counts_state').document(group_id), count_ref
+    ]):
+        if snap.exists and snap.id == group_id:
+            state = snap.to_dict()
+        elif snap.exists:
+            count = snap.to_dict().get('count')
+
+    mark_day, mark = (state or {}).get('date'), (state or {}).get('lastTimestamp')
+    if not mark_day or not count:
+        # not counted yet, or a day the old daily job left short
+        return
+    if day.isoformat() < mark_day or (day.isoformat() == mark_day and mark and ts <= mark):
+        batch.set(count_ref, {'count': firestore.Increment(-1)}, merge=True)
+
+
+# =========================
+# BACKFILL
+# =========================
+async def backfill_daily_message_counts(first: date, last: date, max_workers: int = MAX_WORKERS):
+    """
+    Recomputes the counts of every day in [first, last] with count()
+    aggregations over the members of each group.
+    """
+    run = _Run()
+    now = datetime.now(timezone.utc)
+    today = now.date()
+
+    groups = [g async for g in db.collection('groups').select(['profId', 'studentIds']).stream()]
+    run.reads += max(len(groups), 1)
+
+    days = [first + timedelta(days=n) for n in range((last - first).days + 1)]
+    jobs = [(g, d) for g in groups for d in days if d <= today]
+
+    async def process(job):
+        group, day = job
+        data = group.to_dict()
+        members = [data.get('profId')] + data.get('studentIds', [])
+        members = [uid for uid in dict.fromkeys(members) if uid]
+
+        start, end = _day_bounds(day)
+        # today : stop at the run start, the incremental run continues from there
+        end = min(end, now)
+        messages = db.collection('chats').document(group.id).collection('messages')
+
+        results = await asyncio.gather(*(
+            messages
+            .where(filter=FieldFilter('senderId', '==', uid))
+            .where(filter=FieldFilter('timestamp', '>=', start))
+            .where(filter=FieldFilter('timestamp', '<', end))
+            .count(alias='count')
+            .get()
+            for uid in members
+        ))
+
+        writes = []
+        for uid, result in zip(members, results):
+            count = result[0][0].value
+            # one read per started batch of 1000 index entries
+            run.reads += max(1, -(-count // 1000))
+            if count:
+                writes.append((_count_ref(uid, group.id, day), {
+                    'userId': uid,
+                    'groupId': group.id,
+                    'date': day.isoformat(),
+                    'count': count
+                }, False))
+
+        if day == today:
+            writes.append((
+                db.collection('daily_message_counts_state').document(group.id),
+                {'date': today.isoformat(), 'lastTimestamp': now},
+                False
+            ))
+        run.add(writes)
+
+    await _bounded(jobs, process, max_workers)
+    await run.commit()
+    return run.report(f"backfill {first.isoformat()}..{last.isoformat()}", len(groups))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill daily message counts")
+    parser.add_argument("--from", dest="first", type=date.fromisoformat, required=True)
+    parser.add_argument("--to", dest="last", type=date.fromisoformat, required=True)
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    args = parser.parse_args()
 
-    print(f"Daily message counts calculated and stored for {today_str}. Total users: {len(message_counts)}")
+    asyncio.run(backfill_daily_message_counts(args.first, args.last, args.workers))
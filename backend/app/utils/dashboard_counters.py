@@ -0,0 +1,202 @@
+"""
+Dashboard counters maintained on write, so that the dashboards read a
+handful of documents instead of scanning chats and complaints.
+Tasks due on a day are counted by app.calendar.repository.
+
+dashboard_counters/
+    group_{groupId}_{YYYY-MM-DD} : messages.{senderRole}
+    user_{uid}                   : complaintsSent, complaintsReceived
+    member_{groupId}_{uid}       : messages, documents (sent in the group chat)
+
+Days are UTC, like the dashboards.
+"""
+import asyncio
+from datetime import date, datetime, timezone
+
+from firebase_admin import firestore
+
+from app.utils.firebase import init_async_firebase
+
+db = init_async_firebase()
+counters = db.collection("dashboard_counters")
+
+
+# =========================
+# KEYS
+# =========================
+def day_key(value=None) -> str | None:
+    """YYYY-MM-DD (UTC) of a datetime, a date or an ISO string, None if unparseable."""
+    if value is None:
+        value = datetime.now(timezone.utc)
+
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return value.date().isoformat()
+
+    if isinstance(value, date):
+        return value.isoformat()
+
+    return None
+
+
+def group_day_ref(group_id: str, day: str):
+    return counters.document(f"group_{group_id}_{day}")
+
+
+def user_ref(uid: str):
+    return counters.document(f"user_{uid}")
+
+
+def member_ref(group_id: str, uid: str):
+    return counters.document(f"member_{group_id}_{uid}")
+
+
+# =========================
+# WRITES
+# merge + Increment : added to the caller's batch, no read needed
+# =========================
+def message_update(group_id: str, day: str, role: str, delta: int = 1):
+    return {
+        "groupId": group_id,
+        "date": day,
+        "messages": {role or "unknown": firestore.Increment(delta)}
+    }
+
+
+def add_complaint(batch, sender_uid: str, recipient_uid: str | None, delta: int = 1):
+    batch.set(user_ref(sender_uid), {"complaintsSent": firestore.Increment(delta)}, merge=True)
+    if recipient_uid:
+        batch.set(
+            user_ref(recipient_uid),
+            {"complaintsReceived": firestore.Increment(delta)},
+            merge=True
+        )
+
+
+def add_member_message(batch, group_id: str, uid: str, is_document: bool, delta: int = 1):
+    update = {"groupId": group_id, "uid": uid, "messages": firestore.Increment(delta)}
+    if is_document:
+        update["documents"] = firestore.Increment(delta)
+    batch.set(member_ref(group_id, uid), update, merge=True)
+
+
+# =========================
+# READS
+# =========================
+async def read_dashboard(uid: str, group_ids: list, day: str) -> dict:
+    """
+    Counters of ``uid`` and of ``group_ids`` for ``day`` in one get_all.
+    """
+    refs = [user_ref(uid)] + [group_day_ref(gid, day) for gid in group_ids]
+
+    user = {}
+    messages = {}
+    async for snap in db.get_all(refs):
+        if not snap.exists:
+            continue
+        data = snap.to_dict()
+        if snap.id == f"user_{uid}":
+            user = data
+            continue
+        for role, count in data.get("messages", {}).items():
+            messages[role] = messages.get(role, 0) + count
+
+    return {"user": user, "messages": messages}
+
+
+async def read_members(pairs) -> dict:
+    """
+    {(groupId, uid): {"messages": n, "documents": n}} for the given
+    (groupId, uid) pairs in one get_all, zeros when nothing was sent.
+    """
+    pairs = list(dict.fromkeys(pairs))
+    out = {pair: {"messages": 0, "documents": 0} for pair in pairs}
+    if not pairs:
+        return out
+
+    async for snap in db.get_all([member_ref(gid, uid) for gid, uid in pairs]):
+        if snap.exists:
+            data = snap.to_dict()
+            out[(data["groupId"], data["uid"])] = {
+                "messages": data.get("messages", 0),
+                "documents": data.get("documents", 0)
+            }
+    return out
+
+
+# =========================
+# REBUILD (deploy / repair)
+# =========================
+async def rebuild():
+    """
+    Recompute every counter from the source collections :
+    complaint totals, today's messages, messages and documents per member.
+
+        python -m app.utils.dashboard_counters
+    """
+    values = {}
+
+    def add(ref, path, n=1, base=None):
+        doc = values.setdefault(ref.id, (ref, dict(base or {})))[1]
+        *parents, leaf = path
+        for p in parents:
+            doc = doc.setdefault(p, {})
+        doc[leaf] = doc.get(leaf, 0) + n
+
+    async for c in db.collection("complaints").stream():
+        data = c.to_dict()
+        add(user_ref(data["fromUserId"]), ["complaintsSent"])
+        recipient = data.get("toProfId") or data.get("toStudentId")
+        if recipient:
+            add(user_ref(recipient), ["complaintsReceived"])
+
+    today = day_key()
+    start = datetime.fromisoformat(today).replace(tzinfo=timezone.utc)
+    async for g in db.collection("groups").stream():
+        msgs = (
+            db.collection("chats").document(g.id).collection("messages")
+            .select(["senderId", "senderRole", "timestamp", "type"])
+            .stream()
+        )
+        async for m in msgs:
+            data = m.to_dict()
+            uid = data.get("senderId")
+            if uid:
+                base = {"groupId": g.id, "uid": uid, "messages": 0, "documents": 0}
+                add(member_ref(g.id, uid), ["messages"], base=base)
+                if data.get("type") == "document":
+                    add(member_ref(g.id, uid), ["documents"], base=base)
+            ts = data.get("timestamp")
+            if isinstance(ts, datetime) and ts >= start:
+                add(group_day_ref(g.id, today), ["messages", data.get("senderRole") or "unknown"])
+
+    # documents collection : not written by the API (uploads go through the chat)
+    async for d in db.collection("documents").select(["uploadedBy", "groupId"]).stream():
+        data = d.to_dict()
+        if data.get("uploadedBy") and data.get("groupId"):
+            gid, uid = data["groupId"], data["uploadedBy"]
+            base = {"groupId": gid, "uid": uid, "messages": 0, "documents": 0}
+            add(member_ref(gid, uid), ["documents"], base=base)
+
+    items = list(values.values())
+    for i in range(0, len(items), 500):
+        batch = db.batch()
+        for ref, data in items[i:i + 500]:
+            if ref.id.startswith("group_"):
+                group_id, day = ref.id[len("group_"):].rsplit("_", 1)
+                data = {"groupId": group_id, "date": day, "messages": {}, **data}
+            batch.set(ref, data)
+        await batch.commit()
+
+    print(f"Dashboard counters rebuilt : {len(items)} documents")
+
+
+if __name__ == "__main__":
+    asyncio.run(rebuild())
@@ -1,8 +1,10 @@
 import os
 import firebase_admin
-from firebase_admin import credentials, firestore, storage
+from firebase_admin import credentials, firestore, firestore_async, storage
 
-def init_firebase():
+from .firestore_tracing import traced
+
+def _init_app():
     if not firebase_admin._apps:
         base_dir = os.path.dirname(
             os.path.dirname(
@@ -21,4 +23,50 @@ def init_firebase():
             }
         )
 
+_store = None
+
+def _memory_store():
+    """
+    FIRESTORE_BACKEND=memory : one in-process store shared by every
+    module (tests, benchmarks), no credentials nor network needed.
+    """
+    if os.getenv("FIRESTORE_BACKEND", "firebase") != "memory":
+        return None
+
+    global _store
+    if _store is None:
+        from .memory_firestore import MemoryStore
+        _store = MemoryStore()
+    return _store
+
+def init_firebase():
+    """Blocking client : scripts, scheduled jobs."""
+    store = _memory_store()
+    if store is not None:
+        return store.client()
+    _init_app()
     return firestore.client()
+
+def init_async_firebase():
+    """
+    AsyncClient used by the services behind async routes, wrapped to
+    count the reads / writes of each request (FIRESTORE_TRACING=0 : raw).
+    """
+    store = _memory_store()
+    if store is not None:
+        client = store.async_client()
+    else:
+        _init_app()
+        client = firestore_async.client()
+
+    if os.getenv("FIRESTORE_TRACING", "1") == "0":
+        return client
+    return traced(client)
+
+def init_bucket():
+    """Cloud Storage bucket of the chat files."""
+    store = _memory_store()
+    if store is not None:
+        return store.bucket()
+    _init_app()
+    return storage.bucket()
@@ -0,0 +1,207 @@
+"""
+Per-request Firestore accounting.
+
+init_async_firebase() returns the client wrapped in a ``Traced`` proxy :
+references, queries and batches built from it stay wrapped, and every
+call that reaches Firestore (get, stream, get_all, set, update, delete,
+add, commit) is added to the ``RequestStats`` of the current request
+(a contextvar set by app.middleware.request_metrics).
+
+Reads are counted like Firestore bills them : one per document returned,
+one for an empty query or an aggregation, one per missing document.
+Calls made outside a request (scheduler, scripts) are not recorded.
+"""
+import inspect
+import time
+from contextvars import ContextVar
+
+from google.cloud.firestore_v1.base_query import BaseCompositeFilter, Or
+
+# queries kept per request for the slow-request log
+MAX_RECORDED_CALLS = 100
+
+# objects that are wrapped in turn (real client and memory stand-in names)
+_WRAPPED = {
+    "CollectionReference", "AsyncCollectionReference",
+    "DocumentReference", "AsyncDocumentReference",
+    "Query", "AsyncQuery", "CollectionGroup", "AsyncCollectionGroup",
+    "WriteBatch", "AsyncWriteBatch",
+    "AggregationQuery", "AsyncAggregationQuery"
+}
+_BATCHES = {"WriteBatch", "AsyncWriteBatch"}
+_RPCS = {"get", "stream", "get_all", "set", "update", "delete", "create", "add", "commit"}
+_WRITES = {"set", "update", "delete", "create", "add"}
+
+
+class RequestStats:
+    __slots__ = ("reads", "writes", "rpcs", "seconds", "calls")
+
+    def __init__(self):
+        self.reads = 0
+        self.writes = 0
+        self.rpcs = 0
+        self.seconds = 0.0
+        self.calls = []
+
+    def record(self, op: str, target: str, reads: int, writes: int, seconds: float):
+        self.rpcs += 1
+        self.reads += reads
+        self.writes += writes
+        self.seconds += seconds
+        if len(self.calls) < MAX_RECORDED_CALLS:
+            self.calls.append((op, target, reads, writes, seconds))
+
+
+current_stats: ContextVar[RequestStats | None] = ContextVar("firestore_stats", default=None)
+
+
+def _record(op, target, reads, writes, seconds):
+    stats = current_stats.get()
+    if stats is not None:
+        stats.record(op, target, reads, writes, seconds)
+
+
+# =========================
+# DESCRIPTIONS (slow-request log)
+# =========================
+def _brief(value) -> str:
+    if isinstance(value, BaseCompositeFilter):
+        kind = "Or" if isinstance(value, Or) else "And"
+        return f"{kind}({', '.join(_brief(f) for f in value.filters)})"
+    if hasattr(value, "field_path") and hasattr(value, "op_string"):
+        # values left out : similar queries read the same in the log
+        return f"{value.field_path} {value.op_string} ?"
+    if isinstance(value, (list, tuple)):
+        return f"[{len(value)}]"
+    if isinstance(value, (str, int, float)):
+        return str(value)[:40]
+    return type(value).__name__
+
+
+def _describe(desc: str, name: str, args, kwargs) -> str:
+    if name in ("collection", "document", "collection_group"):
+        return "/".join([desc, *map(str, args)]) if desc else "/".join(map(str, args))
+    if name in ("where", "order_by", "limit", "limit_to_last", "select", "offset", "count"):
+        if name == "where" and len(args) == 3:
+            # legacy where(field, op, value)
+            args = [*args[:2], "?"]
+        parts = [_brief(a) for a in args] + [_brief(v) for k, v in kwargs.items() if k != "value"]
+        return f"{desc} .{name}({', '.join(parts)})"
+    return desc
+
+
+def _reads(kind: str, result) -> int:
+    if kind.endswith("AggregationQuery"):
+        return 1
+    if isinstance(result, list):
+        return max(len(result), 1)
+    return 1
+
+
+def _unwrap(value):
+    if isinstance(value, Traced):
+        return value._target
+    if isinstance(value, list):
+        return [_unwrap(v) for v in value]
+    return value
+
+
+# =========================
+# PROXY
+# =========================
+class Traced:
+    """Forwards everything to the wrapped client object, timing the RPCs."""
+
+    __slots__ = ("_target", "_desc")
+
+    def __init__(self, target, desc: str = ""):
+        self._target = target
+        self._desc = desc
+
+    def __repr__(self):
+        return f"Traced({self._target!r})"
+
+    def __eq__(self, other):
+        return self._target == _unwrap(other)
+
+    def __hash__(self):
+        return hash(self._target)
+
+    def __len__(self):
+        return len(self._target)
+
+    def _wrap(self, value, desc=None):
+        if type(value).__name__ in _WRAPPED:
+            return Traced(value, self._desc if desc is None else desc)
+        return value
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if not callable(value):
+            return self._wrap(value)
+
+        kind = type(self._target).__name__
+        is_rpc = name in _RPCS and (kind not in _BATCHES or name == "commit")
+
+        def call(*args, **kwargs):
+            args = [_unwrap(a) for a in args]
+            kwargs = {k: _unwrap(v) for k, v in kwargs.items()}
+            if not is_rpc:
+                return self._wrap(value(*args, **kwargs), _describe(self._desc, name, args, kwargs))
+
+            is_write = name in _WRITES or name == "commit"
+            writes = len(self._target) if name == "commit" else int(is_write)
+            target = self._desc
+            if name == "get_all" and args and isinstance(args[0], list) and args[0]:
+                target = f"{args[0][0].path.rsplit('/', 1)[0]} x{len(args[0])}"
+
+            start = time.perf_counter()
+            result = value(*args, **kwargs)
+
+            if hasattr(result, "__aiter__"):
+                return self._stream(name, target, result, start)
+
+            if inspect.isawaitable(result):
+                async def awaited():
+                    try:
+                        out = await result
+                    except Exception:
+                        # failed RPC (NotFound, precondition...) : nothing read nor written
+                        _record(name, target, 0, 0, time.perf_counter() - start)
+                        raise
+                    reads = 0 if is_write else _reads(kind, out)
+                    _record(name, target, reads, writes, time.perf_counter() - start)
+                    return out
+                return awaited()
+
+            # blocking client
+            reads = 0 if is_write else _reads(kind, result)
+            _record(name, target, reads, writes, time.perf_counter() - start)
+            return result
+
+        return call
+
+    async def _stream(self, name, target, iterator, start):
+        """stream() / get_all() : counted once exhausted (or abandoned)."""
+        count = 0
+        seconds = time.perf_counter() - start
+        it = iterator.__aiter__()
+        try:
+            while True:
+                t = time.perf_counter()
+                try:
+                    item = await it.__anext__()
+                except StopAsyncIteration:
+                    seconds += time.perf_counter() - t
+                    break
+                seconds += time.perf_counter() - t
+                count += 1
+                yield item
+        finally:
+            # get_all bills every document, found or not, a query at least one
+            reads = count if name == "get_all" else max(count, 1)
+            _record(name, target, reads, 0, seconds)
+
+
+def traced(client) -> Traced:
+    return Traced(client)
@@ -4,22 +4,73 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
 
-def send_activation_email(email: str, password: str):
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
+SMTP_EMAIL = os.getenv("SMTP_EMAIL")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+# SMTP_STARTTLS=0 : local stand-ins (aiosmtpd, mailpit...) without TLS
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") != "0"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", 20))
+
+
+def check_config():
+    # no password : servers without AUTH (local relay, test server)
+    if not SMTP_EMAIL:
+        raise Exception("SMTP_EMAIL manquant dans .env")
+
+
+class SMTPConnection:
     """
-    Envoie un email contenant le mot de passe automatique
+    One SMTP session reused for several messages : STARTTLS and login
+    once, reconnect when the server dropped the connection.
+    Not thread-safe, one instance per worker.
     """
 
-    smtp_email = os.getenv("SMTP_EMAIL")
-    smtp_password = os.getenv("SMTP_PASSWORD")
-    smtp_host = os.getenv("SMTP_HOST", "smtp.gmail.com")
-    smtp_port = int(os.getenv("SMTP_PORT", 587))
+    def __init__(self):
+        self._server = None
+
+    def _connect(self):
+        server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+        try:
+            if SMTP_STARTTLS:
+                server.starttls()
+            if SMTP_PASSWORD:
+                server.login(SMTP_EMAIL, SMTP_PASSWORD)
+        except Exception:
+            server.close()
+            raise
+        self._server = server
+
+    def send(self, msg):
+        if self._server is None:
+            self._connect()
+        try:
+            self._server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # idle connection closed by the server : one fresh attempt
+            self._server = None
+            self._connect()
+            self._server.send_message(msg)
+
+    def close(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except Exception:
+            self._server.close()
+        self._server = None
 
-    if not smtp_email or not smtp_password:
-        raise Exception("SMTP_EMAIL ou SMTP_PASSWORD manquant dans .env")
+
+def build_activation_email(email: str, password: str) -> MIMEMultipart:
+    """
+    Email contenant le mot de passe automatique
+    """
+    check_config()
 
     # 📧 Message
     msg = MIMEMultipart()
-    msg["From"] = smtp_email
+    msg["From"] = SMTP_EMAIL
     msg["To"] = email
     msg["Subject"] = "Votre compte a été créé – Plateforme PFE"
 
@@ -27,7 +78,7 @@ def send_activation_email(email: str, password: str):
     <html>
       <body style="font-family: Arial, sans-serif; background:#f9fafb; padding:20px;">
         <div style="max-width:600px; margin:auto; background:white; padding:24px; border-radius:8px;">
-          
+
           <h2 style="color:#4f46e5;">Bienvenue 👋</h2>
 
           <p>Votre compte a été créé avec succès sur la <b>plateforme PFE</b>.</p>
@@ -52,9 +103,17 @@ def send_activation_email(email: str, password: str):
     """
 
     msg.attach(MIMEText(html, "html"))
+    return msg
 
-    # 🚀 Envoi
-    with smtplib.SMTP(smtp_host, smtp_port) as server:
-        server.starttls()
-        server.login(smtp_email, smtp_password)
-        server.send_message(msg)
+
+def send_activation_email(email: str, password: str):
+    """
+    Envoie un email contenant le mot de passe automatique (synchrone,
+    les requêtes passent par app.utils.outbox)
+    """
+    conn = SMTPConnection()
+    try:
+        # 🚀 Envoi
+        conn.send(build_activation_email(email, password))
+    finally:
+        conn.close()
@@ -0,0 +1,97 @@
+"""
+Read-through cache of group membership for authorization checks.
+
+    group id -> {"profId", "studentIds"}  (None : no such group)
+    uid      -> ids of the groups the user supervises / belongs to
+
+AdminService invalidates it when it writes a group. The TTL bounds how
+long a change made elsewhere (console, scripts, another worker) can be
+missed. With the Firestore listeners on (app.utils.replica) the groups
+are read from the local replica instead.
+"""
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from app.utils.cache import TTLCache
+from app.utils.firebase import init_async_firebase
+from app.utils.replica import replica
+
+db = init_async_firebase()
+
+MEMBERSHIP_TTL = 300
+
+group_members = TTLCache(maxsize=10000, ttl=MEMBERSHIP_TTL)
+user_groups = TTLCache(maxsize=10000, ttl=MEMBERSHIP_TTL)
+
+# user_groups key of the admin view (every group)
+ALL_GROUPS = "*"
+_MISSING = object()
+
+
+def _members(data: dict) -> dict:
+    return {
+        "profId": data.get("profId"),
+        "studentIds": list(data.get("studentIds", []))
+    }
+
+
+async def get_group_members(group_id: str) -> dict | None:
+    group = replica.get_group(group_id)
+    if group is not None:
+        return _members(group)
+
+    members = group_members.get(group_id, _MISSING)
+    if members is _MISSING:
+        snap = await db.collection("groups").document(group_id).get()
+        members = _members(snap.to_dict()) if snap.exists else None
+        group_members.set(group_id, members)
+    return members
+
+
+async def get_user_group_ids(user: dict) -> list:
+    """Admin : every group, prof : supervised groups, student : own groups."""
+    group_ids = replica.group_ids(user)
+    if group_ids is not None:
+        return group_ids
+
+    key = ALL_GROUPS if user["role"] == "admin" else user["uid"]
+    group_ids = user_groups.get(key)
+    if group_ids is None:
+        query = db.collection("groups").select(["profId", "studentIds"])
+        if user["role"] == "prof":
+            query = query.where(filter=FieldFilter("profId", "==", user["uid"]))
+        elif user["role"] != "admin":
+            query = query.where(filter=FieldFilter("studentIds", "array_contains", user["uid"]))
+
+        group_ids = []
+        async for d in query.stream():
+            group_ids.append(d.id)
+            # the members come with the query
+            group_members.set(d.id, _members(d.to_dict()))
+        user_groups.set(key, group_ids)
+
+    return list(group_ids)
+
+
+async def is_member(user: dict, group_id: str) -> bool:
+    """Admin : any existing group, prof : supervisor, student : member."""
+    members = await get_group_members(group_id)
+    if members is None:
+        return False
+    if user["role"] == "admin":
+        return True
+    if user["role"] == "prof":
+        return members["profId"] == user["uid"]
+    return user["uid"] in members["studentIds"]
+
+
+def invalidate_group(group_id: str, uids=()):
+    """After a group write : the group, its (old and new) members, the admin view."""
+    group_members.invalidate(group_id)
+    user_groups.invalidate(ALL_GROUPS)
+    for uid in uids:
+        if uid:
+            user_groups.invalidate(uid)
+
+
+def cache_stats() -> dict:
+    return {"groupMembers": group_members.stats(), "userGroups": user_groups.stats()}
@@ -0,0 +1,805 @@
+"""
+In-memory stand-in for the Firestore client.
+
+Covers the subset of the API used by the services (documents, queries,
+cursors, projections, count aggregation, batches, transforms, query
+listeners) with
+Firestore semantics : missing fields never match a filter, ``order_by``
+drops documents without the field, type ordering follows the Firestore
+rules. Every read and write is counted in ``MemoryStore.stats``.
+
+    store = MemoryStore()
+    db = store.async_client()   # AsyncClient API (await / async for)
+    db = store.client()         # blocking Client API, same data
+    bucket = store.bucket()     # Cloud Storage bucket (blobs kept in memory)
+
+Selected with FIRESTORE_BACKEND=memory (app.utils.firebase).
+"""
+import copy
+import random
+import string
+import threading
+from datetime import datetime, timedelta, timezone
+
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition, NotFound
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.base_query import BaseCompositeFilter, FieldFilter, Or
+from google.cloud.firestore_v1.watch import ChangeType, DocumentChange
+
+DESCENDING = "DESCENDING"
+_MISSING = object()
+
+
+# =========================
+# VALUES
+# =========================
+def _type_rank(value):
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, datetime):
+        return 3
+    if isinstance(value, str):
+        return 4
+    if isinstance(value, bytes):
+        return 5
+    if isinstance(value, list):
+        return 8
+    if isinstance(value, dict):
+        return 9
+    return 6
+
+
+def _sort_key(value):
+    rank = _type_rank(value)
+    if rank == 3 and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    if rank == 8:
+        return (rank, tuple(_sort_key(v) for v in value))
+    if rank == 9:
+        return (rank, tuple((k, _sort_key(v)) for k, v in sorted(value.items())))
+    if rank == 0:
+        return (rank, 0)
+    return (rank, value)
+
+
+def _get_path(data: dict, path: str):
+    current = data
+    for part in path.split("."):
+        if not isinstance(current, dict) or part not in current:
+            return _MISSING
+        current = current[part]
+    return current
+
+
+def _set_path(data: dict, path: str, value):
+    parts = path.split(".")
+    current = data
+    for part in parts[:-1]:
+        if not isinstance(current.get(part), dict):
+            current[part] = {}
+        current = current[part]
+    current[parts[-1]] = value
+
+
+def _delete_path(data: dict, path: str):
+    parts = path.split(".")
+    current = data
+    for part in parts[:-1]:
+        current = current.get(part)
+        if not isinstance(current, dict):
+            return
+    current.pop(parts[-1], None)
+
+
+def _flatten(data: dict, prefix: str = ""):
+    """set(merge=True) merges maps field by field."""
+    for key, value in data.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict) and value:
+            yield from _flatten(value, f"{path}.")
+        else:
+            yield path, value
+
+
+def _apply(doc: dict, path: str, value, now: datetime):
+    if value is transforms.DELETE_FIELD:
+        _delete_path(doc, path)
+    elif value is transforms.SERVER_TIMESTAMP:
+        _set_path(doc, path, now)
+    elif isinstance(value, transforms.Increment):
+        current = _get_path(doc, path)
+        current = current if isinstance(current, (int, float)) and not isinstance(current, bool) else 0
+        _set_path(doc, path, current + value.value)
+    elif isinstance(value, transforms.ArrayUnion):
+        current = _get_path(doc, path)
+        current = list(current) if isinstance(current, list) else []
+        for v in value.values:
+            if v not in current:
+                current.append(v)
+        _set_path(doc, path, current)
+    elif isinstance(value, transforms.ArrayRemove):
+        current = _get_path(doc, path)
+        current = list(current) if isinstance(current, list) else []
+        _set_path(doc, path, [v for v in current if v not in value.values])
+    else:
+        _set_path(doc, path, _resolve(value, now))
+
+
+def _resolve(value, now):
+    """Sentinels nested in plain values (set without merge)."""
+    if value is transforms.SERVER_TIMESTAMP:
+        return now
+    if isinstance(value, dict):
+        out = {}
+        for k, v in value.items():
+            if v is transforms.DELETE_FIELD:
+                continue
+            if isinstance(v, transforms.Increment):
+                out[k] = v.value
+            elif isinstance(v, transforms.ArrayUnion):
+                out[k] = list(v.values)
+            elif isinstance(v, transforms.ArrayRemove):
+                out[k] = []
+            else:
+                out[k] = _resolve(v, now)
+        return out
+    if isinstance(value, list):
+        return [_resolve(v, now) for v in value]
+    return copy.deepcopy(value)
+
+
+def _matches(data: dict, f) -> bool:
+    if isinstance(f, BaseCompositeFilter):
+        results = (_matches(data, sub) for sub in f.filters)
+        return any(results) if isinstance(f, Or) else all(results)
+
+    value = _get_path(data, f.field_path)
+    if value is _MISSING:
+        return False
+
+    op, expected = f.op_string, f.value
+    if op == "==":
+        return value == expected
+    if op == "!=":
+        return value != expected
+    if op == "in":
+        return value in expected
+    if op == "not-in":
+        return value not in expected
+    if op == "array_contains":
+        return isinstance(value, list) and expected in value
+    if op == "array_contains_any":
+        return isinstance(value, list) and any(v in value for v in expected)
+
+    if _type_rank(value) != _type_rank(expected):
+        return False
+    a, b = _sort_key(value), _sort_key(expected)
+    return {"<": a < b, "<=": a <= b, ">": a > b, ">=": a >= b}[op]
+
+
+# =========================
+# STORE
+# =========================
+class MemoryStore:
+    def __init__(self):
+        self.docs = {}
+        self.stats = {"reads": 0, "writes": 0, "rpcs": 0}
+        self._lock = threading.RLock()
+        self._last = datetime.now(timezone.utc)
+        self._bucket = MemoryBucket()
+        self._watches = []
+
+    def clear(self):
+        with self._lock:
+            self.docs.clear()
+            self._bucket.blobs.clear()
+        self._notify()
+        self.reset_stats()
+
+    def client(self):
+        return MemoryClient(self, is_async=False)
+
+    def bucket(self):
+        return self._bucket
+
+    def async_client(self):
+        return MemoryClient(self, is_async=True)
+
+    def reset_stats(self):
+        for key in self.stats:
+            self.stats[key] = 0
+
+    def _now(self):
+        # strictly increasing, like commit times
+        now = datetime.now(timezone.utc)
+        if now <= self._last:
+            now = self._last + timedelta(microseconds=1)
+        self._last = now
+        return now
+
+    def _count(self, reads=0, writes=0):
+        self.stats["rpcs"] += 1
+        self.stats["reads"] += reads
+        self.stats["writes"] += writes
+
+    def _commit(self, ops):
+        """
+        ops : list of (kind, path, data, merge) applied atomically, for an
+        update the last item is the write option (precondition) or None.
+        """
+        now = self._write(ops)
+        self._notify()
+        return now
+
+    def _notify(self):
+        for watch in list(self._watches):
+            watch._push()
+
+    def _write(self, ops):
+        with self._lock:
+            for kind, path, _, option in ops:
+                if kind == "update" and path not in self.docs:
+                    raise NotFound(f"No document to update: {path}")
+                if (
+                    kind == "update" and option is not None
+                    and self.docs[path]["update_time"] != option.last_update_time
+                ):
+                    raise FailedPrecondition(f"Document changed since last read: {path}")
+                if kind == "create" and path in self.docs:
+                    raise AlreadyExists(f"Document already exists: {path}")
+
+            now = self._now()
+            for kind, path, data, merge in ops:
+                if kind == "delete":
+                    self.docs.pop(path, None)
+                    continue
+
+                existing = self.docs.get(path)
+                if kind in ("set", "create") and not merge:
+                    doc = {}
+                    items = data.items()
+                else:
+                    doc = copy.deepcopy(existing["data"]) if existing else {}
+                    items = _flatten(data) if kind == "set" else data.items()
+
+                for field, value in items:
+                    _apply(doc, field, value, now)
+
+                self.docs[path] = {
+                    "data": doc,
+                    "create_time": existing["create_time"] if existing else now,
+                    "update_time": now
+                }
+
+            self.stats["writes"] += len(ops)
+            return now
+
+
+# =========================
+# SNAPSHOTS
+# =========================
+class DocumentSnapshot:
+    def __init__(self, reference, data, create_time=None, update_time=None):
+        self.reference = reference
+        self._data = data
+        self.create_time = create_time
+        self.update_time = update_time
+
+    @property
+    def id(self):
+        return self.reference.id
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path):
+        value = _get_path(self._data or {}, field_path)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return copy.deepcopy(value)
+
+
+class AggregationResult:
+    def __init__(self, alias, value):
+        self.alias = alias
+        self.value = value
+
+
+class LastUpdateOption:
+    """client.write_option(last_update_time=...) : the update fails if the document changed since."""
+
+    def __init__(self, last_update_time):
+        self.last_update_time = last_update_time
+
+
+class WriteResult:
+    def __init__(self, update_time):
+        self.update_time = update_time
+
+
+# =========================
+# CLIENT
+# =========================
+class MemoryClient:
+    def __init__(self, store: MemoryStore, is_async: bool):
+        self._store = store
+        self._async = is_async
+
+    def _result(self, value):
+        if not self._async:
+            return value
+
+        async def coro():
+            return value
+        return coro()
+
+    def _results(self, values):
+        if not self._async:
+            return iter(values)
+
+        async def agen():
+            for v in values:
+                yield v
+        return agen()
+
+    def collection(self, *path):
+        return CollectionReference(self, "/".join(path))
+
+    def collection_group(self, collection_id):
+        return Query(self, None, collection_group=collection_id)
+
+    def document(self, *path):
+        return DocumentReference(self, "/".join(path))
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def write_option(self, last_update_time=None, **kwargs):
+        return LastUpdateOption(last_update_time)
+
+    def get_all(self, references, field_paths=None):
+        snapshots = [ref._snapshot(field_paths) for ref in references]
+        self._store._count(reads=len(snapshots))
+        return self._results(snapshots)
+
+
+class DocumentReference:
+    def __init__(self, client, path):
+        self._client = client
+        self.path = path
+
+    @property
+    def id(self):
+        return self.path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self):
+        return CollectionReference(self._client, self.path.rsplit("/", 1)[0])
+
+    def collection(self, collection_id):
+        return CollectionReference(self._client, f"{self.path}/{collection_id}")
+
+    def __eq__(self, other):
+        return isinstance(other, DocumentReference) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def _snapshot(self, field_paths=None):
+        stored = self._client._store.docs.get(self.path)
+        if stored is None:
+            return DocumentSnapshot(self, None)
+
+        data = stored["data"]
+        if field_paths is not None:
+            data = _project(data, field_paths)
+        return DocumentSnapshot(
+            self, copy.deepcopy(data), stored["create_time"], stored["update_time"]
+        )
+
+    def get(self, field_paths=None, **kwargs):
+        self._client._store._count(reads=1)
+        return self._client._result(self._snapshot(field_paths))
+
+    def _write(self, kind, data=None, merge=False):
+        now = self._client._store._commit([(kind, self.path, data or {}, merge)])
+        self._client._store.stats["rpcs"] += 1
+        return self._client._result(WriteResult(now))
+
+    def set(self, document_data, merge=False, **kwargs):
+        return self._write("set", document_data, merge)
+
+    def create(self, document_data, **kwargs):
+        return self._write("create", document_data)
+
+    def update(self, field_updates, option=None, **kwargs):
+        return self._write("update", field_updates, option)
+
+    def delete(self, **kwargs):
+        return self._write("delete")
+
+
+def _project(data, field_paths):
+    out = {}
+    for path in field_paths:
+        value = _get_path(data, path)
+        if value is not _MISSING:
+            _set_path(out, path, value)
+    return out
+
+
+class Query:
+    def __init__(self, client, path, collection_group=None):
+        self._client = client
+        self._path = path
+        self._group = collection_group
+        self._filters = []
+        self._orders = []
+        self._limit = None
+        self._limit_to_last = False
+        self._offset = 0
+        self._start = None
+        self._end = None
+        self._projection = None
+
+    def _copy(self, **changes):
+        q = copy.copy(self)
+        q._filters = list(self._filters)
+        q._orders = list(self._orders)
+        for key, value in changes.items():
+            setattr(q, key, value)
+        return q
+
+    # ---------- builders ----------
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        if filter is None:
+            filter = FieldFilter(field_path, op_string, value)
+        q = self._copy()
+        q._filters.append(filter)
+        return q
+
+    def order_by(self, field_path, direction="ASCENDING"):
+        q = self._copy()
+        q._orders.append((field_path, direction))
+        return q
+
+    def limit(self, count):
+        return self._copy(_limit=count, _limit_to_last=False)
+
+    def limit_to_last(self, count):
+        return self._copy(_limit=count, _limit_to_last=True)
+
+    def offset(self, num_to_skip):
+        return self._copy(_offset=num_to_skip)
+
+    def select(self, field_paths):
+        return self._copy(_projection=list(field_paths))
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._copy(_start=(document_fields_or_snapshot, False))
+
+    def start_at(self, document_fields_or_snapshot):
+        return self._copy(_start=(document_fields_or_snapshot, True))
+
+    def end_before(self, document_fields_or_snapshot):
+        return self._copy(_end=(document_fields_or_snapshot, False))
+
+    def end_at(self, document_fields_or_snapshot):
+        return self._copy(_end=(document_fields_or_snapshot, True))
+
+    def count(self, alias=None):
+        return AggregationQuery(self, alias or "count")
+
+    def on_snapshot(self, callback):
+        watch = Watch(self, callback)
+        self._client._store._watches.append(watch)
+        watch._push()
+        return watch
+
+    # ---------- execution ----------
+    def _candidates(self):
+        docs = self._client._store.docs
+        if self._group is not None:
+            for path in list(docs):
+                parts = path.split("/")
+                if len(parts) >= 2 and parts[-2] == self._group:
+                    yield path
+            return
+
+        depth = self._path.count("/") + 2
+        prefix = f"{self._path}/"
+        for path in list(docs):
+            if path.startswith(prefix) and path.count("/") + 1 == depth:
+                yield path
+
+    def _key(self, path, data):
+        key = []
+        for field, direction in self._orders:
+            value = path.rsplit("/", 1)[-1] if field == "__name__" else _get_path(data, field)
+            key.append(_Directional(_sort_key(value), direction == DESCENDING))
+        key.append(_Directional(path, bool(self._orders) and self._orders[-1][1] == DESCENDING))
+        return key
+
+    def _cursor_key(self, cursor):
+        if isinstance(cursor, DocumentSnapshot):
+            return self._key(cursor.reference.path, cursor._data or {})
+        if isinstance(cursor, dict):
+            values = [_get_path(cursor, field) for field, _ in self._orders]
+        else:
+            values = list(cursor)
+        return [
+            _Directional(_sort_key(v), direction == DESCENDING)
+            for v, (_, direction) in zip(values, self._orders)
+        ]
+
+    def _run(self):
+        store = self._client._store
+        with store._lock:
+            rows = []
+            for path in self._candidates():
+                stored = store.docs.get(path)
+                if stored is None:
+                    continue
+                data = stored["data"]
+                if not all(_matches(data, f) for f in self._filters):
+                    continue
+                if any(
+                    field != "__name__" and _get_path(data, field) is _MISSING
+                    for field, _ in self._orders
+                ):
+                    continue
+                rows.append((self._key(path, data), path, stored))
+
+            rows.sort(key=lambda r: r[0])
+
+            if self._start is not None:
+                cursor, inclusive = self._start
+                ck = self._cursor_key(cursor)
+                rows = [
+                    r for r in rows
+                    if (r[0][:len(ck)] >= ck if inclusive else r[0][:len(ck)] > ck)
+                ]
+            if self._end is not None:
+                cursor, inclusive = self._end
+                ck = self._cursor_key(cursor)
+                rows = [
+                    r for r in rows
+                    if (r[0][:len(ck)] <= ck if inclusive else r[0][:len(ck)] < ck)
+                ]
+
+            rows = rows[self._offset:]
+            if self._limit is not None:
+                rows = rows[-self._limit:] if self._limit_to_last else rows[:self._limit]
+
+            snapshots = []
+            for _, path, stored in rows:
+                data = stored["data"]
+                if self._projection is not None:
+                    data = _project(data, self._projection)
+                snapshots.append(DocumentSnapshot(
+                    DocumentReference(self._client, path),
+                    copy.deepcopy(data),
+                    stored["create_time"],
+                    stored["update_time"]
+                ))
+            return snapshots
+
+    def get(self, **kwargs):
+        snapshots = self._run()
+        # an empty result is still billed one read
+        self._client._store._count(reads=max(len(snapshots), 1))
+        return self._client._result(snapshots)
+
+    def stream(self, **kwargs):
+        snapshots = self._run()
+        self._client._store._count(reads=max(len(snapshots), 1))
+        return self._client._results(snapshots)
+
+
+class _Directional:
+    __slots__ = ("value", "descending")
+
+    def __init__(self, value, descending):
+        self.value = value
+        self.descending = descending
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        return self.value > other.value if self.descending else self.value < other.value
+
+    def __le__(self, other):
+        return self == other or self < other
+
+    def __gt__(self, other):
+        return other < self
+
+    def __ge__(self, other):
+        return self == other or other < self
+
+
+class CollectionReference(Query):
+    def __init__(self, client, path):
+        super().__init__(client, path)
+
+    @property
+    def id(self):
+        return self._path.rsplit("/", 1)[-1]
+
+    def document(self, document_id=None):
+        if document_id is None:
+            document_id = "".join(random.choices(string.ascii_letters + string.digits, k=20))
+        return DocumentReference(self._client, f"{self._path}/{document_id}")
+
+    def add(self, document_data, document_id=None, **kwargs):
+        ref = self.document(document_id)
+        now = self._client._store._commit([("create", ref.path, document_data, False)])
+        self._client._store.stats["rpcs"] += 1
+        return self._client._result((now, ref))
+
+    def list_documents(self, **kwargs):
+        refs = [DocumentReference(self._client, p) for p in self._candidates()]
+        return self._client._results(refs)
+
+
+class AggregationQuery:
+    def __init__(self, query, alias):
+        self._query = query
+        self._alias = alias
+
+    def get(self, **kwargs):
+        count = len(self._query._run())
+        # billed one read per batch of up to 1000 index entries
+        self._query._client._store._count(reads=max(1, -(-count // 1000)))
+        return self._query._client._result([[AggregationResult(self._alias, count)]])
+
+
+class Watch:
+    """
+    on_snapshot() handle. The callback gets (docs, changes, read_time)
+    like with the real listener, but synchronously : once on
+    registration, then in the writing thread after each commit that
+    changes the results.
+    """
+
+    def __init__(self, query, callback):
+        self._query = query
+        self._callback = callback
+        self._docs = None
+        self.is_active = True
+
+    def unsubscribe(self):
+        self.is_active = False
+        watches = self._query._client._store._watches
+        if self in watches:
+            watches.remove(self)
+
+    def _push(self):
+        if not self.is_active:
+            return
+        store = self._query._client._store
+        docs = self._query._run()
+
+        before = {d.reference.path: (i, d) for i, d in enumerate(self._docs or [])}
+        after = {d.reference.path for d in docs}
+        changes = []
+        for i, doc in enumerate(docs):
+            old = before.get(doc.reference.path)
+            if old is None:
+                changes.append(DocumentChange(ChangeType.ADDED, doc, -1, i))
+            elif old[1].update_time != doc.update_time or old[0] != i:
+                changes.append(DocumentChange(ChangeType.MODIFIED, doc, old[0], i))
+        for path, (i, doc) in before.items():
+            if path not in after:
+                changes.append(DocumentChange(ChangeType.REMOVED, doc, i, -1))
+
+        first = self._docs is None
+        if not changes and not first:
+            return
+        self._docs = docs
+        # billed one read per document sent, the initial snapshot at least one
+        store.stats["reads"] += max(len(changes), 1) if first else len(changes)
+        try:
+            self._callback(docs, changes, store._last)
+        except Exception as e:
+            print("❌ SNAPSHOT CALLBACK ERROR:", e)
+
+
+class WriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._ops = []
+
+    def set(self, reference, document_data, merge=False):
+        self._ops.append(("set", reference.path, document_data, merge))
+        return self
+
+    def create(self, reference, document_data):
+        self._ops.append(("create", reference.path, document_data, False))
+        return self
+
+    def update(self, reference, field_updates, option=None, **kwargs):
+        self._ops.append(("update", reference.path, field_updates, option))
+        return self
+
+    def delete(self, reference, **kwargs):
+        self._ops.append(("delete", reference.path, None, False))
+        return self
+
+    def __len__(self):
+        return len(self._ops)
+
+    def commit(self, **kwargs):
+        if len(self._ops) > 500:
+            raise ValueError("A batch can contain at most 500 writes")
+        now = self._client._store._commit(self._ops)
+        self._client._store.stats["rpcs"] += 1
+        results = [WriteResult(now) for _ in self._ops]
+        self._ops = []
+        return self._client._result(results)
+
+
+# =========================
+# STORAGE
+# =========================
+class MemoryBucket:
+    """The google.cloud.storage.Bucket calls made by the chat service."""
+
+    name = "memory"
+
+    def __init__(self):
+        self.blobs = {}
+
+    def blob(self, blob_name, chunk_size=None):
+        return MemoryBlob(self, blob_name)
+
+
+class MemoryBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.size = None
+        self.content_type = None
+
+    def upload_from_file(self, file_obj, content_type=None, **kwargs):
+        self.upload_from_string(file_obj.read(), content_type)
+
+    def upload_from_string(self, data, content_type=None, **kwargs):
+        if isinstance(data, str):
+            data = data.encode()
+        self.bucket.blobs[self.name] = (data, content_type)
+        self.size = len(data)
+        self.content_type = content_type
+
+    def download_as_bytes(self, **kwargs):
+        self.reload()
+        return self.bucket.blobs[self.name][0]
+
+    def exists(self, **kwargs):
+        return self.name in self.bucket.blobs
+
+    def reload(self, **kwargs):
+        if self.name not in self.bucket.blobs:
+            raise NotFound(f"No such object: {self.bucket.name}/{self.name}")
+        data, self.content_type = self.bucket.blobs[self.name]
+        self.size = len(data)
+
+    def delete(self, **kwargs):
+        if self.bucket.blobs.pop(self.name, None) is None:
+            raise NotFound(f"No such object: {self.bucket.name}/{self.name}")
+
+    def generate_signed_url(self, expiration=None, **kwargs):
+        return f"memory://{self.bucket.name}/{self.name}"
+
+    def create_resumable_upload_session(self, content_type=None, size=None, origin=None, **kwargs):
+        # the client "uploads" with upload_from_string on the same blob name
+        return f"memory://{self.bucket.name}/{self.name}?upload"
@@ -0,0 +1,111 @@
+"""
+Minimal Prometheus registry (counters and histograms), rendered in the
+text exposition format by GET /metrics. Values are per process : with
+several uvicorn workers, scrape each one or aggregate on labels.
+"""
+import threading
+
+# seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# documents
+READ_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, value: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, *labels, value: float):
+        with self._lock:
+            # [per bucket counts (cumulative), sum, count]
+            state = self._values.setdefault(labels, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._values.items()):
+                for bound, n in zip(self.buckets, counts):
+                    le = _labels(self.labels + ("le",), labels + (bound,))
+                    lines.append(f"{self.name}_bucket{le} {n}")
+                le = _labels(self.labels + ("le",), labels + ("+Inf",))
+                lines.append(f"{self.name}_bucket{le} {count}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {total}")
+                lines.append(f"{self.name}_count{_labels(self.labels, labels)} {count}")
+        return lines
+
+
+# =========================
+# METRICS
+# =========================
+http_requests = Counter(
+    "http_requests_total", "HTTP requests", ("method", "route", "status")
+)
+http_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route")
+)
+firestore_reads = Counter(
+    "firestore_reads_total", "Firestore documents read", ("method", "route")
+)
+firestore_writes = Counter(
+    "firestore_writes_total", "Firestore documents written", ("method", "route")
+)
+firestore_rpcs = Counter(
+    "firestore_rpcs_total", "Firestore calls", ("method", "route")
+)
+firestore_seconds = Counter(
+    "firestore_duration_seconds_total", "Time spent waiting for Firestore", ("method", "route")
+)
+firestore_reads_per_request = Histogram(
+    "firestore_reads_per_request", "Firestore documents read by one request",
+    ("method", "route"), buckets=READ_BUCKETS
+)
+
+REGISTRY = [
+    http_requests, http_duration,
+    firestore_reads, firestore_writes, firestore_rpcs, firestore_seconds,
+    firestore_reads_per_request
+]
+
+
+def render() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
@@ -0,0 +1,154 @@
+"""
+Email outbox : requests enqueue, background workers deliver.
+
+Each worker owns one SMTP connection (app.utils.mailer.SMTPConnection)
+reused across messages and closed after SMTP_IDLE_TIMEOUT seconds
+without mail. Transient failures are retried with exponential backoff,
+the delivery status is kept on the user document :
+
+    emailStatus   queued | retrying | sent | failed
+    emailAttempts number of failed attempts
+    emailError    last error (removed once sent)
+
+The queue is in memory on purpose (messages carry the temporary
+password) : mail still queued when the process stops stays "queued".
+Mail can be enqueued before start() (scripts, tests) : it is delivered
+once the workers run, e.g. ``await outbox.start(); await outbox.join()``.
+"""
+import asyncio
+import os
+import smtplib
+
+from firebase_admin import firestore
+from google.api_core.exceptions import NotFound
+
+from app.utils.firebase import init_async_firebase
+from app.utils.mailer import SMTPConnection
+
+db = init_async_firebase()
+
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", 2))
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", 30))
+MAX_ATTEMPTS = int(os.getenv("SMTP_MAX_ATTEMPTS", 5))
+RETRY_BASE_DELAY = float(os.getenv("SMTP_RETRY_DELAY", 2))
+
+
+def _permanent(exc: Exception) -> bool:
+    """5xx replies (bad recipient, rejected sender...) : retrying is useless."""
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return True
+    if isinstance(exc, smtplib.SMTPAuthenticationError):
+        return False
+    code = getattr(exc, "smtp_code", None)
+    return isinstance(code, int) and 500 <= code < 600
+
+
+class EmailOutbox:
+    def __init__(self, pool_size: int = SMTP_POOL_SIZE):
+        self._pool_size = pool_size
+        self._queue = asyncio.Queue()
+        self._workers = []
+        self._retries = set()
+
+    async def start(self):
+        # a queue binds to the loop that first waits on it : a new one for
+        # this loop, with the mail enqueued so far
+        pending, self._queue = self._queue, asyncio.Queue()
+        while not pending.empty():
+            self._queue.put_nowait(pending.get_nowait())
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(self._pool_size)
+        ]
+
+    async def stop(self):
+        for task in [*self._workers, *self._retries]:
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._retries, return_exceptions=True)
+        self._workers = []
+        self._retries = set()
+
+    def enqueue(self, uid: str, msg):
+        """``msg`` : email.message.Message, the user doc is already "queued"."""
+        self._queue.put_nowait((uid, msg, 0))
+
+    async def join(self):
+        """Wait until every queued message is sent or failed (scripts, tests)."""
+        while True:
+            await self._queue.join()
+            if not self._retries:
+                return
+            await asyncio.gather(*self._retries, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "retrying": len(self._retries),
+            "workers": len(self._workers)
+        }
+
+    # =========================
+    # WORKERS
+    # =========================
+    async def _worker(self):
+        conn = SMTPConnection()
+        try:
+            while True:
+                try:
+                    job = await asyncio.wait_for(self._queue.get(), SMTP_IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    await asyncio.to_thread(conn.close)
+                    continue
+                try:
+                    await self._deliver(conn, *job)
+                except Exception as e:
+                    # one message must not stop the worker
+                    print(f"❌ OUTBOX ERROR ({job[0]}):", e)
+                finally:
+                    self._queue.task_done()
+        finally:
+            await asyncio.to_thread(conn.close)
+
+    async def _deliver(self, conn, uid, msg, attempt):
+        try:
+            await asyncio.to_thread(conn.send, msg)
+        except Exception as e:
+            # the connection may be half-open, the next message reconnects
+            await asyncio.to_thread(conn.close)
+            attempt += 1
+            print(f"SMTP ERROR ({msg['To']}, attempt {attempt}):", e)
+
+            if _permanent(e) or attempt >= MAX_ATTEMPTS:
+                await self._set_status(uid, {
+                    "emailStatus": "failed", "emailAttempts": attempt, "emailError": str(e)
+                })
+                return
+
+            await self._set_status(uid, {
+                "emailStatus": "retrying", "emailAttempts": attempt, "emailError": str(e)
+            })
+            task = asyncio.create_task(
+                self._retry(uid, msg, attempt, RETRY_BASE_DELAY * 2 ** (attempt - 1))
+            )
+            self._retries.add(task)
+            task.add_done_callback(self._retries.discard)
+            return
+
+        await self._set_status(uid, {
+            "emailStatus": "sent",
+            "emailSentAt": firestore.SERVER_TIMESTAMP,
+            "emailError": firestore.DELETE_FIELD
+        })
+
+    async def _retry(self, uid, msg, attempt, delay):
+        await asyncio.sleep(delay)
+        self._queue.put_nowait((uid, msg, attempt))
+
+    async def _set_status(self, uid, status: dict):
+        try:
+            await db.collection("users").document(uid).update(status)
+        except NotFound:
+            # user deleted in the meantime
+            pass
+
+
+outbox = EmailOutbox()
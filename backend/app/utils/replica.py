@@ -0,0 +1,358 @@
+"""
+Local replica of the hot Firestore data, kept up to date by on_snapshot
+listeners instead of being read on every request.
+
+    groups              : every group (without the legacy notes array)
+    users               : email, role, displayName and groupId of every user
+    chats/{id}/messages : the last CHAT_WINDOW messages of the chats with
+                          a WebSocket open on this worker
+
+Optional (FIRESTORE_LISTENERS=1), started and stopped by the app
+lifespan. Readers get None whenever the replica cannot answer (not
+started, first snapshot not received yet, listener down, collection over
+its size cap) and fall back to Firestore.
+
+The SDK delivers snapshots on its own threads : the data is guarded by a
+lock, readers copy what they return. A snapshot lands after the write
+that caused it : the responses cached meanwhile (app.utils.response_cache)
+may have been built from the old data, so their tags are invalidated
+again when it arrives.
+"""
+import asyncio
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+
+from firebase_admin import firestore
+from google.cloud.firestore_v1.watch import ChangeType
+
+from app.utils import response_cache
+from app.utils.firebase import init_firebase
+
+LISTENERS_ENABLED = os.getenv("FIRESTORE_LISTENERS", "0") == "1"
+# collections larger than this are not replicated (memory bound)
+MAX_USERS = int(os.getenv("REPLICA_MAX_USERS", 100000))
+MAX_GROUPS = int(os.getenv("REPLICA_MAX_GROUPS", 20000))
+# chats listened to at once, messages kept per chat
+MAX_CHATS = int(os.getenv("REPLICA_MAX_CHATS", 200))
+CHAT_WINDOW = int(os.getenv("REPLICA_CHAT_WINDOW", 100))
+# a chat listener outlives its last WebSocket this long (reconnections)
+CHAT_IDLE_TIMEOUT = float(os.getenv("REPLICA_CHAT_IDLE_TIMEOUT", 60))
+# dead listeners are restarted, idle chats closed, every ... seconds
+CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", 30))
+
+USER_FIELDS = ("email", "role", "displayName", "groupId")
+
+
+def _user(data: dict) -> dict:
+    return {field: data[field] for field in USER_FIELDS if field in data}
+
+
+def _group(data: dict) -> dict:
+    data.pop("notes", None)
+    return data
+
+
+def _members(data: dict | None, field: str) -> set:
+    value = (data or {}).get(field)
+    if field == "studentIds":
+        return set(value or [])
+    return {value} if value else set()
+
+
+class _Listener:
+    """One on_snapshot target and the documents it delivered."""
+
+    def __init__(self, name: str, max_size: int, project):
+        self.name = name
+        self.max_size = max_size
+        self.project = project
+        self.docs = {}
+        self.watch = None
+        self.synced = False
+        self.overflow = False
+
+    @property
+    def ready(self) -> bool:
+        return (
+            self.synced and not self.overflow
+            and self.watch is not None and getattr(self.watch, "is_active", True)
+        )
+
+
+class _Chat:
+    def __init__(self):
+        self.watch = None
+        self.messages = None  # snapshots, oldest first
+        self.complete = False
+        self.sockets = 0
+        self.idle_since = time.monotonic()
+
+
+class Replica:
+    def __init__(self, enabled: bool = LISTENERS_ENABLED):
+        self.enabled = enabled
+        self._db = None
+        self._lock = threading.Lock()
+        self._users = _Listener("users", MAX_USERS, _user)
+        self._groups = _Listener("groups", MAX_GROUPS, _group)
+        # uid -> ids of the groups supervised / joined (from self._groups)
+        self._prof_groups = {}
+        self._student_groups = {}
+        self._chats = {}
+        self._task = None
+        self._loop = None
+
+    # =========================
+    # LIFECYCLE
+    # =========================
+    async def start(self):
+        if not self.enabled:
+            return
+        self._db = init_firebase()
+        self._loop = asyncio.get_running_loop()
+        for listener in (self._users, self._groups):
+            await asyncio.to_thread(self._listen, listener)
+        self._task = asyncio.create_task(self._supervise())
+        print("🛰️ Firestore listeners started (users, groups)")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        with self._lock:
+            watches = [l.watch for l in (self._users, self._groups)]
+            watches += [chat.watch for chat in self._chats.values()]
+            self._chats.clear()
+        for watch in watches:
+            if watch is not None:
+                await asyncio.to_thread(watch.unsubscribe)
+        for listener in (self._users, self._groups):
+            self._reset(listener)
+
+    def _listen(self, listener: _Listener):
+        """Blocking : opens the stream."""
+        self._reset(listener)
+        listener.watch = self._db.collection(listener.name).on_snapshot(
+            lambda docs, changes, read_time: self._on_change(listener, changes)
+        )
+
+    def _reset(self, listener: _Listener):
+        with self._lock:
+            listener.watch = None
+            listener.docs = {}
+            listener.synced = False
+            listener.overflow = False
+            if listener is self._groups:
+                self._prof_groups, self._student_groups = {}, {}
+
+    async def _supervise(self):
+        while True:
+            await asyncio.sleep(CHECK_INTERVAL)
+            try:
+                await self._check()
+            except Exception as e:
+                print("❌ REPLICA CHECK ERROR:", e)
+
+    async def _check(self):
+        for listener in (self._users, self._groups):
+            if listener.overflow:
+                # over the cap : stays off, readers use Firestore
+                if listener.watch is not None:
+                    watch, listener.watch = listener.watch, None
+                    await asyncio.to_thread(watch.unsubscribe)
+                    print(f"⚠️ {listener.name} : more than {listener.max_size} documents, not replicated")
+            elif listener.watch is None or not getattr(listener.watch, "is_active", True):
+                print(f"🔁 {listener.name} listener restarted")
+                await asyncio.to_thread(self._listen, listener)
+
+        now = time.monotonic()
+        with self._lock:
+            closed = [
+                (gid, chat) for gid, chat in self._chats.items()
+                if (chat.sockets == 0 and now - chat.idle_since >= CHAT_IDLE_TIMEOUT)
+                or (chat.watch is not None and not getattr(chat.watch, "is_active", True))
+            ]
+            for gid, _ in closed:
+                del self._chats[gid]
+        for _, chat in closed:
+            if chat.watch is not None:
+                await asyncio.to_thread(chat.watch.unsubscribe)
+
+    # =========================
+    # SNAPSHOTS (SDK threads)
+    # =========================
+    def _on_change(self, listener: _Listener, changes):
+        tags = []
+        with self._lock:
+            if listener.overflow:
+                return
+            docs = listener.docs
+            for change in changes:
+                doc_id = change.document.id
+                old, new = docs.pop(doc_id, None), None
+                if change.type != ChangeType.REMOVED:
+                    new = docs[doc_id] = listener.project(change.document.to_dict())
+                if listener is self._groups:
+                    self._index_group(doc_id, old, new)
+                # the first snapshot : nothing was served from the replica yet
+                if listener.synced and old != new:
+                    tags.extend(self._tags(listener, doc_id, old, new))
+
+            if len(docs) > listener.max_size:
+                # dropped here, the listener is closed by _check
+                listener.overflow = True
+                listener.docs = {}
+                if listener is self._groups:
+                    self._prof_groups, self._student_groups = {}, {}
+                return
+            listener.synced = True
+
+        if tags:
+            self._invalidate(tags)
+
+    def _tags(self, listener: _Listener, doc_id: str, old: dict | None, new: dict | None) -> list:
+        """Response cache tags of a changed document (see response_cache.invalidate_group)."""
+        if listener is self._users:
+            return [f"user:{doc_id}"]
+        moved = set()
+        for field in ("profId", "studentIds"):
+            moved |= _members(old, field) ^ _members(new, field)
+        return [f"group:{doc_id}", *(f"user:{uid}" for uid in moved)]
+
+    def _invalidate(self, tags: list):
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            response_cache.responses.invalidate(*tags)
+        else:
+            loop.call_soon_threadsafe(response_cache.responses.invalidate, *tags)
+
+    def _index_group(self, group_id: str, old: dict | None, new: dict | None):
+        for index, field in ((self._prof_groups, "profId"), (self._student_groups, "studentIds")):
+            before, after = _members(old, field), _members(new, field)
+            for uid in before - after:
+                index[uid].discard(group_id)
+                if not index[uid]:
+                    del index[uid]
+            for uid in after - before:
+                index.setdefault(uid, set()).add(group_id)
+
+    def _on_chat(self, group_id: str, docs):
+        with self._lock:
+            chat = self._chats.get(group_id)
+            if chat is not None:
+                # the query is newest first
+                chat.messages = list(reversed(docs))
+                chat.complete = len(docs) < CHAT_WINDOW
+
+    # =========================
+    # READS
+    # =========================
+    def get_user(self, uid: str) -> dict | None:
+        with self._lock:
+            if not self._users.ready:
+                return None
+            user = self._users.docs.get(uid)
+        return dict(user) if user is not None else None
+
+    def get_users(self, uids) -> dict | None:
+        """uid -> profile (USER_FIELDS), unknown uids left out."""
+        with self._lock:
+            if not self._users.ready:
+                return None
+            docs = self._users.docs
+            return {uid: dict(docs[uid]) for uid in uids if uid in docs}
+
+    def get_group(self, group_id: str) -> dict | None:
+        with self._lock:
+            if not self._groups.ready:
+                return None
+            group = self._groups.docs.get(group_id)
+        return dict(group) if group is not None else None
+
+    def get_groups(self, group_ids) -> list | None:
+        with self._lock:
+            if not self._groups.ready:
+                return None
+            docs = self._groups.docs
+            return [{**docs[gid], "groupId": gid} for gid in group_ids if gid in docs]
+
+    def group_ids(self, user: dict) -> list | None:
+        """Admin : every group, prof : supervised groups, student : own groups."""
+        with self._lock:
+            if not self._groups.ready:
+                return None
+            if user["role"] == "admin":
+                ids = self._groups.docs.keys()
+            elif user["role"] == "prof":
+                ids = self._prof_groups.get(user["uid"], ())
+            else:
+                ids = self._student_groups.get(user["uid"], ())
+            return sorted(ids)
+
+    def chat_window(self, group_id: str):
+        """(snapshots oldest first, whole chat ?) or None."""
+        with self._lock:
+            chat = self._chats.get(group_id)
+            if chat is None or chat.messages is None:
+                return None
+            return chat.messages, chat.complete
+
+    # =========================
+    # CHATS
+    # =========================
+    @asynccontextmanager
+    async def watch_chat(self, group_id: str):
+        """Around a WebSocket : the chat is replicated while one is open."""
+        if self._db is None:
+            yield
+            return
+
+        with self._lock:
+            chat = self._chats.get(group_id)
+            start = chat is None and len(self._chats) < MAX_CHATS
+            if start:
+                chat = self._chats[group_id] = _Chat()
+            if chat is not None:
+                chat.sockets += 1
+
+        try:
+            if start:
+                query = (
+                    self._db.collection("chats").document(group_id).collection("messages")
+                    .order_by("timestamp", direction=firestore.Query.DESCENDING)
+                    .limit(CHAT_WINDOW)
+                )
+                try:
+                    chat.watch = await asyncio.to_thread(
+                        query.on_snapshot,
+                        lambda docs, changes, read_time: self._on_chat(group_id, docs)
+                    )
+                except Exception as e:
+                    # the chat is read from Firestore, the next WebSocket retries
+                    print(f"❌ CHAT LISTENER ERROR ({group_id}):", e)
+                    with self._lock:
+                        if self._chats.get(group_id) is chat:
+                            del self._chats[group_id]
+            yield
+        finally:
+            if chat is not None:
+                with self._lock:
+                    chat.sockets -= 1
+                    chat.idle_since = time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "users": {"ready": self._users.ready, "size": len(self._users.docs)},
+                "groups": {"ready": self._groups.ready, "size": len(self._groups.docs)},
+                "chats": {
+                    "size": len(self._chats),
+                    "sockets": sum(chat.sockets for chat in self._chats.values())
+                }
+            }
+
+
+replica = Replica()
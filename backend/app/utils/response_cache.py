@@ -0,0 +1,162 @@
+"""
+Cache of whole JSON responses for read-heavy GET routes, with ETags.
+
+    key  : (path, uid, query string)
+    tags : what the response was built from, "group:{id}", "user:{uid}",
+           "calendar:{groupId}"
+
+Mutations invalidate tags (invalidate_group / invalidate_user /
+invalidate_calendar), which drops every response built from them. A tag
+invalidated while a response is being built keeps that response out of
+the cache. The TTL bounds how long a change made elsewhere (console,
+scripts, another worker) can be missed.
+
+Clients revalidate with If-None-Match : 304 when the ETag still matches.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.utils.cache import TTLCache
+
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 60))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 5000))
+
+
+class ResponseCache:
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL):
+        self.ttl = ttl
+        self.invalidations = 0
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        # tag -> (version, monotonic time) of its last invalidation
+        self._tags = OrderedDict()
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def version(self) -> int:
+        with self._lock:
+            return self._version
+
+    def _stale(self, tags, version: int) -> bool:
+        with self._lock:
+            return any(self._tags.get(tag, (0,))[0] > version for tag in tags)
+
+    def get(self, key):
+        """(etag, body) or None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        etag, body, tags, version = entry
+        if self._stale(tags, version):
+            self._entries.invalidate(key)
+            return None
+        return etag, body
+
+    def set(self, key, etag: str, body: bytes, tags, version: int):
+        """``version`` : self.version() taken before building the response."""
+        tags = tuple(tags)
+        if not self._stale(tags, version):
+            self._entries.set(key, (etag, body, tags, version))
+
+    def invalidate(self, *tags):
+        now = time.monotonic()
+        with self._lock:
+            self._version += 1
+            self.invalidations += 1
+            for tag in tags:
+                self._tags[tag] = (self._version, now)
+                self._tags.move_to_end(tag)
+            # older than the TTL : every response built before has expired
+            while self._tags:
+                _, at = next(iter(self._tags.values()))
+                if at + self.ttl > now:
+                    break
+                self._tags.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        with self._lock:
+            self._tags.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            tags = len(self._tags)
+        return {**self._entries.stats(), "tags": tags, "invalidations": self.invalidations}
+
+
+responses = ResponseCache()
+
+
+# =========================
+# TAGS
+# =========================
+def invalidate_group(group_id: str, uids=()):
+    """Group document written, ``uids`` : members whose groups changed."""
+    responses.invalidate(f"group:{group_id}", *(f"user:{uid}" for uid in uids if uid))
+
+
+def invalidate_user(uid: str):
+    """Profile (name, email, role) or memberships of ``uid`` changed."""
+    responses.invalidate(f"user:{uid}")
+
+
+def invalidate_calendar(group_id: str):
+    responses.invalidate(f"calendar:{group_id}")
+
+
+def group_tags(uid: str, groups) -> list:
+    """Groups of ``uid`` : the groups and the profiles of their students."""
+    tags = [f"user:{uid}"]
+    for g in groups:
+        tags.append(f"group:{g['groupId']}")
+        tags.extend(f"user:{sid}" for sid in g.get("studentIds", []))
+    return tags
+
+
+# =========================
+# ROUTES
+# =========================
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def _matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [c.strip().removeprefix("W/") for c in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+async def cached(request: Request, user: dict, build, tags) -> Response:
+    """
+    Response of ``build()`` (coroutine function) for this user and query,
+    from the cache when possible. ``tags(result)`` : tags of the result.
+    Errors are not cached.
+    """
+    key = (request.url.path, user["uid"], str(sorted(request.query_params.multi_items())))
+
+    entry = responses.get(key)
+    if entry is None:
+        version = responses.version()
+        result = await build()
+        body = JSONResponse(jsonable_encoder(result)).body
+        entry = (_etag(body), body)
+        responses.set(key, *entry, tags(result), version)
+
+    etag, body = entry
+    # private : per user, no-cache : the browser revalidates every time
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def cache_stats() -> dict:
+    return {"responses": responses.stats()}
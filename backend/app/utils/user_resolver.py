@@ -0,0 +1,46 @@
+from app.utils.firebase import init_async_firebase
+from app.utils.replica import replica
+
+db = init_async_firebase()
+
+
+class UserResolver:
+    """
+    Resolves users/{uid} documents with a single ``get_all`` per call,
+    whatever the number of uids.
+
+    Create one instance per request : uids already resolved are memoized
+    and never fetched twice, the memo is dropped with the request.
+
+    ``profile_only`` : the caller only needs email / role / displayName /
+    groupId, served by the local replica when the listeners run.
+    """
+
+    def __init__(self, profile_only: bool = False):
+        self.users = db.collection("users")
+        self.profile_only = profile_only
+        self._memo = {}
+
+    async def get_many(self, uids) -> dict:
+        """uid -> user data, unknown uids are left out."""
+        uids = [uid for uid in dict.fromkeys(uids) if uid]
+
+        if self.profile_only:
+            profiles = replica.get_users(uids)
+            if profiles is not None:
+                return profiles
+
+        missing = [uid for uid in uids if uid not in self._memo]
+        if missing:
+            refs = [self.users.document(uid) for uid in missing]
+            async for snap in db.get_all(refs):
+                self._memo[snap.id] = snap.to_dict() if snap.exists else None
+
+        return {
+            uid: self._memo[uid]
+            for uid in uids
+            if self._memo.get(uid) is not None
+        }
+
+    async def get(self, uid: str) -> dict | None:
+        return (await self.get_many([uid])).get(uid)
@@ -0,0 +1,147 @@
+"""
+Load test of the hot routes on the in-memory store.
+
+    cd backend
+    python -m tests.benchmark --groups 20 --students 4 --messages 200 --requests 300
+
+Drives the real app (middlewares, auth, caches, services) through
+httpx.ASGITransport : no server, no network, no Firebase project. For
+each route : p50 / p99 latency, throughput and Firestore reads / RPCs
+per request as counted by the MemoryStore. Latencies only compare runs
+made on the same machine, reads per request are exact.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import statistics
+import time
+
+os.environ["FIRESTORE_BACKEND"] = "memory"
+
+import httpx
+from firebase_admin import auth
+
+from app.main import app
+from app.utils.firebase import init_async_firebase, _memory_store
+from tests.fixtures import seed
+
+
+def _routes(ids: dict) -> dict:
+    """route name -> cycle of (path, uid)."""
+    profs = ids["profs"]
+    groups = list(ids["groups"].items())
+    students = [(gid, sid) for gid, sids in groups for sid in sids]
+    return {
+        "GET /chat/{id}/messages": itertools.cycle(
+            [(f"/chat/{gid}/messages?limit=50", sids[0]) for gid, sids in groups]
+        ),
+        "GET /prof/dashboard-stats": itertools.cycle(
+            [("/prof/dashboard-stats", uid) for uid in profs]
+        ),
+        "GET /student/dashboard-stats": itertools.cycle(
+            [("/student/dashboard-stats", sid) for _, sid in students]
+        ),
+        "GET /complaints/prof": itertools.cycle(
+            [("/complaints/prof?limit=20", uid) for uid in profs]
+        ),
+        "GET /groups/prof": itertools.cycle(
+            [("/groups/prof", uid) for uid in profs]
+        ),
+    }
+
+
+async def _run_route(client, store, targets, requests: int, concurrency: int, warmup: int):
+    for _ in range(warmup):
+        path, uid = next(targets)
+        await client.get(path, headers={"Authorization": f"Bearer {uid}"})
+
+    latencies, errors = [], 0
+    queue = [next(targets) for _ in range(requests)]
+
+    async def worker():
+        nonlocal errors
+        while queue:
+            path, uid = queue.pop()
+            start = time.perf_counter()
+            r = await client.get(path, headers={"Authorization": f"Bearer {uid}"})
+            latencies.append(time.perf_counter() - start)
+            if r.status_code != 200:
+                errors += 1
+
+    store.reset_stats()
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "p50Ms": round(statistics.median(latencies) * 1000, 2),
+        "p99Ms": round(cuts[98] * 1000, 2),
+        "requestsPerSecond": round(requests / elapsed, 1),
+        "readsPerRequest": round(store.stats["reads"] / requests, 1),
+        "rpcsPerRequest": round(store.stats["rpcs"] / requests, 1),
+        "errors": errors
+    }
+
+
+async def run(args) -> dict:
+    # test tokens : the token is the uid
+    auth.verify_id_token = lambda token, *a, **k: {"uid": token, "exp": time.time() + 3600}
+
+    store = _memory_store()
+    ids = await seed(
+        init_async_firebase(),
+        groups=args.groups,
+        students=args.students,
+        messages=args.messages,
+        complaints=args.complaints,
+        events=args.events,
+        profs=args.profs
+    )
+
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name, targets in _routes(ids).items():
+                if args.route and args.route not in name:
+                    continue
+                results[name] = await _run_route(
+                    client, store, targets, args.requests, args.concurrency, args.warmup
+                )
+    return results
+
+
+def _print(results: dict):
+    header = f"{'route':<30} {'p50 ms':>8} {'p99 ms':>8} {'req/s':>8} {'reads/req':>10} {'rpcs/req':>9} {'errors':>7}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        print(
+            f"{name:<30} {r['p50Ms']:>8} {r['p99Ms']:>8} {r['requestsPerSecond']:>8} "
+            f"{r['readsPerRequest']:>10} {r['rpcsPerRequest']:>9} {r['errors']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of the hot API routes")
+    parser.add_argument("--groups", type=int, default=20)
+    parser.add_argument("--students", type=int, default=4, help="per group")
+    parser.add_argument("--messages", type=int, default=200, help="per group")
+    parser.add_argument("--complaints", type=int, default=5, help="per group")
+    parser.add_argument("--events", type=int, default=5, help="per group")
+    parser.add_argument("--profs", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=300, help="per route")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=20, help="requests per route before measuring")
+    parser.add_argument("--route", help="only the routes containing this text")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    _print(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
@@ -0,0 +1,73 @@
+import asyncio
+import os
+import time
+
+# before any app import : services bind their client at import time
+os.environ["FIRESTORE_BACKEND"] = "memory"
+os.environ.setdefault("SMTP_HOST", "127.0.0.1")
+os.environ.setdefault("SMTP_PORT", "8025")
+os.environ.setdefault("SMTP_STARTTLS", "0")
+os.environ.setdefault("SMTP_EMAIL", "noreply@pfe.test")
+os.environ.setdefault("SMTP_RETRY_DELAY", "0.05")
+
+import pytest
+from fastapi.testclient import TestClient
+from firebase_admin import auth
+
+from app.main import app
+from app.chat.services import signed_urls
+from app.middleware.auth_middleware import token_cache, user_cache
+from app.utils import membership, response_cache
+from app.utils.firebase import init_async_firebase, _memory_store
+from tests.fixtures import seed
+
+ADMIN = {"Authorization": "Bearer ADMIN_SESSION"}
+
+
+def auth_header(uid: str) -> dict:
+    """Test tokens are the uid itself (see the ``client`` fixture)."""
+    return {"Authorization": f"Bearer {uid}"}
+
+
+def wait_for(predicate, timeout: float = 5) -> bool:
+    """Polls background work (uploads, outbox, import jobs)."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+@pytest.fixture(scope="session")
+def client():
+    mp = pytest.MonkeyPatch()
+    mp.setattr(auth, "verify_id_token", lambda token, *a, **k: {
+        "uid": token, "exp": time.time() + 3600
+    })
+    with TestClient(app, raise_server_exceptions=False) as c:
+        yield c
+    mp.undo()
+
+
+@pytest.fixture(autouse=True)
+def store():
+    """Empty store and caches for every test."""
+    store = _memory_store()
+    store.clear()
+    for cache in (token_cache, user_cache, signed_urls,
+                  membership.group_members, membership.user_groups,
+                  response_cache.responses):
+        cache.clear()
+    return store
+
+
+@pytest.fixture
+def db(store):
+    return init_async_firebase()
+
+
+@pytest.fixture
+def data(db):
+    """2 groups of 3 students supervised by prof0, 10 messages each."""
+    return asyncio.run(seed(db))
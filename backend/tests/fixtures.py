@@ -0,0 +1,150 @@
+"""
+Seeded data generators for the in-memory store (FIRESTORE_BACKEND=memory).
+
+    ids = await seed(db, groups=20, students=4, messages=200)
+
+Users are "prof{i}", "s{group}_{i}" (tokens equal the uid with the test
+auth stub), groups "g{i}". Documents have the shape the services write,
+then the dashboard counters are rebuilt from them.
+"""
+import random
+from datetime import datetime, timedelta, timezone
+
+from app.utils import dashboard_counters
+
+BATCH_SIZE = 500
+
+
+class _Writer:
+    """Buffers sets and commits them 500 at a time."""
+
+    def __init__(self, db):
+        self._db = db
+        self._ops = []
+
+    async def set(self, ref, data):
+        self._ops.append((ref, data))
+        if len(self._ops) >= BATCH_SIZE:
+            await self.flush()
+
+    async def flush(self):
+        if not self._ops:
+            return
+        batch = self._db.batch()
+        for ref, data in self._ops:
+            batch.set(ref, data)
+        await batch.commit()
+        self._ops = []
+
+
+def _user(email: str, name: str, role: str, group_id=None) -> dict:
+    return {
+        "email": email,
+        "displayName": name,
+        "role": role,
+        "groupId": group_id,
+        "emailLower": email.lower(),
+        "displayNameLower": name.lower(),
+        "createdAt": datetime.now(timezone.utc)
+    }
+
+
+async def seed(
+    db,
+    groups: int = 2,
+    students: int = 3,
+    messages: int = 10,
+    complaints: int = 2,
+    events: int = 2,
+    profs: int = 1,
+    rng_seed: int = 0
+) -> dict:
+    """
+    ``groups`` groups of ``students`` students spread over ``profs`` profs,
+    with per group ``messages`` chat messages (the last day), ``complaints``
+    complaints to the prof and ``events`` calendar tasks (the next days).
+
+    Returns {"profs": [uid], "groups": {groupId: [student uid]}}.
+    """
+    rng = random.Random(rng_seed)
+    now = datetime.now(timezone.utc)
+    out = {"profs": [f"prof{p}" for p in range(profs)], "groups": {}}
+    writer = _Writer(db)
+
+    for uid in out["profs"]:
+        await writer.set(
+            db.collection("users").document(uid),
+            _user(f"{uid}@pfe.test", f"Prof {uid}", "prof")
+        )
+
+    for g in range(groups):
+        group_id = f"g{g}"
+        prof_id = out["profs"][g % profs]
+        student_ids = [f"s{g}_{i}" for i in range(students)]
+        out["groups"][group_id] = student_ids
+
+        await writer.set(db.collection("groups").document(group_id), {
+            "name": f"Groupe {g}",
+            "profId": prof_id,
+            "studentIds": student_ids,
+            "projectTitle": f"Projet {g}",
+            "createdAt": now
+        })
+        for sid in student_ids:
+            await writer.set(
+                db.collection("users").document(sid),
+                _user(f"{sid}@pfe.test", f"Student {sid}", "student", group_id)
+            )
+
+        messages_ref = db.collection("chats").document(group_id).collection("messages")
+        for m in range(messages):
+            sender = rng.choice([prof_id, *student_ids])
+            role = "prof" if sender == prof_id else "student"
+            # spread over the last 24 hours, oldest first
+            ts = now - timedelta(seconds=(messages - m) * 86400 / max(messages, 1))
+            await writer.set(messages_ref.document(f"m{m:06d}"), {
+                "senderId": sender,
+                "senderEmail": f"{sender}@pfe.test",
+                "senderRole": role,
+                "text": f"message {m}",
+                "timestamp": ts,
+                "updatedAt": ts,
+                "edited": False,
+                "type": "text"
+            })
+
+        for c in range(complaints):
+            sender = rng.choice(student_ids)
+            await writer.set(db.collection("complaints").document(f"c{g}_{c}"), {
+                "title": f"Réclamation {c}",
+                "message": "…",
+                "fromUserId": sender,
+                "fromName": f"Student {sender}",
+                "fromRole": "student",
+                "toProfId": prof_id,
+                "toStudentId": None,
+                "groupId": None,
+                "type": "individual",
+                "readBy": [],
+                "unreadBy": [prof_id],
+                "recipientCount": 1,
+                "createdAt": now - timedelta(minutes=c)
+            })
+
+        for e in range(events):
+            day = (now + timedelta(days=e)).date().isoformat()
+            await writer.set(db.collection("calendar_events").document(f"e{g}_{e}"), {
+                "title": f"Tâche {e}",
+                "description": "",
+                "date": day,
+                "dateAt": datetime.fromisoformat(day).replace(tzinfo=timezone.utc),
+                "type": "task",
+                "groupId": group_id,
+                "createdBy": prof_id,
+                "creatorRole": "prof",
+                "createdAt": now
+            })
+
+    await writer.flush()
+    await dashboard_counters.rebuild()
+    return out
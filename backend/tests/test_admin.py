@@ -0,0 +1,153 @@
+import asyncio
+
+import pytest
+from firebase_admin import auth
+
+from app.utils.mailer import SMTPConnection
+from app.utils.outbox import EmailOutbox, outbox
+from tests.conftest import ADMIN, wait_for
+
+
+def _user(db_sync, uid):
+    return db_sync.collection("users").document(uid).get().to_dict()
+
+
+@pytest.fixture
+def sync_db(store):
+    return store.client()
+
+
+def test_group_links_are_written_with_the_group(client, data, sync_db):
+    r = client.post("/admin/groups", json={
+        "name": "G", "profId": "prof0", "studentIds": ["s0_0", "s1_0"]
+    }, headers=ADMIN)
+    gid = r.json()["groupId"]
+    assert _user(sync_db, "s1_0")["groupId"] == gid
+
+    client.put(f"/admin/groups/{gid}", json={"studentIds": ["s1_0", "s1_1"]}, headers=ADMIN)
+    assert _user(sync_db, "s0_0")["groupId"] is None
+    assert _user(sync_db, "s1_1")["groupId"] == gid
+
+    client.delete(f"/admin/groups/{gid}", headers=ADMIN)
+    assert _user(sync_db, "s1_0")["groupId"] is None
+    assert not sync_db.collection("groups").document(gid).get().exists
+
+
+
+def test_group_update_only_touches_its_own_links(client, data, sync_db):
+    r = client.put("/admin/groups/nope", json={"name": "X"}, headers=ADMIN)
+    assert r.status_code == 404
+    assert not sync_db.collection("groups").document("nope").get().exists
+
+    # s0_0 moved to g1 (its link now points there), then dropped from g0
+    client.put("/admin/groups/g1", json={"studentIds": ["s1_0", "s1_1", "s1_2", "s0_0"]}, headers=ADMIN)
+    client.put("/admin/groups/g0", json={"studentIds": ["s0_1", "s0_2"]}, headers=ADMIN)
+    assert _user(sync_db, "s0_0")["groupId"] == "g1"
+
+def test_user_listing_pages_and_search(client, data):
+    first = client.get("/admin/users?limit=4", headers=ADMIN).json()
+    rest = client.get(f"/admin/users?limit=4&cursor={first[-1]['uid']}", headers=ADMIN).json()
+    assert len(first) + len(rest) == 7
+    assert set(first[0]) <= {"uid", "email", "displayName", "role", "groupId", "createdAt",
+                             "emailStatus", "emailError"}
+
+    students = client.get("/admin/users?role=student&groupId=g1", headers=ADMIN).json()
+    assert [u["uid"] for u in students] == ["s1_0", "s1_1", "s1_2"]
+
+    found = client.get("/admin/users?q=PROF", headers=ADMIN).json()
+    assert [u["uid"] for u in found] == ["prof0"]
+    found = client.get("/admin/users?q=s0_1@", headers=ADMIN).json()
+    assert [u["uid"] for u in found] == ["s0_1"]
+
+
+def test_activation_email_goes_through_the_outbox(client, store, sync_db, monkeypatch):
+    controller = pytest.importorskip("aiosmtpd.controller")
+    received = []
+
+    class Handler:
+        async def handle_DATA(self, server, session, envelope):
+            received.append(envelope.rcpt_tos[0])
+            return "250 OK"
+
+    smtp = controller.Controller(Handler(), hostname="127.0.0.1", port=8025)
+    smtp.start()
+    monkeypatch.setattr(auth, "create_user", lambda **k: type("U", (), {"uid": "u1"}))
+    try:
+        r = client.post("/admin/users", json={"email": "new@pfe.test", "displayName": "New"},
+                        headers=ADMIN)
+        assert r.json()["emailStatus"] == "queued"
+        assert wait_for(lambda: _user(sync_db, "u1")["emailStatus"] == "sent")
+    finally:
+        smtp.stop()
+    assert received == ["new@pfe.test"]
+
+
+def test_bulk_import(client, data, sync_db, monkeypatch):
+    imported = []
+
+    def import_users(records, hash_alg=None):
+        imported.extend(records)
+        return type("R", (), {"errors": []})
+
+    monkeypatch.setattr(auth, "get_users", lambda ids: type("R", (), {"users": []}))
+    monkeypatch.setattr(auth, "import_users", import_users)
+    monkeypatch.setattr(outbox, "enqueue", lambda uid, msg: None)
+
+    csv = "email,displayName,role\nA@pfe.test,A,student\nb@pfe.test,B,prof\nbad,,student\n"
+    r = client.post("/admin/users/bulk", content=csv,
+                    headers={**ADMIN, "content-type": "text/csv"})
+    assert r.status_code == 202
+    job_url = f"/admin/users/bulk/{r.json()['jobId']}"
+
+    assert wait_for(lambda: client.get(job_url, headers=ADMIN).json()["status"] == "done")
+    job = client.get(job_url, headers=ADMIN).json()
+    assert (job["created"], job["failed"]) == (2, 1)
+    assert job["errors"] == [{"row": 3, "email": "bad", "error": "Email invalide"}]
+
+    uid = next(r.uid for r in imported if r.email == "a@pfe.test")
+    assert _user(sync_db, uid)["displayNameLower"] == "a"
+
+
+def test_outbox_worker_survives_a_failed_status_update(monkeypatch):
+    sent, statuses = [], []
+
+    async def set_status(uid, status):
+        statuses.append(uid)
+        if uid == "u1":
+            raise RuntimeError("deadline exceeded")
+
+    async def run():
+        box = EmailOutbox(pool_size=1)
+        monkeypatch.setattr(box, "_set_status", set_status)
+        await box.start()
+        box.enqueue("u1", {"To": "u1@pfe.test"})
+        box.enqueue("u2", {"To": "u2@pfe.test"})
+        await box.join()
+        await box.stop()
+
+    monkeypatch.setattr(SMTPConnection, "send", lambda self, msg: sent.append(msg["To"]))
+    asyncio.run(run())
+    assert sent == ["u1@pfe.test", "u2@pfe.test"]
+    assert statuses == ["u1", "u2"]
+
+
+def test_mail_enqueued_before_the_outbox_starts_is_kept(monkeypatch):
+    sent = []
+    monkeypatch.setattr(SMTPConnection, "send", lambda self, msg: sent.append(msg["To"]))
+    box = EmailOutbox(pool_size=1)
+
+    async def set_status(uid, status):
+        pass
+
+    monkeypatch.setattr(box, "_set_status", set_status)
+    # outside the app lifespan (script, test) : no loop, no workers yet
+    box.enqueue("u1", {"To": "u1@pfe.test"})
+    assert box.stats()["queued"] == 1
+
+    async def run():
+        await box.start()
+        await box.join()
+        await box.stop()
+
+    asyncio.run(run())
+    assert sent == ["u1@pfe.test"]
@@ -0,0 +1,36 @@
+from datetime import datetime, timezone
+
+from tests.conftest import auth_header
+
+
+def test_events_in_a_range(client, data):
+    h = auth_header("prof0")
+    for date in ("2030-01-10", "2030-01-31T23:00:00Z", "2030-02-01"):
+        r = client.post("/calendar/", data={"title": date, "date": date, "groupId": "g0"}, headers=h)
+        assert r.status_code == 200
+
+    january = client.get("/calendar/?groupId=g0&from=2030-01-01&to=2030-02-01", headers=h).json()
+    assert [e["title"] for e in january] == ["2030-01-10", "2030-01-31T23:00:00Z"]
+
+    both = client.get("/calendar/groups?from=2030-01-01&to=2030-03-01", headers=h).json()
+    assert len(both) == 3
+
+    r = client.post("/calendar/", data={"title": "x", "date": "demain", "groupId": "g0"}, headers=h)
+    assert r.status_code == 400
+
+
+def test_calendar_of_another_group_is_forbidden(client, data):
+    r = client.get("/calendar/?groupId=g1", headers=auth_header("s0_0"))
+    assert r.status_code == 403
+
+
+def test_dashboards_count_todays_tasks(client, data):
+    today = datetime.now(timezone.utc).date().isoformat()
+    client.post("/calendar/", data={"title": "extra", "date": today, "groupId": "g0"},
+                headers=auth_header("prof0"))
+
+    prof = client.get("/prof/dashboard-stats", headers=auth_header("prof0")).json()
+    student = client.get("/student/dashboard-stats", headers=auth_header("s0_0")).json()
+    # seeded : one task today per group
+    assert prof["totalTasksToday"] == 3
+    assert student["totalTasksToday"] == 2
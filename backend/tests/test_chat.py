@@ -0,0 +1,131 @@
+import asyncio
+
+from app.chat import services
+from app.chat.services import MAX_FILE_SIZE, UPLOAD_FAILED, ChatService
+from tests.conftest import auth_header, wait_for
+
+
+def test_send_and_page_messages(client, data):
+    r = client.post("/chat/g0/messages", data={"text": "bonjour"}, headers=auth_header("s0_0"))
+    assert r.status_code == 200
+
+    page = client.get("/chat/g0/messages?limit=5", headers=auth_header("prof0")).json()
+    assert [m["text"] for m in page] == [f"message {i}" for i in range(5)]
+
+    newer = client.get(
+        f"/chat/g0/messages?after={page[-1]['id']}", headers=auth_header("prof0")
+    ).json()
+    assert [m["text"] for m in newer][-2:] == ["message 9", "bonjour"]
+
+    older = client.get(
+        f"/chat/g0/messages?limit=2&before={newer[0]['id']}", headers=auth_header("prof0")
+    ).json()
+    assert [m["text"] for m in older] == ["message 3", "message 4"]
+
+
+def test_edit_and_delete_own_message(client, data):
+    mid = client.post("/chat/g0/messages", data={"text": "v1"}, headers=auth_header("s0_0")).json()["id"]
+
+    r = client.put(f"/chat/g0/messages/{mid}", data={"text": "v2"}, headers=auth_header("s0_0"))
+    assert r.status_code == 200
+
+    latest = client.get("/chat/g0/messages", headers=auth_header("s0_0")).json()[-1]
+    assert latest["text"] == "v2" and latest["edited"]
+
+    assert client.delete(f"/chat/g0/messages/{mid}", headers=auth_header("s0_0")).status_code == 200
+    texts = [m["text"] for m in client.get("/chat/g0/messages", headers=auth_header("s0_0")).json()]
+    assert "v2" not in texts
+
+
+def test_file_message_and_signed_url(client, data, store):
+    r = client.post(
+        "/chat/g0/messages",
+        data={"text": "rapport"},
+        files={"file": ("rapport final.pdf", b"%PDF-1.4 data", "application/pdf")},
+        headers=auth_header("s0_1")
+    )
+    assert r.status_code == 200
+    mid = r.json()["id"]
+
+    def message():
+        return next(m for m in client.get("/chat/g0/messages", headers=auth_header("s0_1")).json()
+                    if m["id"] == mid)
+
+    # the upload runs in the background, the message is pending until then
+    assert wait_for(lambda: message().get("uploadStatus") == "ready")
+    assert "fileUrl" not in message()
+
+    url = client.get(f"/chat/g0/files/{mid}", headers=auth_header("prof0")).json()
+    assert url["fileName"] == "rapport final.pdf"
+    assert url["url"].startswith("memory://")
+    assert len(store.bucket().blobs) == 1
+
+    # signed URLs only for the members of the group
+    assert client.get(f"/chat/g0/files/{mid}", headers=auth_header("s1_0")).status_code == 403
+
+
+def test_resumable_upload(client, data, store):
+    r = client.post(
+        "/chat/g0/uploads",
+        data={"fileName": "big.zip", "fileSize": "4", "mimeType": "application/zip"},
+        headers=auth_header("s0_0")
+    )
+    assert r.status_code == 200
+    session = r.json()
+
+    # not uploaded yet
+    complete = f"/chat/g0/uploads/{session['id']}/complete"
+    assert client.post(complete, headers=auth_header("s0_0")).status_code == 409
+
+    path = next(m for m in client.get("/chat/g0/messages", headers=auth_header("s0_0")).json()
+                if m["id"] == session["id"])["filePath"]
+    store.bucket().blob(path).upload_from_string(b"data")
+
+    assert client.post(complete, headers=auth_header("s0_0")).status_code == 200
+    assert client.get(f"/chat/g0/files/{session['id']}", headers=auth_header("s0_0")).status_code == 200
+
+
+def test_oversized_upload_is_rejected(client, data):
+    r = client.post(
+        "/chat/g0/messages",
+        data={"text": "x"},
+        files={"file": ("big.bin", b"0" * (MAX_FILE_SIZE + 2 * 1024 * 1024))},
+        headers=auth_header("s0_0")
+    )
+    assert r.status_code == 413
+
+
+def test_failed_upload_hides_the_storage_error(client, data, monkeypatch):
+    def upload(fileobj, filename, content_type):
+        raise RuntimeError("403 storage.objects.create denied for sa@project")
+
+    monkeypatch.setattr(services, "_upload_file", upload)
+    mid = client.post(
+        "/chat/g0/messages", data={"text": "x"}, files={"file": ("a.pdf", b"%PDF")},
+        headers=auth_header("s0_0")
+    ).json()["id"]
+
+    def message():
+        return next(m for m in client.get("/chat/g0/messages", headers=auth_header("s0_0")).json()
+                    if m["id"] == mid)
+
+    assert wait_for(lambda: message().get("uploadStatus") == "failed")
+    assert message()["errorMessage"] == UPLOAD_FAILED
+
+
+def test_stale_pending_uploads_are_expired(client, data, store, monkeypatch):
+    session = client.post(
+        "/chat/g0/uploads",
+        data={"fileName": "big.zip", "fileSize": "4", "mimeType": "application/zip"},
+        headers=auth_header("s0_0")
+    ).json()
+
+    # still in time
+    assert asyncio.run(ChatService().expire_stale_uploads()) == 0
+    # the client never completed (or the worker restarted mid-upload)
+    monkeypatch.setattr(services, "UPLOAD_TIMEOUT", -1)
+    assert asyncio.run(ChatService().expire_stale_uploads()) == 1
+
+    message = next(m for m in client.get("/chat/g0/messages", headers=auth_header("s0_0")).json()
+                   if m["id"] == session["id"])
+    assert message["uploadStatus"] == "failed" and message["errorMessage"] == UPLOAD_FAILED
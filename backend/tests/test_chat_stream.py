@@ -0,0 +1,29 @@
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from tests.conftest import auth_header
+
+
+def test_stream_delivers_deltas_to_the_group(client, data):
+    with client.websocket_connect("/chat/g0/stream?token=s0_1") as ws:
+        mid = client.post(
+            "/chat/g0/messages", data={"text": "salut"}, headers=auth_header("s0_0")
+        ).json()["id"]
+        created = ws.receive_json()
+        assert created["type"] == "message.created" and created["groupId"] == "g0"
+        assert created["message"]["id"] == mid and created["message"]["text"] == "salut"
+
+        client.put(f"/chat/g0/messages/{mid}", data={"text": "salut !"}, headers=auth_header("s0_0"))
+        updated = ws.receive_json()
+        assert updated["type"] == "message.updated" and updated["message"]["text"] == "salut !"
+
+        client.delete(f"/chat/g0/messages/{mid}", headers=auth_header("s0_0"))
+        assert ws.receive_json() == {"type": "message.deleted", "messageId": mid, "groupId": "g0"}
+
+
+@pytest.mark.parametrize("query", ["token=s1_0", "token=unknown", ""])
+def test_stream_rejects_non_members(client, data, query):
+    with pytest.raises(WebSocketDisconnect) as exc:
+        with client.websocket_connect(f"/chat/g0/stream?{query}") as ws:
+            ws.receive_json()
+    assert exc.value.code == 1008
@@ -0,0 +1,59 @@
+from tests.conftest import auth_header
+
+
+def test_student_complaint_to_prof(client, data):
+    r = client.post(
+        "/complaints/",
+        data={"title": "Accès", "message": "...", "toProfId": "prof0"},
+        headers=auth_header("s0_0")
+    )
+    assert r.status_code == 200
+
+    inbox = client.get("/complaints/prof?limit=1", headers=auth_header("prof0")).json()
+    assert inbox[0]["title"] == "Accès"
+    assert inbox[0]["fromName"] == "Student s0_0"
+    assert inbox[0]["status"] == "not open"
+
+    mine = client.get("/complaints/my", headers=auth_header("s0_0")).json()
+    assert mine[0]["title"] == "Accès"
+
+
+def test_prof_inbox_pagination_and_filters(client, data):
+    first = client.get("/complaints/prof?limit=3", headers=auth_header("prof0")).json()
+    rest = client.get(
+        f"/complaints/prof?limit=3&cursor={first[-1]['id']}", headers=auth_header("prof0")
+    ).json()
+    assert len(first) == 3 and len(rest) == 1
+    assert not {c["id"] for c in first} & {c["id"] for c in rest}
+
+    assert client.get("/complaints/prof?cursor=nope", headers=auth_header("prof0")).status_code == 400
+
+
+def test_mark_read_in_bulk(client, data):
+    ids = [c["id"] for c in client.get("/complaints/prof", headers=auth_header("prof0")).json()]
+
+    r = client.put("/complaints/read", json={"ids": ids[:3]}, headers=auth_header("prof0"))
+    assert r.status_code == 200
+
+    unread = client.get("/complaints/prof?status=unread", headers=auth_header("prof0")).json()
+    read = client.get("/complaints/prof?status=read", headers=auth_header("prof0")).json()
+    assert [c["id"] for c in unread] == ids[3:]
+    assert {c["id"] for c in read} == set(ids[:3])
+
+    # one unknown id : nothing is marked
+    r = client.put("/complaints/read", json={"ids": [ids[3], "nope"]}, headers=auth_header("prof0"))
+    assert r.status_code == 404
+    assert len(client.get("/complaints/prof?status=unread", headers=auth_header("prof0")).json()) == 1
+
+
+def test_group_complaint_reaches_the_other_students(client, data):
+    r = client.post(
+        "/complaints/",
+        data={"title": "Réunion", "message": "...", "groupId": "g0"},
+        headers=auth_header("s0_0")
+    )
+    assert r.status_code == 200
+
+    inbox = client.get("/complaints/student", headers=auth_header("s0_1")).json()
+    assert [c["title"] for c in inbox] == ["Réunion"]
+    assert client.get("/complaints/student", headers=auth_header("s1_0")).json() == []
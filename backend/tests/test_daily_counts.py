@@ -0,0 +1,119 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from tests.conftest import auth_header
+
+from app.utils import daily_message_calculator
+from app.utils.daily_message_calculator import (
+    backfill_daily_message_counts,
+    calculate_daily_message_counts
+)
+
+
+def _counts(store):
+    return {
+        path: doc["data"] for path, doc in store.docs.items()
+        if path.startswith("daily_message_counts/")
+    }
+
+
+def test_incremental_counts_match_a_backfill(data, db, store):
+    today = datetime.now(timezone.utc).date()
+    yesterday = today - timedelta(days=1)
+
+    asyncio.run(calculate_daily_message_counts())
+    incremental = _counts(store)
+    # a second run reads no new message and changes nothing
+    asyncio.run(calculate_daily_message_counts())
+    assert _counts(store) == incremental
+
+    for path in list(incremental):
+        store.docs.pop(path)
+    asyncio.run(backfill_daily_message_counts(yesterday, today))
+    assert {p: d for p, d in _counts(store).items() if p in incremental} == incremental
+
+
+def _backfilled(store, paths):
+    today = datetime.now(timezone.utc).date()
+    for path in paths:
+        store.docs.pop(path, None)
+    asyncio.run(backfill_daily_message_counts(today - timedelta(days=1), today))
+    return {p: d for p, d in _counts(store).items() if p in paths}
+
+
+def test_a_failed_run_retried_counts_once(data, store, monkeypatch):
+    # one batch per group (its counts and its mark), the second one fails
+    commit, calls = store._commit, []
+
+    def failing(ops):
+        calls.append(ops)
+        if len(calls) == 2:
+            raise RuntimeError("unavailable")
+        return commit(ops)
+
+    monkeypatch.setattr(store, "_commit", failing)
+    with pytest.raises(RuntimeError):
+        asyncio.run(calculate_daily_message_counts())
+    asyncio.run(calculate_daily_message_counts())
+
+    counts = _counts(store)
+    assert counts and _backfilled(store, list(counts)) == counts
+
+
+def test_first_run_replaces_the_old_daily_counts(data, store):
+    asyncio.run(backfill_daily_message_counts(*[datetime.now(timezone.utc).date()] * 2))
+    expected = _counts(store)
+    # left by the previous daily job, no mark yet
+    for path in list(store.docs):
+        if path.startswith("daily_message_counts_state/"):
+            store.docs.pop(path)
+    path = next(iter(expected))
+    store.client().document(path).set({**expected[path], "count": 99})
+
+    asyncio.run(calculate_daily_message_counts())
+    assert _counts(store) == expected
+
+
+def test_deleted_message_is_uncounted(client, data, store):
+    asyncio.run(calculate_daily_message_counts())
+    today = datetime.now(timezone.utc).date()
+    counted = [
+        (path.rsplit("/", 1)[1], doc["data"]) for path, doc in store.docs.items()
+        if path.startswith("chats/g0/messages/")
+        and doc["data"]["timestamp"].date() == today
+    ]
+    mid, msg = counted[0]
+    path = f"daily_message_counts/{msg['senderId']}_g0_{today.isoformat()}"
+    before = store.docs[path]["data"]["count"]
+
+    client.delete(f"/chat/g0/messages/{mid}", headers=auth_header(msg["senderId"]))
+    assert store.docs[path]["data"]["count"] == before - 1
+    # the next run does not count it again
+    asyncio.run(calculate_daily_message_counts())
+    assert store.docs[path]["data"]["count"] == before - 1
+
+
+def test_overlapping_runs_count_once(client, data, store, monkeypatch):
+    # two workers' schedulers : both read the marks before either commits
+    process = daily_message_calculator._process_since
+
+    async def slow(*args):
+        await asyncio.sleep(0.01)
+        return await process(*args)
+
+    monkeypatch.setattr(daily_message_calculator, "_process_since", slow)
+
+    async def both():
+        return await asyncio.gather(calculate_daily_message_counts(), calculate_daily_message_counts())
+
+    # no mark yet : each group is counted by one of the runs
+    reports = asyncio.run(both())
+    assert sum(r["groupsSkipped"] for r in reports) == 2
+    # from a mark : only g0 has new messages
+    client.post("/chat/g0/messages", data={"text": "nouveau"}, headers=auth_header("s0_0"))
+    reports = asyncio.run(both())
+    assert sum(r["groupsSkipped"] for r in reports) == 1
+
+    counts = _counts(store)
+    assert _backfilled(store, list(counts)) == counts
@@ -0,0 +1,27 @@
+from tests.conftest import auth_header
+
+
+def test_notes_keep_the_last_note_on_the_group(client, data):
+    student, prof = auth_header("s0_0"), auth_header("prof0")
+    for text in ("n1", "n2", "n3"):
+        assert client.post("/groups/g0/notes", data={"text": text}, headers=student).status_code == 200
+
+    notes = client.get("/groups/g0/notes?limit=2", headers=prof).json()
+    assert [n["text"] for n in notes] == ["n3", "n2"]
+    older = client.get(f"/groups/g0/notes?limit=2&cursor={notes[-1]['id']}", headers=prof).json()
+    assert [n["text"] for n in older] == ["n1"]
+
+    group = next(g for g in client.get("/groups/prof", headers=prof).json() if g["groupId"] == "g0")
+    assert group["lastNote"]["text"] == "n3"
+    assert "notes" not in group
+
+    assert client.delete(f"/groups/g0/notes/{notes[0]['id']}", headers=student).status_code == 200
+    group = client.get("/groups/my-group", headers=student).json()
+    # same shape as written by add_group_note
+    assert group["lastNote"] == {"id": notes[1]["id"], "text": "n2", "timestamp": notes[1]["timestamp"]}
+
+
+def test_only_the_students_of_the_group_write_notes(client, data):
+    assert client.post("/groups/g0/notes", data={"text": "x"}, headers=auth_header("prof0")).status_code >= 400
+    assert client.post("/groups/g0/notes", data={"text": "x"}, headers=auth_header("s1_0")).status_code >= 400
+    assert client.get("/groups/g0/notes", headers=auth_header("s1_0")).status_code >= 400
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+from google.api_core.exceptions import NotFound
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.base_query import FieldFilter, Or
+
+from app.utils.memory_firestore import MemoryStore
+
+
+@pytest.fixture
+def mem():
+    store = MemoryStore()
+    db = store.client()
+    for i, (role, score) in enumerate([("a", 3), ("b", 1), ("a", 2), ("c", None)]):
+        doc = {"role": role, "tags": [role, "all"]}
+        if score is not None:
+            doc["score"] = score
+        db.collection("items").document(f"i{i}").set(doc)
+    store.reset_stats()
+    return store, db
+
+
+def test_filters_and_ordering(mem):
+    store, db = mem
+    items = db.collection("items")
+
+    assert [d.id for d in items.where(filter=FieldFilter("role", "==", "a")).get()] == ["i0", "i2"]
+    assert [d.id for d in items.where(filter=FieldFilter("tags", "array_contains", "b")).get()] == ["i1"]
+    # documents without the field are excluded by order_by
+    assert [d.id for d in items.order_by("score").get()] == ["i1", "i2", "i0"]
+    assert [d.id for d in items.order_by("score", direction="DESCENDING").limit(2).get()] == ["i0", "i2"]
+
+    either = Or([FieldFilter("role", "==", "c"), FieldFilter("score", "==", 1)])
+    assert sorted(d.id for d in items.where(filter=either).get()) == ["i1", "i3"]
+
+
+def test_cursor_projection_and_count(mem):
+    store, db = mem
+    items = db.collection("items")
+
+    first = items.order_by("score").limit(1).get()
+    rest = items.order_by("score").start_after(first[-1]).get()
+    assert [d.id for d in rest] == ["i2", "i0"]
+
+    assert items.select(["role"]).get()[0].to_dict() == {"role": "a"}
+    assert items.where(filter=FieldFilter("role", "==", "a")).count().get()[0][0].value == 2
+
+
+def test_reads_are_counted(mem):
+    store, db = mem
+    db.collection("items").get()
+    db.collection("items").document("missing").get()
+    db.collection("items").where(filter=FieldFilter("role", "==", "x")).get()
+    # 4 documents + 1 missing document + 1 for an empty result
+    assert store.stats["reads"] == 6
+    assert store.stats["rpcs"] == 3
+
+
+def test_batch_is_atomic(mem):
+    store, db = mem
+    batch = db.batch()
+    batch.update(db.collection("items").document("i0"), {"score": transforms.Increment(5)})
+    batch.update(db.collection("items").document("nope"), {"score": 1})
+
+    with pytest.raises(NotFound):
+        batch.commit()
+    assert db.collection("items").document("i0").get().get("score") == 3
+
+
+def test_transforms(mem):
+    store, db = mem
+    ref = db.collection("items").document("i0")
+    ref.update({
+        "score": transforms.Increment(2),
+        "tags": transforms.ArrayUnion(["new"]),
+        "role": transforms.DELETE_FIELD
+    })
+    ref.update({"tags": transforms.ArrayRemove(["all"])})
+
+    assert ref.get().to_dict() == {"score": 5, "tags": ["a", "new"]}
+
+
+def test_async_client_shares_the_data(mem):
+    store, db = mem
+
+    async def read():
+        adb = store.async_client()
+        snap = await adb.collection("items").document("i1").get()
+        return snap.to_dict()["role"], [d.id async for d in adb.collection("items").stream()]
+
+    role, ids = asyncio.run(read())
+    assert role == "b"
+    assert ids == ["i0", "i1", "i2", "i3"]
@@ -0,0 +1,49 @@
+import pytest
+
+from app.main import app
+from app.middleware.request_metrics import RequestMetricsMiddleware
+from tests.conftest import auth_header
+
+
+@pytest.fixture
+def debug_headers(client, monkeypatch):
+    """Turns the X-Firestore-* headers on in the running middleware."""
+    layer = app.middleware_stack
+    while not isinstance(layer, RequestMetricsMiddleware):
+        layer = layer.app
+    monkeypatch.setattr(layer, "debug_headers", True)
+
+
+def test_metrics_count_firestore_reads_per_route(client, store, data):
+    r = client.get("/chat/g0/messages?limit=3", headers=auth_header("s0_0"))
+    assert r.status_code == 200
+
+    body = client.get("/metrics").text
+    assert "# TYPE firestore_reads_total counter" in body
+    # labelled by the route template, not the raw path
+    line = next(
+        l for l in body.splitlines()
+        if l.startswith('firestore_reads_total{method="GET",route="/chat/{group_id}/messages"}')
+    )
+    assert float(line.split()[-1]) >= 4
+
+
+def test_debug_headers_match_store_counts(client, store, data, debug_headers):
+    store.reset_stats()
+
+    r = client.get("/prof/students-details", headers=auth_header("prof0"))
+
+    assert r.status_code == 200
+    assert int(r.headers["x-firestore-reads"]) == store.stats["reads"]
+    assert int(r.headers["x-firestore-rpcs"]) == store.stats["rpcs"]
+    assert r.headers["server-timing"].startswith("firestore;dur=")
+
+
+def test_writes_are_counted_once_per_batch_commit(client, store, data, debug_headers):
+    store.reset_stats()
+
+    r = client.post("/chat/g0/messages", data={"text": "hello"}, headers=auth_header("s0_0"))
+
+    assert r.status_code == 200
+    assert r.headers["x-firestore-writes"] == str(store.stats["writes"])
+    assert int(r.headers["x-firestore-writes"]) >= 1
@@ -0,0 +1,48 @@
+import asyncio
+import io
+
+from app.utils import dashboard_counters
+from tests.conftest import auth_header
+
+
+def _details(client):
+    rows = client.get("/prof/students-details", headers=auth_header("prof0")).json()
+    return {row["uid"]: (row["messageCount"], row["documentCount"]) for row in rows}
+
+
+def _sent(store, group_id: str, uid: str) -> int:
+    prefix = f"chats/{group_id}/messages/"
+    return sum(
+        1 for path, doc in store.docs.items()
+        if path.startswith(prefix) and doc["data"].get("senderId") == uid
+    )
+
+
+def test_student_counts_follow_sends_and_deletes(client, data, store):
+    before = _details(client)
+    assert before["s0_0"] == (_sent(store, "g0", "s0_0"), 0)
+
+    client.post("/chat/g0/messages", data={"text": "hello"}, headers=auth_header("s0_0"))
+    mid = client.post(
+        "/chat/g0/messages",
+        data={"text": "rapport"},
+        files={"file": ("rapport.pdf", io.BytesIO(b"%PDF"), "application/pdf")},
+        headers=auth_header("s0_0")
+    ).json()["id"]
+    assert _details(client)["s0_0"] == (before["s0_0"][0] + 2, 1)
+
+    client.delete(f"/chat/g0/messages/{mid}", headers=auth_header("s0_0"))
+    after = _details(client)
+    assert after["s0_0"] == (before["s0_0"][0] + 1, 0)
+    assert after["s0_1"] == before["s0_1"]
+
+    # the live counters agree with a rebuild from the messages
+    asyncio.run(dashboard_counters.rebuild())
+    assert _details(client) == after
+
+
+def test_student_details_reads_do_not_grow_with_messages(client, data, store):
+    store.reset_stats()
+    client.get("/prof/students-details", headers=auth_header("prof0"))
+    # prof profile, groups, student profiles, counters
+    assert store.stats["rpcs"] == 4
@@ -0,0 +1,94 @@
+import pytest
+
+from app.utils import response_cache
+from app.utils.memory_firestore import Query
+from app.utils.replica import replica
+from tests.conftest import auth_header, wait_for
+
+
+@pytest.fixture
+def listeners(client, data, monkeypatch):
+    """Firestore listeners on, started on the app's event loop."""
+    monkeypatch.setattr(replica, "enabled", True)
+    client.portal.call(replica.start)
+    yield replica
+    client.portal.call(replica.stop)
+
+
+def test_hot_reads_are_local(client, store, listeners):
+    response_cache.responses.clear()
+    store.reset_stats()
+
+    assert client.get("/groups/prof", headers=auth_header("prof0")).status_code == 200
+    assert client.get("/groups/my-group", headers=auth_header("s0_0")).json()["groupId"] == "g0"
+    profs = client.get("/complaints/student/professors", headers=auth_header("s0_0")).json()
+    assert [p["id"] for p in profs] == ["prof0"]
+
+    assert store.stats["rpcs"] == 0
+
+
+def test_writes_reach_the_replica(client, store, listeners):
+    db = store.client()
+    db.collection("users").document("s0_0").update({"displayName": "Nouveau nom"})
+    assert client.get("/auth/me", headers=auth_header("s0_0")).json()["displayName"] == "Nouveau nom"
+
+    # group changed outside the API : access follows without invalidation
+    db.collection("groups").document("g0").update({"studentIds": ["s0_1"]})
+    assert client.get("/calendar/groups?from=2030-01-01&to=2030-02-01",
+                      headers=auth_header("s0_0")).json() == []
+    r = client.get("/calendar/?groupId=g0&from=2030-01-01", headers=auth_header("s0_0"))
+    assert r.status_code == 403
+
+
+def test_open_chat_pages_come_from_the_window(client, store, listeners):
+    h = auth_header("s0_0")
+    expected = client.get("/chat/g0/messages", headers=h).json()
+
+    with client.websocket_connect("/chat/g0/stream?token=s0_0"):
+        store.reset_stats()
+        assert client.get("/chat/g0/messages", headers=h).json() == expected
+        last = client.get(f"/chat/g0/messages?limit=3&before={expected[-1]['id']}", headers=h).json()
+        assert last == expected[-4:-1]
+        assert store.stats["rpcs"] == 0
+
+        client.post("/chat/g0/messages", data={"text": "live"}, headers=h)
+        store.reset_stats()
+        newer = client.get(f"/chat/g0/messages?after={expected[-1]['id']}", headers=h).json()
+        assert [m["text"] for m in newer] == ["live"]
+        assert store.stats["rpcs"] == 0
+
+    assert listeners.stats()["chats"]["sockets"] == 0
+
+
+def test_oversized_collection_falls_back_to_firestore(client, store, data, monkeypatch):
+    monkeypatch.setattr(replica, "enabled", True)
+    monkeypatch.setattr(replica._users, "max_size", 2)
+    client.portal.call(replica.start)
+    try:
+        assert replica.get_user("s0_0") is None
+        assert client.get("/auth/me", headers=auth_header("s0_0")).json()["uid"] == "s0_0"
+    finally:
+        client.portal.call(replica.stop)
+
+
+def test_snapshots_refresh_cached_responses(client, store, listeners):
+    h = auth_header("s0_1")
+
+    def names():
+        return {s["name"] for s in client.get("/groups/my-group", headers=h).json()["students"]}
+
+    assert "Student s0_0" in names()
+    # written outside the API : only the snapshot tells the response cache
+    store.client().collection("users").document("s0_0").update({"displayName": "Nouveau nom"})
+    assert wait_for(lambda: "Nouveau nom" in names())
+
+
+def test_failed_chat_listener_frees_its_slot(client, data, listeners, monkeypatch):
+    def on_snapshot(self, callback):
+        raise RuntimeError("listen failed")
+
+    monkeypatch.setattr(Query, "on_snapshot", on_snapshot)
+    with client.websocket_connect("/chat/g0/stream?token=s0_0"):
+        messages = client.get("/chat/g0/messages", headers=auth_header("s0_0")).json()
+        assert len(messages) == 10
+        assert listeners.stats()["chats"] == {"size": 0, "sockets": 0}
@@ -0,0 +1,69 @@
+from firebase_admin import auth
+
+from app.utils.response_cache import ResponseCache
+from tests.conftest import ADMIN, auth_header
+
+
+def test_repeated_reads_are_served_from_memory(client, data, store):
+    h = auth_header("s0_0")
+    first = client.get("/groups/my-group", headers=h)
+    etag = first.headers["etag"]
+
+    store.reset_stats()
+    again = client.get("/groups/my-group", headers=h)
+    assert again.json() == first.json()
+    assert store.stats["rpcs"] == 0
+
+    r = client.get("/groups/my-group", headers={**h, "If-None-Match": etag})
+    assert r.status_code == 304 and r.headers["etag"] == etag
+
+
+def test_mutations_invalidate_the_responses(client, data, monkeypatch):
+    monkeypatch.setattr(auth, "update_user", lambda uid, **k: None)
+    h = auth_header("s0_0")
+    etag = client.get("/groups/my-group", headers=h).headers["etag"]
+    client.post("/groups/g0/notes", data={"text": "fait"}, headers=h)
+
+    r = client.get("/groups/my-group", headers={**h, "If-None-Match": etag})
+    assert r.status_code == 200 and r.json()["lastNote"]["text"] == "fait"
+
+    # a student renamed by the admin : the prof's groups show the new name
+    client.get("/groups/prof", headers=auth_header("prof0"))
+    r = client.put("/admin/users/s0_1", json={
+        "email": "s0_1@pfe.test", "displayName": "Renamed", "role": "student", "groupId": "g0"
+    }, headers=ADMIN)
+    assert r.status_code == 200
+    groups = client.get("/groups/prof", headers=auth_header("prof0")).json()
+    assert "Renamed" in [s["name"] for g in groups for s in g["students"]]
+
+    # events show up at once, per query string
+    url = "/calendar/?groupId=g0&from=2030-01-01&to=2030-02-01"
+    assert client.get(url, headers=h).json() == []
+    client.post("/calendar/", data={"title": "t", "date": "2030-01-10", "groupId": "g0"},
+                headers=auth_header("prof0"))
+    assert [e["title"] for e in client.get(url, headers=h).json()] == ["t"]
+
+
+def test_removed_member_loses_the_cached_group(client, data):
+    h = auth_header("s0_0")
+    assert client.get("/groups/my-group", headers=h).json()["groupId"] == "g0"
+    assert client.get("/calendar/?groupId=g0", headers=h).status_code == 200
+
+    client.put("/admin/groups/g0", json={"studentIds": ["s0_1", "s0_2"]}, headers=ADMIN)
+
+    assert client.get("/groups/my-group", headers=h).json() is None
+    assert client.get("/calendar/?groupId=g0", headers=h).status_code == 403
+
+
+def test_invalidated_while_building_is_not_cached():
+    cache = ResponseCache(maxsize=10, ttl=60)
+    version = cache.version()
+    # the group changes while the response is being built
+    cache.invalidate("group:g0")
+    cache.set("k", '"e"', b"{}", ["group:g0"], version)
+    assert cache.get("k") is None
+
+    cache.set("k", '"e"', b"{}", ["group:g0"], cache.version())
+    assert cache.get("k") == ('"e"', b"{}")
+    cache.invalidate("user:other")
+    assert cache.get("k") == ('"e"', b"{}")
@@ -1,4 +1,4 @@
-import React, { useContext, useEffect, useMemo, useState } from "react";
+import React, { useContext, useEffect, useState } from "react";
 import { useNavigate } from "react-router-dom";
 import { AuthContext } from "../../context/AuthContext";
 import api from "../../services/api";
@@ -14,22 +14,16 @@ function Avatar({ name }) {
 export default function AdminDashboard() {
   const { token } = useContext(AuthContext);
   const navigate = useNavigate();
-  const [users, setUsers] = useState([]);
+  const [students, setStudents] = useState([]);
+  const [profs, setProfs] = useState([]);
   const [searchQuery, setSearchQuery] = useState('');
 
+  // only the 4 cards of each section are fetched
   useEffect(() => {
-    api.listUsers(token).then(data => setUsers(data || []));
-  }, [token]);
-
-  const students = useMemo(
-    () => users.filter(u => u.role === "student" && u.displayName.toLowerCase().includes(searchQuery.toLowerCase())).slice(0, 4),
-    [users, searchQuery]
-  );
-
-  const profs = useMemo(
-    () => users.filter(u => u.role === "prof" && u.displayName.toLowerCase().includes(searchQuery.toLowerCase())).slice(0, 4),
-    [users, searchQuery]
-  );
+    const q = searchQuery.trim() || undefined;
+    api.listUsers({ role: "student", q, limit: 4 }).then(data => setStudents(data || []));
+    api.listUsers({ role: "prof", q, limit: 4 }).then(data => setProfs(data || []));
+  }, [token, searchQuery]);
 
   return (
     <div className="dash-root">
@@ -1,8 +1,10 @@
-import React, { useEffect, useMemo, useState } from "react";
+import React, { useEffect, useState } from "react";
 import api from "../../services/api";
 import { useAuth } from "../../context/AuthContext";
 import "../styles/users.css";
 
+const PAGE_SIZE = 50;
+
 export default function AdminUsers() {
   const { user, token } = useAuth();
 
@@ -14,6 +16,7 @@ export default function AdminUsers() {
   const [successMsg, setSuccessMsg] = useState("");
   const [errorMsg, setErrorMsg] = useState("");
   const [loading, setLoading] = useState(false);
+  const [hasMore, setHasMore] = useState(false);
 
   const [form, setForm] = useState({
     email: "",
@@ -22,7 +25,7 @@ export default function AdminUsers() {
   });
 
   /* ================= LOAD USERS ================= */
-  const loadUsers = async () => {
+  const loadUsers = async (more = false) => {
     if (!token) {
       setErrorMsg("⛔ Session invalide. Veuillez vous reconnecter.");
       return;
@@ -37,8 +40,16 @@ export default function AdminUsers() {
     setErrorMsg("");
 
     try {
-      const data = await api.listUsers();
-      setUsers(Array.isArray(data) ? data : []);
+      const data = await api.listUsers({
+        limit: PAGE_SIZE,
+        role: filterRole || undefined,
+        q: search.trim() || undefined,
+        cursor: more && users.length ? users[users.length - 1].uid : undefined,
+      });
+      const page = Array.isArray(data) ? data : [];
+      setUsers(more ? [...users, ...page] : page);
+      // search results come in one page
+      setHasMore(!search.trim() && page.length === PAGE_SIZE);
     } catch (err) {
       console.error("LOAD USERS ERROR:", err);
       setErrorMsg("❌ Erreur lors du chargement des utilisateurs.");
@@ -50,19 +61,7 @@ export default function AdminUsers() {
   useEffect(() => {
     loadUsers();
     // eslint-disable-next-line
-  }, [user, token]);
-
-  /* ================= FILTER ================= */
-  const filteredUsers = useMemo(() => {
-    return users.filter((u) => {
-      const q = search.toLowerCase();
-      return (
-        (!filterRole || u.role === filterRole) &&
-        (u.displayName?.toLowerCase().includes(q) ||
-          u.email?.toLowerCase().includes(q))
-      );
-    });
-  }, [users, search, filterRole]);
+  }, [user, token, filterRole, search]);
 
   /* ================= CREATE ================= */
   const handleCreate = async (e) => {
@@ -73,8 +72,8 @@ export default function AdminUsers() {
   try {
     const res = await api.createUser(form);
 
-    if (res.emailSent) {
-      setSuccessMsg("✅ Utilisateur créé. Email envoyé.");
+    if (res.emailStatus === "queued") {
+      setSuccessMsg("✅ Utilisateur créé. Email en cours d’envoi.");
     } else {
       setSuccessMsg("⚠️ Utilisateur créé mais email non envoyé.");
     }
@@ -234,10 +233,15 @@ export default function AdminUsers() {
             </tr>
           </thead>
           <tbody>
-            {filteredUsers.map((u) => (
+            {users.map((u) => (
               <tr key={u.uid}>
                 <td>{u.displayName}</td>
-                <td>{u.email}</td>
+                <td>
+                  {u.email}
+                  {u.emailStatus === "failed" && (
+                    <span title={`Email non envoyé : ${u.emailError || ""}`}> ⚠️</span>
+                  )}
+                </td>
                 <td>
                   <span className={`role-badge role-${u.role}`}>
                     {u.role}
@@ -263,6 +267,16 @@ export default function AdminUsers() {
         </table>
       </div>
 
+      {hasMore && (
+        <button
+          className="btn-primary"
+          disabled={loading}
+          onClick={() => loadUsers(true)}
+        >
+          Charger plus
+        </button>
+      )}
+
       {/* MODAL EDIT */}
       {editingUser && (
         <div className="modal-overlay">
@@ -94,7 +94,8 @@ export default function ChatBox({ groupId, groupName, currentUser }) {
   /* ================= DOWNLOAD ================= */
   const downloadFile = async (m) => {
     try {
-      const response = await fetch(m.fileUrl);
+      const { url: signedUrl } = await api.getFileUrl(groupId, m.id);
+      const response = await fetch(signedUrl);
       const blob = await response.blob();
       const url = URL.createObjectURL(blob);
       const a = document.createElement("a");
@@ -184,10 +185,14 @@ export default function ChatBox({ groupId, groupName, currentUser }) {
                       <div className="file-info">
                         <div className="file-name">{m.fileName}</div>
                         <div className="file-type">
-                          {m.mimeType?.split("/")[1]?.toUpperCase()}
+                          {m.uploadStatus === "pending"
+                            ? "⏳ Envoi en cours…"
+                            : m.uploadStatus === "failed"
+                            ? "⚠️ Échec de l'envoi"
+                            : m.mimeType?.split("/")[1]?.toUpperCase()}
                         </div>
                       </div>
-                      {!isMe && (
+                      {!isMe && m.filePath && !m.uploadStatus?.match(/pending|failed/) && (
                         <button
                           className="file-action-btn"
                           onClick={() =>
@@ -63,13 +63,13 @@ export default function ProjectProgress() {
               </div>
             </div>
 
-            {g.notes && g.notes.length > 0 && (
+            {g.lastNote && (
               <div className="pp-notes-section">
                 <h4>📝 Dernière note des étudiants</h4>
                 <div className="pp-notes-list">
                   <div className="pp-note-item">
-                    <p>{g.notes[g.notes.length - 1].text}</p>
-                    <small>{new Date(g.notes[g.notes.length - 1].timestamp).toLocaleDateString()}</small>
+                    <p>{g.lastNote.text}</p>
+                    <small>{new Date(g.lastNote.timestamp).toLocaleDateString()}</small>
                   </div>
                 </div>
               </div>
@@ -48,8 +48,9 @@ const api = {
 
   /* ================= ADMIN ================= */
 
-  listUsers: async () => {
-    const res = await apiClient.get("/admin/users");
+  // params : { limit, cursor (last uid), role, groupId, q (prefix) }
+  listUsers: async (params = {}) => {
+    const res = await apiClient.get("/admin/users", { params });
     return res.data;
   },
 
@@ -68,10 +69,24 @@ const api = {
     return res.data;
   },
 
+  // file : CSV or JSON (email, displayName, role) -> { jobId, total }
+  importUsers: async (file) => {
+    const formData = new FormData();
+    formData.append("file", file);
+    const res = await apiClient.post("/admin/users/bulk", formData);
+    return res.data;
+  },
+
+  getImportJob: async (jobId) => {
+    const res = await apiClient.get(`/admin/users/bulk/${jobId}`);
+    return res.data;
+  },
+
   /* ================= GROUPS ================= */
 
-  listGroups: async () => {
-    const res = await apiClient.get("/admin/groups");
+  // params : { limit, cursor (last groupId), profId }
+  listGroups: async (params = {}) => {
+    const res = await apiClient.get("/admin/groups", { params });
     return res.data;
   },
 
@@ -115,6 +130,11 @@ const api = {
     return res.data;
   },
 
+  getFileUrl: async (groupId, messageId) => {
+    const res = await apiClient.get(`/chat/${groupId}/files/${messageId}`);
+    return res.data;
+  },
+
   updateMessage: async (groupId, messageId, text) => {
     const formData = new FormData();
     formData.append("text", text);
@@ -178,6 +198,12 @@ const api = {
     return res.data;
   },
 
+  /** 🔹 Marquer plusieurs réclamations comme lues */
+  markComplaintsRead: async (complaintIds) => {
+    const res = await apiClient.put("/complaints/read", { ids: complaintIds });
+    return res.data;
+  },
+
   /** 🔹 Supprimer */
   deleteComplaint: async (complaintId) => {
     const res = await apiClient.delete(`/complaints/${complaintId}`);
@@ -230,10 +256,21 @@ const api = {
  * 🔹 Récupérer les événements
  * (partagés prof ↔ étudiant par groupId)
  */
-getCalendarEvents: async (groupId) => {
+getCalendarEvents: async (groupId, { from = null, to = null } = {}) => {
   if (!groupId) throw new Error("groupId required");
   const res = await apiClient.get("/calendar", {
-    params: { groupId },
+    params: { groupId, from, to },
+  });
+  return res.data;
+},
+
+/**
+ * 🔹 Événements de plusieurs groupes (tous les groupes par défaut)
+ * from <= date < to
+ */
+getCalendarEventsForGroups: async ({ from, to, groupIds = null }) => {
+  const res = await apiClient.get("/calendar/groups", {
+    params: { from, to, groupIds: groupIds ? groupIds.join(",") : null },
   });
   return res.data;
 },
@@ -320,6 +357,13 @@ updateGroupProgress: async (groupId, progress) => {
   return res.data;
 },
 
+getGroupNotes: async (groupId, { limit = null, cursor = null } = {}) => {
+  const res = await apiClient.get(`/groups/${groupId}/notes`, {
+    params: { limit, cursor },
+  });
+  return res.data;
+},
+
 addGroupNote: async (groupId, noteData) => {
   const formData = new FormData();
   formData.append("text", noteData.text);
@@ -335,18 +379,17 @@ addGroupNote: async (groupId, noteData) => {
 updateGroupNote: async (groupId, noteData) => {
   const formData = new FormData();
   formData.append("text", noteData.text);
-  formData.append("timestamp", noteData.timestamp);
 
   const res = await apiClient.put(
-    `/groups/${groupId}/notes/${noteData.timestamp}`,
+    `/groups/${groupId}/notes/${noteData.id}`,
     formData
   );
   return res.data;
 },
 
-deleteGroupNote: async (groupId, timestamp) => {
+deleteGroupNote: async (groupId, noteId) => {
   const res = await apiClient.delete(
-    `/groups/${groupId}/notes/${timestamp}`
+    `/groups/${groupId}/notes/${noteId}`
   );
   return res.data;
 },
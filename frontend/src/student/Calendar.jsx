@@ -27,9 +27,17 @@ export default function StudentCalendar() {
   };
 
   const loadEvents = useCallback(async () => {
-    const ev = await api.getCalendarEvents(selectedGroupId);
+    // displayed month only : [1st of the month, 1st of the next month[
+    const y = currentDate.getFullYear();
+    const m = currentDate.getMonth();
+    const iso = (d) =>
+      `${d.getFullYear()}-${String(d.getMonth() + 1).padStart(2, "0")}-01`;
+    const ev = await api.getCalendarEvents(selectedGroupId, {
+      from: iso(new Date(y, m, 1)),
+      to: iso(new Date(y, m + 1, 1)),
+    });
     setEvents(ev || []);
-  }, [selectedGroupId]);
+  }, [selectedGroupId, currentDate]);
 
   useEffect(() => {
     loadGroups();
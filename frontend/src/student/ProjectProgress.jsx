@@ -18,9 +18,10 @@ export default function ProjectProgress() {
     try {
       const data = await api.getMyGroup();
       setGroup(data);
-      // Load notes if available
-      if (data && data.notes) {
-        setNotes(data.notes);
+      // Load notes if available (most recent first, kept oldest first here)
+      if (data) {
+        const list = await api.getGroupNotes(data.groupId);
+        setNotes([...list].reverse());
       }
     } catch (err) {
       console.error(err);
@@ -41,8 +42,8 @@ export default function ProjectProgress() {
         timestamp: new Date().toISOString(),
       };
       // Assuming there's an API to add notes
-      await api.addGroupNote(group.groupId, noteData);
-      setNotes([...notes, noteData]);
+      const res = await api.addGroupNote(group.groupId, noteData);
+      setNotes([...notes, res.note]);
       setNewNote("");
       setShowModal(false);
       // Reload groups to update professor view
@@ -55,7 +56,7 @@ export default function ProjectProgress() {
       const updatedNote = { ...editingNote, text: newNote };
       // Assuming there's an API to update notes
       await api.updateGroupNote(group.groupId, updatedNote);
-      setNotes(notes.map(note => note.timestamp === editingNote.timestamp ? updatedNote : note));
+      setNotes(notes.map(note => note.id === editingNote.id ? updatedNote : note));
       setNewNote("");
       setEditingNote(null);
       setShowModal(false);
@@ -66,8 +67,8 @@ export default function ProjectProgress() {
   const deleteNote = async (note) => {
     if (window.confirm("Êtes-vous sûr de vouloir supprimer cette note ?")) {
       // Assuming there's an API to delete notes
-      await api.deleteGroupNote(group.groupId, note.timestamp);
-      setNotes(notes.filter(n => n.timestamp !== note.timestamp));
+      await api.deleteGroupNote(group.groupId, note.id);
+      setNotes(notes.filter(n => n.id !== note.id));
       loadGroup();
     }
   };